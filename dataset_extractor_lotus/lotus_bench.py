@@ -0,0 +1,314 @@
+# Description:
+# benchmarks of the hot paths (read, cache, sampling, dedupe, MINEs export...) on synthetic LOTUS-shaped data
+# (see lotus_synthetic), with the wall time, the peak RSS and the throughput per stage, so regressions show up
+# without the real dataset or network access.
+#
+# Example:
+#   python -m dataset_extractor_lotus.lotus_bench --rows 10000 100000 1000000 --repeat 3 --output bench.json
+#   python -m dataset_extractor_lotus.lotus_bench --rows 10000 100000 --baseline bench.json
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import polars as pl  # for data manipulation
+
+from dataset_extractor_lotus.lotus_dedup import dedupe
+from dataset_extractor_lotus.lotus_index import TaxonomyIndex
+from dataset_extractor_lotus.lotus_mines import mines_report, suffix_duplicate_ids
+from dataset_extractor_lotus.lotus_planner import shared_scan
+from dataset_extractor_lotus.lotus_reader import read_LOTUS_dataset, scan_LOTUS_dataset
+from dataset_extractor_lotus.lotus_sampler import parse_quota_spec, sample_members, sample_quotas
+from dataset_extractor_lotus.lotus_stream import stream_sample_members
+from dataset_extractor_lotus.lotus_synthetic import write_synthetic_LOTUS
+from dataset_extractor_lotus.lotus_writer import append_rows
+
+DEFAULT_SCALES = [10_000, 100_000]
+
+# a stage slower than the baseline by more than this part is a regression
+DEFAULT_TOLERANCE = 0.25
+
+
+def _current_rss() -> int:
+    # the resident memory of the process in bytes (on linux from /proc, else the peak so far from getrusage)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class PeakRSS:
+    """
+    Measures the peak resident memory (RSS) of the process during a block, with a thread polling the RSS.
+
+    Example:
+        with PeakRSS() as rss:
+            df = read_LOTUS_dataset(path)
+        print(rss.peak - rss.start)
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        """
+        Args:
+            interval : float
+                The seconds between two measurements.
+        """
+        self.interval = interval
+        self.start = 0
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _current_rss())
+
+    def __enter__(self) -> "PeakRSS":
+        self.start = self.peak = _current_rss()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.peak = max(self.peak, _current_rss())
+
+
+def _stages() -> List[Tuple[str, Optional[Callable[[Dict[str, Any]], None]], Callable[[Dict[str, Any]], Any]]]:
+    # per stage: the name, the setup (not measured) and the measured function, which get the context
+    # (the paths, the number of rows and the results of the stages before)
+    genus, family = "organism_taxonomy_08genus", "organism_taxonomy_06family"
+
+    def clear_cache(context: Dict[str, Any]) -> None:
+        shutil.rmtree(context["cache_dir"], ignore_errors=True)
+
+    def remove_output(context: Dict[str, Any]) -> None:
+        for path in context["workdir"].glob("output.csv*"):
+            path.unlink()
+
+    def cached(context: Dict[str, Any], **options: Any) -> pl.LazyFrame:
+        return scan_LOTUS_dataset(context["input"], cache_dir=context["cache_dir"], **options)
+
+    def requests(context: Dict[str, Any]) -> None:
+        # 20 extractions over two taxa levels (the most frequent genera and families)
+        df = context["df"]
+        context["requests"] = [
+            {"taxalevel": level, "members": [member]}
+            for level in (genus, family)
+            for member in df[level].drop_nulls().value_counts(sort=True)[level].head(10).to_list()
+        ]
+
+    def mines_export(context: Dict[str, Any]) -> None:
+        df, _ = dedupe(context["df"].select(id="structure_inchikey", smiles="structure_smiles"), ["id", "smiles"])
+        mines_report(df)
+        suffix_duplicate_ids(df)
+
+    return [
+        ("generate", None, lambda context: write_synthetic_LOTUS(context["input"], context["rows"])),
+        ("read_csv", None, lambda context: read_LOTUS_dataset(context["input"], use_cache=False)),
+        ("cache_build", clear_cache, lambda context: cached(context).collect()),
+        ("read_cached", None, lambda context: context.update(df=cached(context).collect())),
+        ("read_categorical", None, lambda context: cached(context, categorical=True).collect()),
+        ("taxonomy_index", None, lambda context: TaxonomyIndex.build(context["df"].lazy(), levels=[family, genus])),
+        ("sample_members", None, lambda context: sample_members(context["df"].lazy(), genus, 10, seed=0)),
+        (
+            "sample_quotas",
+            None,
+            lambda context: sample_quotas(context["df"].lazy(), parse_quota_spec(f"{family}=*; {genus}=2; rows=5"), seed=0),
+        ),
+        ("shared_scan", requests, lambda context: shared_scan(context["df"], context["requests"])),
+        ("stream_sample", None, lambda context: stream_sample_members(context["input"], genus, 10, seed=0)),
+        ("dedupe", None, lambda context: dedupe(context["df"])),
+        ("mines_export", None, mines_export),
+        ("append_rows", remove_output, lambda context: append_rows(context["df"], context["workdir"] / "output.csv")),
+    ]
+
+
+STAGES = [name for name, _, _ in _stages()]
+
+
+def run_benchmarks(
+    scales: Sequence[int] = DEFAULT_SCALES,
+    repeat: int = 1,
+    stages: Optional[Sequence[str]] = None,
+    workdir: Optional[Union[str, Path]] = None,
+    compressed: bool = False,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Runs the stages (see STAGES) on a synthetic LOTUS dataset per scale. Every stage is run <repeat> times,
+    the fastest run counts (the others are slowed down by the machine, not by the code).
+
+    Args:
+        scales : list
+            The numbers of rows of the synthetic datasets (for example 10_000 to 10_000_000).
+        repeat : int
+            The number of runs per stage.
+        stages : list | None
+            The stages to measure (default: all). "generate" and "read_cached" always run (the others need
+            the dataset), but only the chosen stages are in the results.
+        workdir : str | Path | None
+            The directory for the datasets and the cache (default: a temporary directory, removed at the end).
+        compressed : bool
+            If True, the synthetic datasets are *.csv.gz (like the exports), else *.csv.
+        progress : callable | None
+            Called with the result of every stage (for example print).
+
+    Returns:
+        results : list
+            Per scale and stage: "rows", "stage", "seconds" (fastest run), "seconds_median", "peak_rss_mb"
+            (the highest RSS during the runs), "rss_increase_mb" (above the RSS at the start of the run)
+            and "rows_per_second".
+    """
+    chosen = set(stages or STAGES)
+    unknown = chosen - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages: {sorted(unknown)} (use {STAGES})")
+
+    temporary = workdir is None
+    workdir = Path(tempfile.mkdtemp(prefix="lotus_bench_") if workdir is None else workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    results = []
+    try:
+        for rows in scales:
+            context: Dict[str, Any] = {
+                "rows": rows,
+                "workdir": workdir,
+                "cache_dir": workdir / "cache",
+                "input": workdir / f"synthetic_{rows}.csv{'.gz' if compressed else ''}",
+            }
+            for name, setup, run in _stages():
+                if name not in chosen and name not in ("generate", "read_cached"):
+                    continue
+                seconds, peak, increase = [], 0, 0
+                for _ in range(1 if name == "generate" else repeat):
+                    if setup:
+                        setup(context)
+                    with PeakRSS() as rss:
+                        start = time.perf_counter()
+                        run(context)
+                        seconds.append(time.perf_counter() - start)
+                    peak, increase = max(peak, rss.peak), max(increase, rss.peak - rss.start)
+
+                if name not in chosen:
+                    continue
+                result = {
+                    "rows": rows,
+                    "stage": name,
+                    "seconds": min(seconds),
+                    "seconds_median": statistics.median(seconds),
+                    "peak_rss_mb": peak / 1024**2,
+                    "rss_increase_mb": increase / 1024**2,
+                    "rows_per_second": rows / min(seconds) if min(seconds) > 0 else float("inf"),
+                }
+                results.append(result)
+                if progress:
+                    progress(result)
+    finally:
+        if temporary:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def format_benchmarks(results: List[Dict[str, Any]]) -> pl.DataFrame:
+    """
+    Gives back the results as table for the console (one row per scale and stage).
+    """
+    return pl.DataFrame(results).select(
+        "rows",
+        "stage",
+        pl.col("seconds").round(4),
+        pl.col("peak_rss_mb").round(1),
+        pl.col("rss_increase_mb").round(1),
+        pl.col("rows_per_second").round(0).cast(pl.Int64),
+    )
+
+
+def write_benchmarks(results: List[Dict[str, Any]], path: Union[str, Path]) -> Path:
+    """
+    Writes the results as JSON (for example as baseline for compare_benchmarks).
+    """
+    path = Path(path)
+    with open(path, "w") as f:
+        json.dump({"polars": pl.__version__, "python": sys.version.split()[0], "results": results}, f, indent=1)
+    return path
+
+
+def compare_benchmarks(
+    results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float = DEFAULT_TOLERANCE
+) -> List[Dict[str, Any]]:
+    """
+    Gives back the stages, which are slower than in the baseline (same stage and rows) by more than the tolerance.
+
+    Returns:
+        regressions : list
+            Per slower stage: "rows", "stage", "seconds", "baseline_seconds" and "ratio".
+    """
+    baseline_seconds = {(result["rows"], result["stage"]): result["seconds"] for result in baseline}
+    regressions = []
+    for result in results:
+        before = baseline_seconds.get((result["rows"], result["stage"]))
+        if before and result["seconds"] > before * (1 + tolerance):
+            regressions.append({
+                "rows": result["rows"],
+                "stage": result["stage"],
+                "seconds": result["seconds"],
+                "baseline_seconds": before,
+                "ratio": result["seconds"] / before,
+            })
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks of dataset_extractor_lotus on synthetic LOTUS data.")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_SCALES, help="the sizes of the datasets")
+    parser.add_argument("--repeat", type=int, default=1, help="the number of runs per stage (the fastest counts)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, help="the stages to measure (default: all)")
+    parser.add_argument("--workdir", help="directory for the datasets and the cache (default: temporary)")
+    parser.add_argument("--gz", action="store_true", help="write the synthetic datasets as *.csv.gz")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare with the results of an earlier run (JSON)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown (0.25: 25%%)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        args.rows,
+        repeat=args.repeat,
+        stages=args.stages,
+        workdir=args.workdir,
+        compressed=args.gz,
+        progress=lambda result: print(f'{result["rows"]} rows, {result["stage"]}: {result["seconds"]:.3f} s'),
+    )
+    with pl.Config(tbl_rows=len(results) + 1):
+        print(format_benchmarks(results))
+    if args.output:
+        print("Written to:", write_benchmarks(results, args.output))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_benchmarks(results, json.load(f)["results"], args.tolerance)
+        for regression in regressions:
+            print(
+                f'Regression: {regression["stage"]} with {regression["rows"]} rows took {regression["seconds"]:.3f} s '
+                f'(baseline {regression["baseline_seconds"]:.3f} s, x{regression["ratio"]:.2f})'
+            )
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
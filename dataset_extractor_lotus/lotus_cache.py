@@ -0,0 +1,202 @@
+# Description:
+# persistent columnar cache (Arrow IPC) of the parsed LOTUS exports, keyed by the content hash of the source file.
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Union
+
+import polars as pl  # for data manipulation
+
+# bump this, when the parsing of the LOTUS exports changes (dtypes, gbifid fixup...). Old cache files get ignored.
+CACHE_SCHEMA_VERSION = 3
+
+# default maximal size of all the cache files together (in bytes)
+DEFAULT_CACHE_SIZE = 10 * 1024**3
+
+# name of the file, which remembers the content hash for (path, size, mtime) of the sources
+INDEX_FILENAME = "index.json"
+
+# the index file and the eviction are shared by the threads of a multi-file scan (see lotus_reader.scan_LOTUS_datasets)
+_index_lock = threading.Lock()
+
+
+def get_cache_dir(cache_dir: Optional[Union[str, Path]] = None) -> Path:
+    """
+    Gives back the cache directory. The order is: given cache_dir, $LOTUS_CACHE_DIR, ~/.cache/dataset_extractor_lotus
+
+    Args:
+        cache_dir : str | Path | None
+            The directory to store the cache files in.
+
+    Returns:
+        cache_dir : Path
+            The (created) cache directory.
+    """
+    if cache_dir is None:
+        cache_dir = os.environ.get("LOTUS_CACHE_DIR", Path.home() / ".cache" / "dataset_extractor_lotus")
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def file_hash(path: Union[str, Path], chunk_size: int = 1024**2) -> str:
+    """
+    Calculates the sha256 of a file, without loading the whole file into memory.
+
+    Args:
+        path : str | Path
+            The file to hash.
+        chunk_size : int
+            The number of bytes read at once.
+
+    Returns:
+        hash : str
+            The hexdigest of the sha256.
+    """
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _read_index(cache_dir: Path) -> Dict[str, Dict]:
+    try:
+        with open(cache_dir / INDEX_FILENAME) as f:
+            index: Dict[str, Dict] = json.load(f)
+            return index
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_index(cache_dir: Path, index: Dict[str, Dict]) -> None:
+    tmp_path = cache_dir / (INDEX_FILENAME + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp_path, cache_dir / INDEX_FILENAME)
+
+
+def source_hash(path: Union[str, Path], cache_dir: Path) -> str:
+    """
+    Gives back the content hash of the source file. The hash is only recalculated, if size or mtime changed.
+
+    Args:
+        path : str | Path
+            The source file (LOTUS export).
+        cache_dir : Path
+            The cache directory with the index file.
+
+    Returns:
+        hash : str
+            The hexdigest of the sha256 of the source file.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    with _index_lock:
+        entry = _read_index(cache_dir).get(str(path))
+    if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+        return str(entry["sha256"])
+
+    sha256 = file_hash(path)
+    with _index_lock:
+        index = _read_index(cache_dir)
+        index[str(path)] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha256}
+        _write_index(cache_dir, index)
+    return sha256
+
+
+def cache_path(sha256: str, cache_dir: Path, variant: str = "") -> Path:
+    """
+    Gives back the path of the cache file for one source hash, the schema version and a variant (reading options).
+    """
+    suffix = f"-{variant}" if variant else ""
+    return cache_dir / f"{sha256}-v{CACHE_SCHEMA_VERSION}{suffix}.arrow"
+
+
+def evict(cache_dir: Path, max_size: int = DEFAULT_CACHE_SIZE, keep: Optional[Path] = None) -> list:
+    """
+    Removes the least recently used cache files, until all of them together are smaller than max_size.
+    Cache files of other schema versions are always removed.
+
+    Args:
+        cache_dir : Path
+            The cache directory.
+        max_size : int
+            The maximal size of all cache files together (in bytes).
+        keep : Path | None
+            A cache file which will not be removed (the one just written).
+
+    Returns:
+        removed : list
+            The paths of the removed cache files.
+    """
+    removed = []
+    cache_files = []
+    for path in cache_dir.glob("*.arrow"):
+        if f"-v{CACHE_SCHEMA_VERSION}" not in path.name:
+            path.unlink()
+            removed.append(path)
+        else:
+            cache_files.append(path)
+
+    # the mtime is updated on every cache hit (see cached_scan), so the oldest one is the least recently used
+    cache_files.sort(key=lambda path: path.stat().st_mtime)
+    total_size = sum(path.stat().st_size for path in cache_files)
+
+    for path in cache_files:
+        if total_size <= max_size:
+            break
+        if path == keep:
+            continue
+        total_size -= path.stat().st_size
+        path.unlink()
+        removed.append(path)
+
+    return removed
+
+
+def cached_scan(
+    source: Union[str, Path],
+    load: Callable[[], pl.LazyFrame],
+    variant: str = "",
+    cache_dir: Optional[Union[str, Path]] = None,
+    max_size: int = DEFAULT_CACHE_SIZE,
+) -> pl.LazyFrame:
+    """
+    Scans the cached Arrow IPC copy of a source file (memory-mapped). If there is no cache file yet,
+    the source is loaded with <load> and written to the cache. Afterwards the old cache files are evicted.
+
+    Args:
+        source : str | Path
+            The source file (LOTUS export).
+        load : Callable
+            Function which gives back the parsed source as a LazyFrame.
+        variant : str
+            Name for the reading options and the layout, which change the parsed data (for example "allgbifids").
+        cache_dir : str | Path | None
+            The cache directory (see get_cache_dir).
+        max_size : int
+            The maximal size of all cache files together (in bytes).
+
+    Returns:
+        lf : pl.LazyFrame
+            The parsed source file.
+    """
+    cache_dir = get_cache_dir(cache_dir)
+    path = cache_path(source_hash(source, cache_dir), cache_dir, variant)
+
+    if path.exists():
+        # mark the cache file as recently used
+        os.utime(path)
+    else:
+        # write to a temporary file first, so an interrupted run never leaves a broken cache file
+        tmp_path = path.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+        load().collect().write_ipc(tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+        with _index_lock:
+            evict(cache_dir, max_size=max_size, keep=path)
+
+    return pl.scan_ipc(path, memory_map=True)
@@ -0,0 +1,100 @@
+# Description:
+# deduplication with one 64-bit row hash over the key columns (computed once and kept as a column),
+# with a verification of the rows with the same hash, so a hash collision never drops a row.
+
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import polars as pl  # for data manipulation
+
+# a LOTUS row is one structure-organism-reference pair
+DEFAULT_KEY_COLUMNS = ["structure_inchikey", "organism_wikidata", "reference_wikidata"]
+
+# name of the column with the row hash
+ROW_HASH = "__row_hash"
+
+
+def key_columns_for(columns: List[str]) -> List[str]:
+    """
+    Gives back the key columns for a file with these columns. If the LOTUS key columns aren't there
+    (for example in the MINES format), all columns are the key.
+    """
+    if all(column in columns for column in DEFAULT_KEY_COLUMNS):
+        return list(DEFAULT_KEY_COLUMNS)
+    return [column for column in columns if column != ROW_HASH]
+
+
+def row_hash(key_columns: List[str]) -> pl.Expr:
+    """
+    Expression of one 64-bit hash per row over the key columns (the native polars hash). The columns are compared
+    as strings, so the hash is the same, no matter which dtypes were used to read the file (Utf8, categorical, numbers).
+    The hash can change with the polars version, so it is only used in memory (see lotus_writer for the key index).
+    """
+    return pl.struct([pl.col(column).cast(pl.Utf8) for column in key_columns]).hash().alias(ROW_HASH)
+
+
+def add_row_hash(
+    data: Union[pl.DataFrame, pl.LazyFrame], key_columns: Optional[List[str]] = None
+) -> Union[pl.DataFrame, pl.LazyFrame]:
+    """
+    Adds the row hash as column ROW_HASH. If the column is already there, it is reused (not computed again).
+
+    Args:
+        data : pl.DataFrame | pl.LazyFrame
+            The rows.
+        key_columns : list | None
+            The columns, which identify a row. If None, see key_columns_for.
+    """
+    if ROW_HASH in data.columns:
+        return data
+    return data.with_columns(row_hash(key_columns or key_columns_for(data.columns)))
+
+
+def dedupe(
+    data: Union[pl.DataFrame, pl.LazyFrame], key_columns: Optional[List[str]] = None
+) -> Tuple[pl.DataFrame, Dict[str, Any]]:
+    """
+    Removes the duplicated rows (the first row of every key is kept, in the original order).
+    Only the row hash is compared; the rows with the same hash are verified with their key values,
+    so different keys with the same hash (a collision) are both kept.
+
+    Args:
+        data : pl.DataFrame | pl.LazyFrame
+            The rows. If the column ROW_HASH is there, it is reused.
+        key_columns : list | None
+            The columns, which identify a row. If None, see key_columns_for.
+
+    Returns:
+        df : pl.DataFrame
+            The rows without duplicates (with the column ROW_HASH, so it can be reused).
+        stats : dict
+            "rows", "unique" and "duplicates", "verified" (the number of rows with a hash, which is more than once)
+            and "collisions" (the number of hashes with different keys).
+    """
+    key_columns = key_columns or key_columns_for(data.columns)
+    df = add_row_hash(data, key_columns)
+    if isinstance(df, pl.LazyFrame):
+        df = df.collect()
+
+    keys = pl.struct([pl.col(column).cast(pl.Utf8) for column in key_columns])
+    df_verified = df.filter(pl.col(ROW_HASH).is_duplicated())
+    collisions = (
+        df_verified.group_by(ROW_HASH)
+        .agg(keys.n_unique().alias("keys"))
+        .filter(pl.col("keys") > 1)
+        .get_column(ROW_HASH)
+    )
+
+    # with a collision, the key values decide instead of the hash (only then, the keys are compared at all)
+    is_first = pl.col(ROW_HASH).is_first_distinct()
+    if len(collisions):
+        is_first = pl.when(pl.col(ROW_HASH).is_in(collisions)).then(keys.is_first_distinct()).otherwise(is_first)
+    df_unique = df.filter(is_first)
+
+    stats = {
+        "rows": len(df),
+        "unique": len(df_unique),
+        "duplicates": len(df) - len(df_unique),
+        "verified": len(df_verified),
+        "collisions": len(collisions),
+    }
+    return df_unique, stats
@@ -0,0 +1,140 @@
+# Description:
+# diff between two LOTUS releases: the added, removed and changed structure-organism-reference pairs,
+# with hash joins over the (cached) columnar form instead of comparing the full files.
+
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import polars as pl  # for data manipulation
+
+from dataset_extractor_lotus.lotus_dedup import DEFAULT_KEY_COLUMNS
+from dataset_extractor_lotus.lotus_reader import scan_LOTUS_dataset
+
+# name of the temporary column with the hash of all the other (not key) columns
+VALUE_HASH = "__value_hash"
+
+# suffix of the old values in the changed rows
+OLD_SUFFIX = "_old"
+
+
+def _value_hash(columns: List[str]) -> pl.Expr:
+    # the columns are compared as strings, so a different infered dtype in a release isn't a change
+    # (the native polars hash, it is only compared in memory and never saved)
+    return pl.struct([pl.col(column).cast(pl.Utf8) for column in columns]).hash().alias(VALUE_HASH)
+
+
+def diff_LOTUS(
+    lf_old: pl.LazyFrame,
+    lf_new: pl.LazyFrame,
+    key_columns: Optional[List[str]] = None,
+) -> Tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    """
+    Compares two releases of LOTUS. A row is identified by the key columns (one structure-organism-reference pair);
+    the other columns, which are in both releases, are compared through one hash per row, so only the keys and
+    the hashes are joined and the full rows are only materialized for the differences.
+
+    If a key is more than once in a release, only its first row is compared. A null in a key column is a value
+    like the others (two rows with the same keys and a null are the same pair).
+
+    Args:
+        lf_old : pl.LazyFrame
+            The old release (see lotus_reader.scan_LOTUS_dataset).
+        lf_new : pl.LazyFrame
+            The new release.
+        key_columns : list | None
+            The columns, which identify a row (default: structure_inchikey, organism_wikidata, reference_wikidata).
+
+    Returns:
+        df_added : pl.DataFrame
+            The rows of the new release with a key, which isn't in the old release.
+        df_removed : pl.DataFrame
+            The rows of the old release with a key, which isn't in the new release anymore.
+        df_changed : pl.DataFrame
+            The keys with different values: the new values, the old values (with the suffix "_old")
+            and the column "changed_columns" (list of the changed columns).
+    """
+    key_columns = list(key_columns or DEFAULT_KEY_COLUMNS)
+    new_columns = set(lf_new.columns)
+    value_columns = [column for column in lf_old.columns if column in new_columns and column not in key_columns]
+
+    lf_old = lf_old.unique(subset=key_columns, keep="first", maintain_order=True)
+    lf_new = lf_new.unique(subset=key_columns, keep="first", maintain_order=True)
+
+    df_added = lf_new.join(lf_old.select(key_columns), on=key_columns, how="anti", join_nulls=True).collect()
+    df_removed = lf_old.join(lf_new.select(key_columns), on=key_columns, how="anti", join_nulls=True).collect()
+
+    # without other columns than the keys, a pair can't change
+    if not value_columns:
+        df_changed = lf_new.clear().with_columns(pl.lit(None, dtype=pl.List(pl.Utf8)).alias("changed_columns")).collect()
+        return df_added, df_removed, df_changed
+
+    # join only the keys and the hashes, then the full rows of the changed keys
+    lf_changed_keys = (
+        lf_new.select(*key_columns, _value_hash(value_columns))
+        .join(
+            lf_old.select(*key_columns, _value_hash(value_columns)),
+            on=key_columns,
+            how="inner",
+            suffix=OLD_SUFFIX,
+            join_nulls=True,
+        )
+        .filter(pl.col(VALUE_HASH) != pl.col(VALUE_HASH + OLD_SUFFIX))
+        .select(key_columns)
+    )
+    changed_columns = [
+        pl.when(pl.col(column).cast(pl.Utf8).ne_missing(pl.col(column + OLD_SUFFIX).cast(pl.Utf8)))
+        .then(pl.lit(column))
+        for column in value_columns
+    ]
+    df_changed = (
+        lf_new.join(lf_changed_keys, on=key_columns, how="semi", join_nulls=True)
+        .join(
+            lf_old.select(*key_columns, *value_columns),
+            on=key_columns,
+            how="inner",
+            suffix=OLD_SUFFIX,
+            join_nulls=True,
+        )
+        .with_columns(pl.concat_list(changed_columns).list.drop_nulls().alias("changed_columns"))
+        .collect()
+    )
+
+    return df_added, df_removed, df_changed
+
+
+def diff_LOTUS_files(
+    old_file: Union[str, Path],
+    new_file: Union[str, Path],
+    key_columns: Optional[List[str]] = None,
+    use_cache: bool = True,
+) -> Tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    """
+    Compares two LOTUS exports (see diff_LOTUS). With use_cache, both are read from the columnar cache
+    (see lotus_cache), so a release is parsed only once.
+    """
+    return diff_LOTUS(
+        scan_LOTUS_dataset(old_file, use_cache=use_cache),
+        scan_LOTUS_dataset(new_file, use_cache=use_cache),
+        key_columns=key_columns,
+    )
+
+
+def write_diff(
+    output_path_file: Union[str, Path],
+    df_added: pl.DataFrame,
+    df_removed: pl.DataFrame,
+    df_changed: pl.DataFrame,
+) -> List[Path]:
+    """
+    Writes the diff into three csv files: <output>.added.csv, <output>.removed.csv and <output>.changed.csv
+    (the changed columns are joined with ";").
+
+    Returns:
+        paths : list
+            The written files.
+    """
+    paths = [Path(f"{output_path_file}.{part}.csv") for part in ("added", "removed", "changed")]
+    df_changed = df_changed.with_columns(pl.col("changed_columns").list.join(";"))
+    for path, df in zip(paths, [df_added, df_removed, df_changed]):
+        df.write_csv(path)
+    return paths
@@ -0,0 +1,180 @@
+# Description:
+# taxonomy index of a LOTUS dataset (per taxa level: the members with a code, their number of rows and their row ids),
+# built once per dataset and stored next to the columnar cache, so members, counts and rows are only lookups.
+
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np  # for the row ids
+import polars as pl  # for data manipulation
+
+from dataset_extractor_lotus import lotus_cache
+from dataset_extractor_lotus.lotus_reader import cache_variant, scan_LOTUS_dataset
+
+# variant of the cache file with the index (see lotus_cache.cache_path), followed by the layout and its version
+INDEX_VARIANT = "taxindex"
+
+# name of the temporary column with the row number
+ROW_ID = "__row_id"
+
+
+def taxonomy_levels(columns: List[str]) -> List[str]:
+    """
+    Gives back the columns with "taxonomy" in the name (the taxa levels, which can be sampled).
+    """
+    return [column for column in columns if "taxonomy" in column]
+
+
+class TaxonomyIndex:
+    """
+    Per taxa level a table with one row per member (sorted):
+        level : the taxa level
+        member : the member (as string, also for the id columns)
+        code : the position of the member in the sorted members of the level (categorical code)
+        count : the number of rows of the member
+        row_ids : the row numbers of the member in the dataset (sorted)
+
+    Example:
+        index = load_taxonomy_index("data/230106_frozen_metadata.csv.gz")
+        index.count("organism_taxonomy_08genus", "Abies")
+        df_abies = index.take(df, "organism_taxonomy_08genus", "Abies")
+    """
+
+    def __init__(self, df_index: pl.DataFrame) -> None:
+        """
+        Args:
+            df_index : pl.DataFrame
+                The index (columns: level, member, code, count, row_ids), see TaxonomyIndex.build.
+        """
+        self.df_index = df_index
+        self._members: Dict[str, Dict[str, int]] = {}
+        self._start: Dict[str, int] = {}
+
+        # the position of every member in df_index, so every lookup is O(1)
+        offset = 0
+        for df_level in df_index.partition_by("level", maintain_order=True):
+            level = df_level["level"][0]
+            self._start[level] = offset
+            self._members[level] = {member: code for code, member in enumerate(df_level["member"])}
+            offset += len(df_level)
+
+    @classmethod
+    def build(cls, lf: pl.LazyFrame, levels: Optional[List[str]] = None) -> "TaxonomyIndex":
+        """
+        Builds the index of a dataset with one pass per taxa level.
+
+        Args:
+            lf : pl.LazyFrame
+                The LOTUS dataset (see lotus_reader.scan_LOTUS_dataset).
+            levels : list | None
+                The taxa levels to index (default: all the columns with "taxonomy" in the name).
+        """
+        levels = levels or taxonomy_levels(lf.columns)
+        lf = lf.with_row_index(ROW_ID)
+
+        df_levels = []
+        for level in levels:
+            df_levels.append(
+                lf.select(pl.col(level).cast(pl.Utf8).alias("member"), ROW_ID)
+                .filter(pl.col("member").is_not_null())
+                .group_by("member")
+                .agg(pl.len().alias("count"), pl.col(ROW_ID).sort().alias("row_ids"))
+                .sort("member")
+                .with_columns(pl.lit(level).alias("level"), pl.int_range(0, pl.len(), dtype=pl.UInt32).alias("code"))
+                .select("level", "member", "code", "count", "row_ids")
+                .collect()
+            )
+        return cls(pl.concat(df_levels))
+
+    def levels(self) -> List[str]:
+        """
+        Gives back the indexed taxa levels.
+        """
+        return list(self._members)
+
+    def members(self, level: str) -> List[str]:
+        """
+        Gives back the members of a taxa level (sorted).
+        """
+        return list(self._members[level])
+
+    def code(self, level: str, member: str) -> Optional[int]:
+        """
+        Gives back the categorical code of a member (None: not in the dataset).
+        """
+        return self._members[level].get(member)
+
+    def count(self, level: str, member: str) -> int:
+        """
+        Gives back the number of rows of a member (0: not in the dataset).
+        """
+        code = self.code(level, member)
+        if code is None:
+            return 0
+        return int(self.df_index["count"][self._start[level] + code])
+
+    def row_ids(self, level: str, member: str) -> np.ndarray:
+        """
+        Gives back the row numbers of a member in the dataset (sorted).
+        """
+        code = self.code(level, member)
+        if code is None:
+            return np.array([], dtype=np.uint32)
+        row_ids: pl.Series = self.df_index["row_ids"][self._start[level] + code]
+        return row_ids.to_numpy()
+
+    def take(self, data: Union[pl.DataFrame, pl.LazyFrame], level: str, member: str) -> pl.DataFrame:
+        """
+        Gives back the rows of a member (without filtering the whole dataset). A LazyFrame isn't collected,
+        only the row numbers are compared, so only the selected columns of the member rows are materialized.
+
+        Args:
+            data : pl.DataFrame | pl.LazyFrame
+                The dataset, which was indexed (the columns can be selected or renamed, but no rows filtered).
+            level : str
+                The taxa level.
+            member : str
+                The member.
+        """
+        row_ids = self.row_ids(level, member)
+        if isinstance(data, pl.DataFrame):
+            return data[row_ids]
+        return (
+            data.with_row_index(ROW_ID)
+            .filter(pl.col(ROW_ID).is_in(pl.Series(row_ids, dtype=pl.UInt32)))
+            .drop(ROW_ID)
+            .collect()
+        )
+
+
+def load_taxonomy_index(
+    file_to_sample: Union[str, Path],
+    use_cache: bool = True,
+    cache_dir: Optional[Union[str, Path]] = None,
+) -> TaxonomyIndex:
+    """
+    Gives back the taxonomy index of a LOTUS dataset. With use_cache, it is stored as an Arrow IPC file
+    next to the columnar cache of the dataset (same content hash, layout and layout version, see lotus_cache)
+    and built only once.
+
+    Args:
+        file_to_sample : str | Path
+            The path to the LOTUS dataset.
+        use_cache : bool
+            If True, read and write the index in the cache.
+        cache_dir : str | Path | None
+            The cache directory (default: $LOTUS_CACHE_DIR or ~/.cache/dataset_extractor_lotus).
+
+    Returns:
+        index : TaxonomyIndex
+    """
+    if not use_cache:
+        return TaxonomyIndex.build(scan_LOTUS_dataset(file_to_sample, use_cache=False))
+
+    lf_index = lotus_cache.cached_scan(
+        file_to_sample,
+        load=lambda: TaxonomyIndex.build(scan_LOTUS_dataset(file_to_sample, cache_dir=cache_dir)).df_index.lazy(),
+        variant=f"{INDEX_VARIANT}-{cache_variant(file_to_sample)}",
+        cache_dir=cache_dir,
+    )
+    return TaxonomyIndex(lf_index.collect())
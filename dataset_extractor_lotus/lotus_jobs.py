@@ -0,0 +1,488 @@
+# Description:
+# non-interactive batch of extractions from a job spec (TOML or YAML). The tasks with the same input share
+# one load of it, the independent tasks run at the same time and every task reports its timing.
+
+import glob
+import json
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+import polars as pl  # for data manipulation
+
+from dataset_extractor_lotus import lotus_store
+from dataset_extractor_lotus.lotus_manifest import (
+    ROW_INDEX,
+    SOURCE,
+    add_row_keys,
+    new_seed,
+    pop_row_keys,
+    pop_source_row_keys,
+    scan_sources,
+    write_manifest,
+)
+from dataset_extractor_lotus.lotus_planner import shared_scan
+from dataset_extractor_lotus.lotus_reader import scan_LOTUS_dataset, to_categorical
+from dataset_extractor_lotus.lotus_sampler import parse_quota_spec, read_members_file, sample_members, sample_quotas
+from dataset_extractor_lotus.lotus_writer import append_rows
+
+DEFAULT_WORKERS = 4
+
+# per task its rows of the shared scan (or the error of the load or the scan)
+Loaded = Dict[str, Union[pl.DataFrame, BaseException]]
+
+# the output formats: all columns or the MINEs columns (structure_wikidata as id, structure_smiles as smiles)
+OUTPUT_FORMATS: Dict[str, Optional[Dict[str, str]]] = {
+    "full": None,
+    "mines": {"structure_wikidata": "id", "structure_smiles": "smiles"},
+}
+
+# the keys of a task (all of them can also be given in [defaults])
+TASK_KEYS = {
+    "name",
+    "input",
+    "output",
+    "format",
+    "taxalevel",
+    "members",
+    "members_file",
+    "all_members",
+    "samplesize_per_member",
+    "quotas",
+    "seed",
+    "use_cache",
+    "categorical",
+}
+
+
+def _load_toml(path: Path) -> Dict[str, Any]:
+    if sys.version_info >= (3, 11):
+        import tomllib
+    else:
+        try:
+            import tomli as tomllib
+        except ImportError as err:
+            raise ImportError("Reading a TOML job spec needs python >= 3.11 or the package tomli.") from err
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def _load_yaml(path: Path) -> Dict[str, Any]:
+    try:
+        import yaml  # type: ignore[import-untyped]
+    except ImportError as err:
+        raise ImportError("Reading a YAML job spec needs the package pyyaml.") from err
+    with open(path) as f:
+        spec: Dict[str, Any] = yaml.safe_load(f) or {}
+        return spec
+
+
+def read_job_spec(path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Reads a job spec (*.toml, *.yaml/*.yml or *.json) and gives back the tasks with the defaults applied
+    (see parse_job_spec). Example in TOML:
+
+        report = "jobs_report.json"
+
+        [defaults]
+        input = "7534071:230106_frozen_metadata.csv.gz"
+        seed = 42
+
+        [[tasks]]
+        name = "abies"
+        output = "abies.csv"
+        taxalevel = "organism_taxonomy_08genus"
+        members = ["Abies", "Picea"]
+        samplesize_per_member = 100
+
+        [[tasks]]
+        name = "families"
+        output = "families_mines.csv"
+        format = "mines"
+        quotas = "organism_taxonomy_06family=*; organism_taxonomy_08genus=10; rows=5"
+
+    The paths are relative to the current directory (like the command line options).
+    """
+    path = Path(path)
+    if path.suffix == ".toml":
+        spec = _load_toml(path)
+    elif path.suffix in (".yaml", ".yml"):
+        spec = _load_yaml(path)
+    elif path.suffix == ".json":
+        with open(path) as f:
+            spec = json.load(f)
+    else:
+        raise ValueError(f"Unknown format of the job spec {path} (use *.toml, *.yaml or *.json).")
+    return parse_job_spec(spec)
+
+
+def parse_job_spec(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Checks a job spec and applies the defaults to every task.
+
+    Args:
+        spec : dict
+            "tasks" (list of dicts, see TASK_KEYS), optional "defaults" (dict), "max_workers" (int)
+            and "report" (path of the JSON report).
+
+    Returns:
+        spec : dict
+            "tasks", "max_workers" and "report". Every task has a "name" and all the keys of TASK_KEYS.
+
+    Raises:
+        ValueError
+            If a task has unknown keys, no input or output, neither a taxalevel nor quotas, or the name of another task.
+    """
+    defaults = spec.get("defaults", {})
+    tasks: List[Dict[str, Any]] = []
+    for index, task_spec in enumerate(spec.get("tasks", [])):
+        task = {
+            "name": f"task_{index + 1}",
+            "format": "full",
+            "members": [],
+            "members_file": None,
+            "all_members": False,
+            "taxalevel": None,
+            "samplesize_per_member": None,
+            "quotas": None,
+            "seed": None,
+            "use_cache": True,
+            "categorical": False,
+            **defaults,
+            **task_spec,
+        }
+
+        unknown = set(task) - TASK_KEYS
+        if unknown:
+            raise ValueError(f'The task {task["name"]} has unknown keys: {sorted(unknown)}')
+        for key in ("input", "output"):
+            if not task.get(key):
+                raise ValueError(f'The task {task["name"]} has no {key}.')
+        task["format"] = task["format"].lower()
+        if task["format"] not in OUTPUT_FORMATS:
+            raise ValueError(f'The task {task["name"]} has an unknown format: {task["format"]} (use {list(OUTPUT_FORMATS)})')
+        if not task["quotas"] and not (task["taxalevel"] and task["samplesize_per_member"]):
+            raise ValueError(f'The task {task["name"]} needs quotas or a taxalevel and a samplesize_per_member.')
+
+        # one input or several (list or glob pattern, sampled as one dataset)
+        if isinstance(task["input"], (str, Path)):
+            task["input"] = [task["input"]]
+        task["input"] = [str(source) for source in task["input"]]
+        if isinstance(task["members"], str):
+            task["members"] = [task["members"]]
+        if any(other["name"] == task["name"] for other in tasks):
+            raise ValueError(f'The name {task["name"]} is used by more than one task.')
+        tasks.append(task)
+
+    return {"tasks": tasks, "max_workers": spec.get("max_workers", DEFAULT_WORKERS), "report": spec.get("report")}
+
+
+def input_key(task: Dict[str, Any]) -> Tuple[Tuple[str, ...], bool, bool]:
+    """
+    Gives back the key of the loaded input of a task. The tasks with the same key share one load.
+    """
+    return tuple(task["input"]), bool(task["use_cache"]), bool(task["categorical"])
+
+
+def plan_jobs(tasks: List[Dict[str, Any]]) -> Tuple[Dict[tuple, List[str]], List[List[Dict[str, Any]]]]:
+    """
+    Plans the tasks: every input is loaded once and the tasks are grouped into chains, which can run
+    at the same time. The tasks writing to the same output are one chain (in the order of the spec),
+    so an output file is never written by two tasks at once.
+
+    Returns:
+        inputs : dict
+            Per input key (see input_key) the names of the tasks using it.
+        chains : list
+            The chains of tasks (every chain runs in one thread, the chains in parallel).
+    """
+    inputs: Dict[tuple, List[str]] = {}
+    chains: Dict[str, List[Dict[str, Any]]] = {}
+    for task in tasks:
+        inputs.setdefault(input_key(task), []).append(task["name"])
+        chains.setdefault(str(Path(task["output"]).resolve()), []).append(task)
+    return inputs, list(chains.values())
+
+
+def load_input(key: Tuple[Tuple[str, ...], bool, bool]) -> pl.LazyFrame:
+    """
+    Scans the input of a group of tasks lazily (with the row numbers for the manifest, see lotus_manifest).
+    Several sources (or a glob pattern) are scanned in parallel as one dataset with the file of every row.
+    Nothing is collected here: the shared scan (see lotus_planner.shared_scan) pushes the combined filter of
+    all the tasks down to the reader and collects once.
+    """
+    sources, use_cache, categorical = key
+    paths = [source if glob.has_magic(source) else str(lotus_store.resolve(source)) for source in sources]
+
+    if len(paths) > 1 or glob.has_magic(paths[0]):
+        lf = scan_sources(paths, use_cache=use_cache)
+        return to_categorical(lf) if categorical else lf
+    lf = scan_LOTUS_dataset(paths[0], use_cache=use_cache, categorical=categorical)
+    return add_row_keys(lf)
+
+
+def extraction_request(task: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Gives back the filter of a task for the shared scan (see lotus_planner.request_predicate),
+    with the members of the members file.
+    """
+    if task["quotas"]:
+        return {"quotas": parse_quota_spec(task["quotas"])}
+
+    members = list(task["members"])
+    if task["members_file"]:
+        members += read_members_file(task["members_file"])
+    return {"taxalevel": task["taxalevel"], "members": None if task["all_members"] else members}
+
+
+def run_task(task: Dict[str, Any], df_input: pl.DataFrame) -> Dict[str, Any]:
+    """
+    Samples one task from its rows (the input or its partition of the shared scan, see lotus_planner.shared_scan),
+    appends the sample to the output (see lotus_writer.append_rows) and writes the manifest
+    (see lotus_manifest.write_manifest).
+
+    Returns:
+        result : dict
+            "rows" (sampled), "written", "skipped" (duplicates), "seed", "sample_seconds" and "write_seconds".
+    """
+    start = time.perf_counter()
+    seed = task["seed"] if task["seed"] is not None else new_seed()
+    lf = df_input.lazy()
+    request = extraction_request(task)
+
+    if task["quotas"]:
+        df_sampled, _ = sample_quotas(lf, request["quotas"], seed=seed)
+        parameters: Dict[str, Any] = {"quotas": task["quotas"]}
+    else:
+        df_sampled, _ = sample_members(
+            lf,
+            taxalevel=task["taxalevel"],
+            samplesize_per_member=int(task["samplesize_per_member"]),
+            members=request["members"],
+            seed=seed,
+        )
+        parameters = {
+            "taxalevel": task["taxalevel"],
+            "members": request["members"],
+            "samplesize_per_member": int(task["samplesize_per_member"]),
+        }
+
+    rename = OUTPUT_FORMATS[task["format"]]
+    select = list(rename) if rename else None
+    if rename:
+        keys = [column for column in (ROW_INDEX, SOURCE) if column in df_sampled.columns]
+        df_sampled = df_sampled.select([*keys, *rename]).rename(rename)
+
+    if SOURCE in df_sampled.columns:
+        df_sampled, source_row_keys = pop_source_row_keys(df_sampled)
+    else:
+        df_sampled, row_keys = pop_row_keys(df_sampled)
+        source_row_keys = {str(lotus_store.resolve(task["input"][0])): row_keys}
+    sampled = time.perf_counter()
+
+    output_exists = Path(task["output"]).exists()
+    written, skipped = append_rows(df_sampled, task["output"])
+    for index, (source, row_keys) in enumerate(source_row_keys.items()):
+        write_manifest(
+            task["output"],
+            source=source,
+            row_keys=row_keys,
+            seed=seed,
+            parameters=parameters,
+            select=select,
+            rename=rename,
+            append=output_exists or index > 0,
+        )
+
+    return {
+        "rows": len(df_sampled),
+        "written": written,
+        "skipped": skipped,
+        "seed": seed,
+        "sample_seconds": sampled - start,
+        "write_seconds": time.perf_counter() - sampled,
+    }
+
+
+def _scan_tasks(lf_input: pl.LazyFrame, requests: Dict[str, Dict[str, Any]]) -> Loaded:
+    # one scan with the filters of all the tasks; if it fails (for example an unknown taxalevel),
+    # every task is scanned alone, so only the invalid ones fail
+    try:
+        return dict(zip(requests, shared_scan(lf_input, list(requests.values()))))
+    except Exception:
+        loaded: Loaded = {}
+        for name, request in requests.items():
+            try:
+                loaded[name] = shared_scan(lf_input, [request])[0]
+            except Exception as err:
+                loaded[name] = err
+        return loaded
+
+
+def load_tasks(key: Tuple[Tuple[str, ...], bool, bool], tasks: List[Dict[str, Any]]) -> Tuple[Loaded, float, float]:
+    """
+    Loads one input (see load_input) and gives back the rows of every task using it (see lotus_planner.shared_scan).
+    A failing load fails all the tasks, a task with an invalid filter (for example a missing members file) only itself.
+
+    Returns:
+        loaded : dict
+            Per task name its rows or the error.
+        load_seconds : float
+            The time to open the input.
+        scan_seconds : float
+            The time to read and filter it in the shared scan.
+    """
+    start = time.perf_counter()
+    try:
+        lf_input = load_input(key)
+    except Exception as err:
+        return {task["name"]: err for task in tasks}, time.perf_counter() - start, 0.0
+    load_seconds = time.perf_counter() - start
+
+    loaded: Loaded = {}
+    requests = {}
+    for task in tasks:
+        try:
+            requests[task["name"]] = extraction_request(task)
+        except Exception as err:
+            loaded[task["name"]] = err
+    start = time.perf_counter()
+    loaded.update(_scan_tasks(lf_input, requests))
+    return loaded, load_seconds, time.perf_counter() - start
+
+
+def _task_result(
+    task: Dict[str, Any], rows: Union[pl.DataFrame, BaseException], load_seconds: float, scan_seconds: float
+) -> Dict[str, Any]:
+    # runs one task (see run_task), a failing task gives back its error instead of raising it
+    result = {
+        "name": task["name"],
+        "input": list(task["input"]),
+        "output": str(task["output"]),
+        "status": "ok",
+        "error": None,
+        "rows": 0,
+        "written": 0,
+        "skipped": 0,
+        "seed": task["seed"],
+        "load_seconds": load_seconds,
+        "scan_seconds": scan_seconds,
+        "sample_seconds": 0.0,
+        "write_seconds": 0.0,
+    }
+    try:
+        if isinstance(rows, BaseException):
+            raise rows
+        result.update(run_task(task, rows))
+    except Exception as err:
+        result.update(status="failed", error=f"{type(err).__name__}: {err}")
+    result["seconds"] = result["sample_seconds"] + result["write_seconds"]
+    return result
+
+
+def _run_when_loaded(
+    executor: ThreadPoolExecutor,
+    load: Callable[[tuple], None],
+    run_chain: Callable[[List[Dict[str, Any]]], None],
+    keys: List[tuple],
+    chains: List[List[Dict[str, Any]]],
+) -> None:
+    # loads all the inputs and starts every chain as soon as all its inputs are loaded, then waits for the chains
+    pending: Dict[Future, tuple] = {executor.submit(load, key): key for key in keys}
+    loaded_keys: Set[tuple] = set()
+    waiting = list(chains)
+    running: List[Future] = []
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            future.result()
+            loaded_keys.add(pending.pop(future))
+        ready = [chain for chain in waiting if all(input_key(task) in loaded_keys for task in chain)]
+        waiting = [chain for chain in waiting if chain not in ready]
+        running += [executor.submit(run_chain, chain) for chain in ready]
+    for future in running:
+        future.result()
+
+
+def run_jobs(
+    tasks: List[Dict[str, Any]],
+    max_workers: int = DEFAULT_WORKERS,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Runs the tasks of a job spec (see parse_job_spec and plan_jobs). The inputs are loaded in parallel,
+    every input only once, in one scan with the filters of all its tasks (see lotus_planner.shared_scan).
+    A chain of tasks starts as soon as all its inputs are loaded, the chains run in parallel.
+    A failing task doesn't stop the others, its error is in the report.
+
+    Args:
+        tasks : list
+            The tasks (see parse_job_spec).
+        max_workers : int
+            The number of inputs loaded and chains run at the same time.
+        progress : callable | None
+            Called with the result of every task, when it is done (for example print).
+
+    Returns:
+        report : list
+            Per task (in the order of the spec): "name", "input", "output", "status" ("ok" or "failed"), "error",
+            "rows", "written", "skipped", "seed", "load_seconds" (opening its shared input), "scan_seconds"
+            (reading and filtering it in the shared scan), "sample_seconds", "write_seconds" and "seconds" (sample and write).
+    """
+    inputs, chains = plan_jobs(tasks)
+    tasks_by_name = {task["name"]: task for task in tasks}
+    loads: Dict[tuple, Tuple[Loaded, float, float]] = {}
+    results: Dict[str, Dict[str, Any]] = {}
+    lock = threading.Lock()
+
+    def load(key: tuple) -> None:
+        loads[key] = load_tasks(key, [tasks_by_name[name] for name in inputs[key]])
+
+    def run_chain(chain: List[Dict[str, Any]]) -> None:
+        for task in chain:
+            loaded, load_seconds, scan_seconds = loads[input_key(task)]
+            result = _task_result(task, loaded[task["name"]], load_seconds, scan_seconds)
+            with lock:
+                results[task["name"]] = result
+            if progress:
+                progress(result)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        _run_when_loaded(executor, load, run_chain, list(inputs), chains)
+
+    return [results[task["name"]] for task in tasks]
+
+
+def format_job_report(report: List[Dict[str, Any]]) -> pl.DataFrame:
+    """
+    Gives back the report as table for the console (one row per task).
+    """
+    return pl.DataFrame(
+        [
+            {
+                "name": result["name"],
+                "status": result["status"],
+                "rows": result["rows"],
+                "written": result["written"],
+                "load_s": round(result["load_seconds"], 3),
+                "scan_s": round(result["scan_seconds"], 3),
+                "sample_s": round(result["sample_seconds"], 3),
+                "write_s": round(result["write_seconds"], 3),
+                "output": result["output"],
+            }
+            for result in report
+        ]
+    )
+
+
+def write_job_report(report: List[Dict[str, Any]], path: Union[str, Path]) -> Path:
+    """
+    Writes the report as JSON (for example for the logs of a scheduler).
+    """
+    path = Path(path)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=1, default=str)
+    return path
@@ -0,0 +1,215 @@
+# Description:
+# sidecar manifest of a sampled toydataset (source hash, parameters, seed and the sampled rows),
+# so the toydataset can be materialized again from the source without storing the output.
+
+import datetime  # for the creation time
+import json
+import secrets  # for a random seed, if none is given
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import polars as pl  # for data manipulation
+
+from dataset_extractor_lotus import lotus_cache
+from dataset_extractor_lotus.lotus_dedup import ROW_HASH, dedupe
+from dataset_extractor_lotus.lotus_reader import (
+    gbifids_to_text,
+    harmonize_schemas,
+    scan_LOTUS_dataset,
+    scan_LOTUS_datasets,
+)
+
+MANIFEST_VERSION = 1
+
+# name of the column with the row number in the source file (the key of the sampled rows)
+ROW_INDEX = "__row_index"
+
+# name of the column with the source file, if several files are sampled at once
+SOURCE = "__source"
+
+
+def manifest_path(output_path_file: Union[str, Path]) -> Path:
+    """
+    Gives back the path of the manifest next to the output file (<output>.manifest.json).
+    """
+    return Path(f"{output_path_file}.manifest.json")
+
+
+def new_seed() -> int:
+    """
+    Gives back a random seed. It is used if the user gives none, so every sample can be repeated.
+    """
+    return secrets.randbits(32)
+
+
+def add_row_keys(lf: pl.LazyFrame) -> pl.LazyFrame:
+    """
+    Adds the row number in the source file as column ROW_INDEX (before any filter).
+    """
+    return lf.with_row_index(ROW_INDEX)
+
+
+def pop_row_keys(df: pl.DataFrame) -> Tuple[pl.DataFrame, List[int]]:
+    """
+    Removes the column ROW_INDEX again.
+
+    Returns:
+        df : pl.DataFrame
+            The sample without the ROW_INDEX column.
+        row_keys : list
+            The sorted row numbers of the sample in the source file.
+    """
+    return df.drop(ROW_INDEX), sorted(df[ROW_INDEX].to_list())
+
+
+def scan_sources(
+    files_to_sample: Sequence[Union[str, Path]], use_cache: bool = True, keep_all_gbifids: bool = False
+) -> pl.LazyFrame:
+    """
+    Scans several LOTUS datasets as one LazyFrame (see lotus_reader.scan_LOTUS_datasets) with the row number
+    inside every file (ROW_INDEX) and the file (SOURCE), so every sampled row can be found again.
+    """
+    return scan_LOTUS_datasets(
+        files_to_sample,
+        keep_all_gbifids=keep_all_gbifids,
+        use_cache=use_cache,
+        source_column=SOURCE,
+        row_index_name=ROW_INDEX,
+    )
+
+
+def pop_source_row_keys(df: pl.DataFrame) -> Tuple[pl.DataFrame, Dict[str, List[int]]]:
+    """
+    Removes the columns ROW_INDEX and SOURCE again (see scan_sources).
+
+    Returns:
+        df : pl.DataFrame
+            The sample without the ROW_INDEX and SOURCE columns.
+        row_keys : dict
+            Per source file the sorted row numbers of the sample (only the files with sampled rows).
+    """
+    row_keys = {
+        df_source[SOURCE][0]: sorted(df_source[ROW_INDEX].to_list())
+        for df_source in df.partition_by(SOURCE, maintain_order=True)
+    }
+    return df.drop([ROW_INDEX, SOURCE]), row_keys
+
+
+def read_manifest(path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Reads a manifest. If the file doesn't exist, an empty manifest is given back.
+    """
+    try:
+        with open(path) as f:
+            manifest: Dict[str, Any] = json.load(f)
+            return manifest
+    except FileNotFoundError:
+        return {"manifest_version": MANIFEST_VERSION, "samples": []}
+
+
+def source_sha256(source: Union[str, Path]) -> str:
+    """
+    Gives back the sha256 of a source file from the index of the cache (see lotus_cache.source_hash),
+    so a release, which was already read, isn't hashed again (only if its size or mtime changed).
+    """
+    return lotus_cache.source_hash(source, lotus_cache.get_cache_dir())
+
+
+def write_manifest(
+    output_path_file: Union[str, Path],
+    source: Union[str, Path],
+    row_keys: List[int],
+    seed: int,
+    parameters: Dict[str, Any],
+    select: Optional[List[str]] = None,
+    rename: Optional[Dict[str, str]] = None,
+    append: bool = True,
+) -> Path:
+    """
+    Adds one sample to the manifest of the output file. Every run, which appends to an output file,
+    adds its own entry, so the manifest describes the whole output file.
+
+    Args:
+        output_path_file : str | Path
+            The output file (the manifest is written to <output>.manifest.json).
+        source : str | Path
+            The LOTUS dataset, which was sampled from.
+        row_keys : list
+            The row numbers of the sampled rows in the source (see pop_row_keys).
+        seed : int
+            The seed of the sampling.
+        parameters : dict
+            The filters and quotas of the sampling (only informative, for example taxalevel and members).
+            With "keep_all_gbifids": True, the rows are materialized with all the gbifids (see lotus_reader.fix_gbifid).
+        select : list | None
+            The columns written to the output file (None: all columns).
+        rename : dict | None
+            The renaming of the columns in the output file (for example for the MINES format).
+        append : bool
+            If False, the existing manifest is replaced (the output file was written new).
+
+    Returns:
+        path : Path
+            The path of the manifest.
+    """
+    path = manifest_path(output_path_file)
+    manifest: Dict[str, Any] = read_manifest(path) if append else {"manifest_version": MANIFEST_VERSION, "samples": []}
+
+    source = Path(source).resolve()
+    manifest["samples"].append({
+        "source": str(source),
+        "source_sha256": source_sha256(source),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "seed": seed,
+        "parameters": parameters,
+        "select": select,
+        "rename": rename,
+        "rows": row_keys,
+    })
+
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    return path
+
+
+def materialize_manifest(
+    path: Union[str, Path],
+    source: Optional[Union[str, Path]] = None,
+    use_cache: bool = True,
+) -> pl.DataFrame:
+    """
+    Materializes the toydataset of a manifest again from its sources. Only the listed rows are taken,
+    the sampling itself isn't repeated.
+
+    Args:
+        path : str | Path
+            The manifest.
+        source : str | Path | None
+            Use this file instead of the sources in the manifest (for example if the file was moved).
+            The content has to be the same (checked with the sha256).
+        use_cache : bool
+            If True, read and write the columnar cache of the sources.
+
+    Returns:
+        df : pl.DataFrame
+            The toydataset (without duplicates, like the output file, see lotus_writer). All the gbifids
+            (keep_all_gbifids) are text like in the LOTUS exports (see lotus_reader.gbifids_to_text).
+    """
+    samples = []
+    for sample in read_manifest(path)["samples"]:
+        sample_source = source or sample["source"]
+        if source_sha256(sample_source) != sample["source_sha256"]:
+            raise ValueError(f"The content of {sample_source} is not the same as in the manifest {path}.")
+
+        keep_all_gbifids = bool(sample["parameters"].get("keep_all_gbifids"))
+        lf = add_row_keys(scan_LOTUS_dataset(sample_source, keep_all_gbifids=keep_all_gbifids, use_cache=use_cache))
+        lf = gbifids_to_text(lf.filter(pl.col(ROW_INDEX).is_in(sample["rows"])).drop(ROW_INDEX))
+        if sample["select"]:
+            lf = lf.select(sample["select"])
+        if sample["rename"]:
+            lf = lf.rename(sample["rename"])
+        samples.append(lf)
+
+    # the sources can be different releases with other columns or dtypes
+    df, _ = dedupe(pl.concat(harmonize_schemas(samples), how="diagonal_relaxed").collect())
+    return df.drop(ROW_HASH)
@@ -0,0 +1,122 @@
+# Description:
+# export of a LOTUS dataset in the MINEs format (columns "id" and "smiles") and the report of its
+# uniqueness and duplicates, computed in one lazy aggregation.
+
+import json
+from pathlib import Path
+from typing import Any, Dict, TypeVar, Union
+
+import polars as pl  # for data manipulation
+
+# suffix of the numbered ids, if one id has more than one smiles ("<id>_id1", "<id>_id2"...)
+ID_SUFFIX = "_id"
+
+# a DataFrame or a LazyFrame (the functions give back the same type)
+FrameT = TypeVar("FrameT", pl.DataFrame, pl.LazyFrame)
+
+# one (id, smiles) pair, compared natively by polars (no row hash is needed for the in-memory report)
+PAIR = pl.struct("id", "smiles")
+
+
+def _duplicates(values: pl.Expr, name: str) -> pl.Expr:
+    # the values, which are in more than one distinct (id, smiles) pair, with their number of pairs
+    return values.filter(values.is_duplicated()).value_counts().struct.rename_fields([name, "count"]).implode()
+
+
+def suffix_duplicate_ids(data: FrameT) -> FrameT:
+    """
+    Numbers the ids, which have more than one smiles ("<id>_id1", "<id>_id2"... in the order of the rows),
+    so every id of the MINEs export is unique. The other ids are not changed.
+    The duplicated (id, smiles) pairs have to be removed before (see lotus_dedup.dedupe).
+
+    Args:
+        data : pl.DataFrame | pl.LazyFrame
+            The dataset with the columns "id" and "smiles".
+
+    Returns:
+        data : pl.DataFrame | pl.LazyFrame
+            The dataset with the numbered ids.
+    """
+    number = pl.col("id").cum_count().over("id")
+    return data.with_columns(
+        pl.when(pl.col("smiles").n_unique().over("id") > 1)
+        .then(pl.concat_str([pl.col("id"), pl.lit(ID_SUFFIX), number.cast(pl.Utf8)]))
+        .otherwise(pl.col("id"))
+        .alias("id")
+    )
+
+
+def mines_report(data: Union[pl.DataFrame, pl.LazyFrame]) -> Dict[str, Any]:
+    """
+    Gives back the uniqueness and the duplicates of a MINEs dataset. All the numbers and the duplicate lists
+    are one aggregation of one lazy query, so the data is only scanned once.
+
+    Args:
+        data : pl.DataFrame | pl.LazyFrame
+            The dataset with the columns "id" and "smiles".
+
+    Returns:
+        report : dict
+            "rows", "unique_rows" (distinct (id, smiles) pairs), "unique_ids", "unique_smiles",
+            "duplicate_ids" (ids with more than one smiles) and "duplicate_smiles" (smiles with more than one id),
+            the duplicate lists as [{"id"/"smiles": ..., "count": ...}] (most duplicated first).
+    """
+    is_first_pair = PAIR.is_first_distinct()
+
+    report = (
+        data.lazy()
+        .select(
+            pl.len().alias("rows"),
+            PAIR.n_unique().alias("unique_rows"),
+            pl.col("id").n_unique().alias("unique_ids"),
+            pl.col("smiles").n_unique().alias("unique_smiles"),
+            _duplicates(pl.col("id").filter(is_first_pair), "id").alias("duplicate_ids"),
+            _duplicates(pl.col("smiles").filter(is_first_pair), "smiles").alias("duplicate_smiles"),
+        )
+        .collect()
+        .to_dicts()[0]
+    )
+
+    # the order of value_counts isn't fixed, so sort the (small) lists
+    for column, key in [("duplicate_ids", "id"), ("duplicate_smiles", "smiles")]:
+        report[column] = sorted(report[column], key=lambda entry: (-entry["count"], str(entry[key])))
+    return report
+
+
+def format_mines_report(report: Dict[str, Any], max_duplicates: int = 20) -> str:
+    """
+    Gives back the report as text for the console (see mines_report).
+
+    Args:
+        report : dict
+            The report.
+        max_duplicates : int
+            The maximal number of duplicates shown per column.
+    """
+    lines = [
+        "--- Uniqueness of dataframe ---",
+        f'rows: {report["rows"]}',
+        f'all columns: {report["unique_rows"]}',
+        f'id: {report["unique_ids"]}',
+        f'smiles: {report["unique_smiles"]}',
+    ]
+    for column, key, text in [
+        ("duplicate_ids", "id", "Duplicate IDs found"),
+        ("duplicate_smiles", "smiles", "Duplicate SMILES found"),
+    ]:
+        if report[column]:
+            lines.append(f"{text} ({len(report[column])}):")
+            lines += [f'    {entry[key]}: {entry["count"]}' for entry in report[column][:max_duplicates]]
+            if len(report[column]) > max_duplicates:
+                lines.append("    ...")
+    return "\n".join(lines)
+
+
+def write_mines_report(report: Dict[str, Any], path: Union[str, Path]) -> Path:
+    """
+    Writes the report as JSON (for example for a check of every release in the CI).
+    """
+    path = Path(path)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=1, default=str)
+    return path
@@ -0,0 +1,106 @@
+# Description:
+# shared scan for several extractions from the same LOTUS dataset: the filters of all the extractions are merged
+# into one predicate (one is_in per taxa level), the dataset is filtered once and the rows are partitioned
+# to the extractions with one boolean mask per extraction.
+
+from typing import Any, Dict, List, Optional, Union
+
+import polars as pl  # for data manipulation
+
+from dataset_extractor_lotus.lotus_sampler import ROWS
+
+# prefix of the temporary columns with the mask of every extraction
+MASK_PREFIX = "__request_"
+
+
+def request_predicate(request: Dict[str, Any]) -> pl.Expr:
+    """
+    Gives back the filter of one extraction.
+
+    Args:
+        request : dict
+            Either "taxalevel" and "members" (None: all the members of the taxa level, see lotus_sampler.sample_members)
+            or "quotas" (see lotus_sampler.parse_quota_spec: the rows with all the quota levels).
+    """
+    if request.get("quotas") is not None:
+        levels = [quota["level"] for quota in request["quotas"] if quota["level"] != ROWS]
+        if not levels:
+            return pl.lit(True)
+        return pl.all_horizontal([pl.col(level).is_not_null() for level in levels])
+
+    if request.get("members") is None:
+        return pl.col(request["taxalevel"]).is_not_null()
+    return pl.col(request["taxalevel"]).is_in(request["members"])
+
+
+def combined_predicate(requests: List[Dict[str, Any]]) -> Optional[pl.Expr]:
+    """
+    Merges the filters of several extractions into one predicate: the members of all the extractions on the
+    same taxa level are one is_in, the levels and quotas are combined with "or".
+
+    Returns:
+        predicate : pl.Expr | None
+            The predicate or None, if an extraction needs all the rows (nothing to filter).
+    """
+    members: Dict[str, Optional[set]] = {}
+    predicates = []
+    for request in requests:
+        if request.get("quotas") is not None:
+            if all(quota["level"] == ROWS for quota in request["quotas"]):
+                return None
+            predicates.append(request_predicate(request))
+        else:
+            level = request["taxalevel"]
+            if request.get("members") is None or (level in members and members[level] is None):
+                members[level] = None
+            else:
+                members[level] = (members.get(level) or set()) | set(request["members"])
+
+    for level, level_members in members.items():
+        if level_members is None:
+            predicates.append(pl.col(level).is_not_null())
+        else:
+            predicates.append(pl.col(level).is_in(sorted(level_members)))
+
+    if not predicates:
+        return None
+    return pl.any_horizontal(predicates)
+
+
+def shared_scan(data: Union[pl.DataFrame, pl.LazyFrame], requests: List[Dict[str, Any]]) -> List[pl.DataFrame]:
+    """
+    Filters the dataset once for several extractions and gives back the rows of every extraction.
+    The dataset can be already loaded (see lotus_reader.read_LOTUS_dataset, the filter runs on the loaded
+    taxonomy columns) or a LazyFrame (the combined predicate is pushed down to the reader),
+    so N extractions cost about one scan instead of N.
+
+    Example:
+        df_abies, df_rosaceae = shared_scan(df, [
+            {"taxalevel": "organism_taxonomy_08genus", "members": ["Abies"]},
+            {"taxalevel": "organism_taxonomy_06family", "members": ["Rosaceae"]},
+        ])
+
+    Args:
+        data : pl.DataFrame | pl.LazyFrame
+            The LOTUS dataset.
+        requests : list
+            The extractions (see request_predicate).
+
+    Returns:
+        partitions : list
+            Per extraction (in the same order) the rows matching its filter, with all the columns
+            (in the order of the dataset). A row can be in several partitions.
+    """
+    if not requests:
+        return []
+
+    masks = [f"{MASK_PREFIX}{index}" for index in range(len(requests))]
+    lf = data.lazy()
+    predicate = combined_predicate(requests)
+    if predicate is not None:
+        lf = lf.filter(predicate)
+    df = lf.with_columns(
+        request_predicate(request).fill_null(False).alias(mask) for request, mask in zip(requests, masks)
+    ).collect()
+
+    return [df.filter(pl.col(mask)).drop(masks) for mask in masks]
@@ -0,0 +1,352 @@
+# Description:
+# read the LOTUS exports (*.csv, *.csv.gz...) as polars LazyFrames or DataFrames.
+
+import glob
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Sequence, TypeVar, Union
+
+import polars as pl  # for data manipulation
+
+from dataset_extractor_lotus import lotus_cache
+from dataset_extractor_lotus.lotus_schema import layout_version, read_LOTUS_header, resolve_layout, schema_for
+
+# suffixes of compressed files, which can't be scanned lazily by polars
+COMPRESSED_SUFFIXES = (".gz", ".zip", ".zst", ".bz2", ".xz")
+
+# string columns with many repeated values, which are encoded as categoricals in the categorical load profile
+CATEGORICAL_PREFIXES = ("organism_taxonomy_", "structure_taxonomy_", "reference_")
+CATEGORICAL_SUFFIXES = ("_wikidata",)
+
+# sorted by the strings (not by the order the strings were seen), so the sorting is the same as for Utf8
+CATEGORICAL = pl.Categorical(ordering="lexical")
+
+# a DataFrame or a LazyFrame (the functions give back the same type)
+FrameT = TypeVar("FrameT", pl.DataFrame, pl.LazyFrame)
+
+
+def fix_gbifid(lf: pl.LazyFrame, keep_all_gbifids: bool = False) -> pl.LazyFrame:
+    """
+    Casts the column "organism_taxonomy_gbifid" with native polars expressions (no python callback per row).
+
+    Some organisms have multiple gbifids, written as "c(2685530, 7291394)". By default they will be null
+    and the column is Int32. With keep_all_gbifids, all the IDs are kept and the column is List[Int32].
+
+    Args:
+        lf : pl.LazyFrame
+            The LOTUS dataset.
+        keep_all_gbifids : bool
+            If True, parse the "c(...)" values into a List[Int32] column instead of setting them to null.
+
+    Returns:
+        lf : pl.LazyFrame
+            The LOTUS dataset with the fixed gbifid column (or unchanged, if the column doesn't exist).
+    """
+    schema = lf.schema
+    if "organism_taxonomy_gbifid" not in schema:
+        return lf
+
+    gbifid = pl.col("organism_taxonomy_gbifid")
+
+    if schema["organism_taxonomy_gbifid"].is_numeric():
+        gbifid = gbifid.cast(pl.Int32, strict=False)
+        if keep_all_gbifids:
+            gbifid = gbifid.cast(pl.List(pl.Int32))
+    elif keep_all_gbifids:
+        gbifid = (
+            gbifid.str.strip_prefix("c(")
+            .str.strip_suffix(")")
+            .str.split(",")
+            .list.eval(pl.element().str.strip_chars().cast(pl.Int32, strict=False))
+        )
+    else:
+        # Cast with strict=False, so everything which isn't a single ID will be null
+        gbifid = pl.when(gbifid.str.starts_with("c(")).then(None).otherwise(gbifid).cast(pl.Int32, strict=False)
+
+    return lf.with_columns(gbifid.alias("organism_taxonomy_gbifid"))
+
+
+def gbifids_to_text(data: FrameT) -> FrameT:
+    """
+    Writes a List[Int32] "organism_taxonomy_gbifid" column (see fix_gbifid with keep_all_gbifids) back as text
+    like in the LOTUS exports ("2685484" or "c(2685530, 7291394)"), so it can be written to a csv file
+    and read again. Other columns and a gbifid column, which isn't a list, are not changed.
+    """
+    if data.schema.get("organism_taxonomy_gbifid") != pl.List(pl.Int32):
+        return data
+
+    gbifids = pl.col("organism_taxonomy_gbifid")
+    return data.with_columns(
+        pl.when(gbifids.list.len() > 1)
+        .then(pl.concat_str([pl.lit("c("), gbifids.cast(pl.List(pl.Utf8)).list.join(", "), pl.lit(")")]))
+        .otherwise(gbifids.list.first().cast(pl.Utf8))
+        .alias("organism_taxonomy_gbifid")
+    )
+
+
+def _scan_csv(file_to_sample: Union[str, Path], keep_all_gbifids: bool = False) -> pl.LazyFrame:
+    """
+    Scans a LOTUS export (csv) lazily. Compressed files (*.csv.gz...) can't be scanned by polars.
+    They are parsed once and wrapped in a LazyFrame.
+
+    The dtypes of all the columns come from the schema registry (see lotus_schema), so nothing is infered.
+
+    Args:
+        file_to_sample : str | Path
+            The path to the LOTUS dataset.
+        keep_all_gbifids : bool
+            If True, "organism_taxonomy_gbifid" is a List[Int32] column with all the IDs of "c(...)" values.
+
+    Returns:
+        lf : pl.LazyFrame
+            The LOTUS dataset.
+
+    Raises:
+        lotus_schema.SchemaMismatchError
+            If the columns of the file are not a layout of the schema registry.
+    """
+    dtypes = schema_for(read_LOTUS_header(file_to_sample))
+    null_values = ["", "NA"]
+
+    if str(file_to_sample).endswith(COMPRESSED_SUFFIXES):
+        lf = pl.read_csv(
+            file_to_sample, dtypes=dtypes, separator=",", infer_schema_length=0, null_values=null_values
+        ).lazy()
+    else:
+        lf = pl.scan_csv(file_to_sample, dtypes=dtypes, separator=",", infer_schema_length=0, null_values=null_values)
+
+    return fix_gbifid(lf, keep_all_gbifids=keep_all_gbifids)
+
+
+def categorical_columns(schema: dict) -> List[str]:
+    """
+    Gives back the string columns, which are encoded in the categorical load profile
+    (organism_taxonomy_*, structure_taxonomy_*, reference_* and *_wikidata).
+    """
+    return [
+        column
+        for column, dtype in schema.items()
+        if dtype == pl.Utf8 and (column.startswith(CATEGORICAL_PREFIXES) or column.endswith(CATEGORICAL_SUFFIXES))
+    ]
+
+
+def to_categorical(lf: pl.LazyFrame) -> pl.LazyFrame:
+    """
+    Casts the repeated string columns (see categorical_columns) to categoricals. Filters, group-bys and
+    dedupes on these columns compare integer codes instead of strings.
+
+    The global string cache is enabled, so the codes are the same in all the frames
+    (for example when comparing with the members or joining two releases).
+    """
+    pl.enable_string_cache()
+    return lf.with_columns(pl.col(categorical_columns(lf.schema)).cast(CATEGORICAL))
+
+
+def categorical_memory_report(lf: pl.LazyFrame) -> pl.DataFrame:
+    """
+    Gives back the memory of every column of the categorical load profile as Utf8 and as categorical.
+    The columns are collected together in one read (a compressed file without the cache isn't parsed
+    once per column), then measured one after another.
+
+    Returns:
+        df_report : pl.DataFrame
+            Per column: "utf8_bytes", "categorical_bytes", "saved_bytes" and "saved_percent".
+    """
+    pl.enable_string_cache()
+    df = lf.select(categorical_columns(lf.schema)).collect()
+    rows = []
+    for series in df.get_columns():
+        rows.append({
+            "column": series.name,
+            "utf8_bytes": series.estimated_size(),
+            "categorical_bytes": series.cast(CATEGORICAL).estimated_size(),
+        })
+
+    return pl.DataFrame(
+        rows, schema={"column": pl.Utf8, "utf8_bytes": pl.Int64, "categorical_bytes": pl.Int64}
+    ).with_columns(
+        (pl.col("utf8_bytes") - pl.col("categorical_bytes")).alias("saved_bytes"),
+        (100 * (1 - pl.col("categorical_bytes") / pl.col("utf8_bytes"))).round(1).alias("saved_percent"),
+    )
+
+
+def cache_variant(file_to_sample: Union[str, Path], keep_all_gbifids: bool = False) -> str:
+    """
+    Gives back the variant of the cache file (see lotus_cache.cached_scan): the layout of the file, its version
+    in the schema registry (see lotus_schema.layout_version) and the reading options.
+    """
+    layout = resolve_layout(read_LOTUS_header(file_to_sample))
+    return f"{layout}-{layout_version(layout)}" + ("-allgbifids" if keep_all_gbifids else "")
+
+
+def scan_LOTUS_dataset(
+    file_to_sample: Union[str, Path],
+    keep_all_gbifids: bool = False,
+    use_cache: bool = True,
+    cache_dir: Optional[Union[str, Path]] = None,
+    categorical: bool = False,
+) -> pl.LazyFrame:
+    """
+    Scans a LOTUS dataset lazily. Filters and column selections on the returned LazyFrame are pushed down
+    to the reader, so only the needed rows and columns get materialized on ".collect()".
+
+    With use_cache, the parsed dataset is stored as Arrow IPC file in the cache directory (see lotus_cache) and
+    the next reads of the same file memory-map this copy instead of decompressing and parsing it again.
+    The cache key has the layout of the file and its version in the schema registry (see lotus_schema),
+    so a change of the registered dtypes parses the file again.
+    Without the cache, compressed files (*.csv.gz...) are parsed once and wrapped in a LazyFrame,
+    because polars can't scan them.
+
+    Args:
+        file_to_sample : str | Path
+            The path to the LOTUS dataset.
+        keep_all_gbifids : bool
+            If True, "organism_taxonomy_gbifid" is a List[Int32] column with all the IDs of "c(...)" values.
+        use_cache : bool
+            If True, read and write the columnar cache.
+        cache_dir : str | Path | None
+            The cache directory (default: $LOTUS_CACHE_DIR or ~/.cache/dataset_extractor_lotus).
+        categorical : bool
+            If True, the repeated string columns are categoricals (see to_categorical).
+            The cache keeps the Utf8 columns, the cast is done when collecting.
+
+    Returns:
+        lf : pl.LazyFrame
+            The LOTUS dataset.
+    """
+    if not use_cache:
+        lf = _scan_csv(file_to_sample, keep_all_gbifids=keep_all_gbifids)
+        return to_categorical(lf) if categorical else lf
+
+    lf = lotus_cache.cached_scan(
+        file_to_sample,
+        load=lambda: _scan_csv(file_to_sample, keep_all_gbifids=keep_all_gbifids),
+        variant=cache_variant(file_to_sample, keep_all_gbifids=keep_all_gbifids),
+        cache_dir=cache_dir,
+    )
+    return to_categorical(lf) if categorical else lf
+
+
+def read_LOTUS_dataset(
+    file_to_sample: Union[str, Path],
+    keep_all_gbifids: bool = False,
+    use_cache: bool = True,
+    cache_dir: Optional[Union[str, Path]] = None,
+    categorical: bool = False,
+) -> pl.DataFrame:
+    """
+    Reads a full LOTUS dataset (see scan_LOTUS_dataset).
+
+    Args:
+        file_to_sample : str | Path
+            The path to the LOTUS dataset.
+        keep_all_gbifids : bool
+            If True, "organism_taxonomy_gbifid" is a List[Int32] column with all the IDs of "c(...)" values.
+        use_cache : bool
+            If True, read and write the columnar cache.
+        cache_dir : str | Path | None
+            The cache directory (default: $LOTUS_CACHE_DIR or ~/.cache/dataset_extractor_lotus).
+        categorical : bool
+            If True, the repeated string columns are categoricals (see to_categorical).
+
+    Returns:
+        df : pl.DataFrame
+            The LOTUS dataset.
+    """
+    return scan_LOTUS_dataset(
+        file_to_sample,
+        keep_all_gbifids=keep_all_gbifids,
+        use_cache=use_cache,
+        cache_dir=cache_dir,
+        categorical=categorical,
+    ).collect()
+
+
+def expand_sources(patterns: Sequence[Union[str, Path]]) -> List[Path]:
+    """
+    Gives back the files of a list of paths and glob patterns (for example "data/*_frozen_metadata.csv.gz"),
+    in the given order and sorted inside every pattern. A file is only taken once.
+
+    Raises:
+        FileNotFoundError
+            If a pattern matches no file.
+    """
+    files: List[Path] = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(str(pattern))) if glob.has_magic(str(pattern)) else [str(pattern)]
+        if not matches or not Path(matches[0]).exists():
+            raise FileNotFoundError(f"No LOTUS dataset found for {pattern}.")
+        files += [Path(match) for match in matches if Path(match) not in files]
+    return files
+
+
+def harmonize_schemas(lfs: List[pl.LazyFrame]) -> List[pl.LazyFrame]:
+    """
+    Makes the schemas of several LOTUS datasets (for example of different releases) compatible for one concatenation:
+    a column with different numeric dtypes gets the common supertype (in pl.concat), a column with different
+    other dtypes is cast to Utf8. The columns, which are missing in a dataset, are null there.
+    """
+    dtypes: dict = {}
+    for lf in lfs:
+        for column, dtype in lf.schema.items():
+            dtypes.setdefault(column, set()).add(dtype)
+
+    to_utf8 = [
+        column
+        for column, column_dtypes in dtypes.items()
+        if len(column_dtypes) > 1 and not all(dtype.is_numeric() for dtype in column_dtypes)
+    ]
+    return [lf.with_columns(pl.col([column for column in to_utf8 if column in lf.columns]).cast(pl.Utf8)) for lf in lfs]
+
+
+def scan_LOTUS_datasets(
+    files_to_sample: Sequence[Union[str, Path]],
+    keep_all_gbifids: bool = False,
+    use_cache: bool = True,
+    cache_dir: Optional[Union[str, Path]] = None,
+    max_workers: int = 4,
+    source_column: Optional[str] = None,
+    row_index_name: Optional[str] = None,
+) -> pl.LazyFrame:
+    """
+    Scans several LOTUS datasets (paths or glob patterns, for example several Zenodo versions) as one LazyFrame.
+    The files are scanned at the same time (the parsing of the *.csv.gz and the writing of the cache run in threads),
+    the schemas are harmonized (see harmonize_schemas) and concatenated lazily, so a sampling over the union
+    is one pass.
+
+    Args:
+        files_to_sample : list
+            The paths or glob patterns of the LOTUS datasets.
+        keep_all_gbifids : bool
+            If True, "organism_taxonomy_gbifid" is a List[Int32] column with all the IDs of "c(...)" values.
+        use_cache : bool
+            If True, read and write the columnar cache.
+        cache_dir : str | Path | None
+            The cache directory (default: $LOTUS_CACHE_DIR or ~/.cache/dataset_extractor_lotus).
+        max_workers : int
+            The number of files scanned at the same time.
+        source_column : str | None
+            If given, a column with the path of the file of every row is added.
+        row_index_name : str | None
+            If given, a column with the row number inside its file is added (for the manifest).
+
+    Returns:
+        lf : pl.LazyFrame
+            The union of the LOTUS datasets.
+    """
+    files = expand_sources(files_to_sample)
+
+    def scan(file_to_sample: Path) -> pl.LazyFrame:
+        lf = scan_LOTUS_dataset(
+            file_to_sample, keep_all_gbifids=keep_all_gbifids, use_cache=use_cache, cache_dir=cache_dir
+        )
+        if row_index_name:
+            lf = lf.with_row_index(row_index_name)
+        if source_column:
+            lf = lf.with_columns(pl.lit(str(file_to_sample)).alias(source_column))
+        return lf
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        lfs = list(executor.map(scan, files))
+
+    return pl.concat(harmonize_schemas(lfs), how="diagonal_relaxed")
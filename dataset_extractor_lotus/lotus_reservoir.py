@@ -0,0 +1,116 @@
+# Description:
+# reservoir sampling engine: sample N rows per stratum in a single pass over record batches,
+# with only O(N x strata) rows in memory.
+
+from typing import List, Optional
+
+import numpy as np  # for the random numbers
+import polars as pl  # for data manipulation
+
+from dataset_extractor_lotus.lotus_sampler import RANDOM_COLUMN
+
+# name of the temporary stratum column, if the whole file is one stratum
+ALL_STRATUM = "__all"
+
+
+class ReservoirSampler:
+    """
+    Per stratum reservoir of the rows with the smallest random numbers (bottom-k sampling).
+    The rows of every stratum with the N smallest random numbers are a uniform sample without replacement,
+    so the result is statistically the same as ".sample(n=N)" per stratum. With the same seed and the same rows,
+    it is exactly the same sample as lotus_sampler.sample_members.
+
+    Like in Algorithm L, a row is only looked at, if it can still get into the reservoir: as soon as a stratum
+    is full, only the rows with a smaller random number than the biggest one in its reservoir are kept.
+
+    Example:
+        sampler = ReservoirSampler(10, strata=["organism_taxonomy_08genus"], seed=42)
+        for df_batch in iter_LOTUS_batches("data/230106_frozen_metadata.csv.gz"):
+            sampler.add(df_batch)
+        df_sampled = sampler.sample()
+    """
+
+    def __init__(self, samplesize: int, strata: Optional[List[str]] = None, seed: Optional[int] = None) -> None:
+        """
+        Args:
+            samplesize : int
+                The number of rows to sample per stratum.
+            strata : list | None
+                The columns, which define the strata (for example ["organism_taxonomy_08genus"]).
+                If None, the whole input is one stratum.
+            seed : int | None
+                The seed for the random numbers.
+        """
+        self.samplesize = int(samplesize)
+        self.strata = list(strata) if strata else [ALL_STRATUM]
+        self.rng = np.random.default_rng(seed)
+        self.df_reservoir: Optional[pl.DataFrame] = None
+        self.df_available: Optional[pl.DataFrame] = None
+
+    def add(self, df_batch: pl.DataFrame) -> None:
+        """
+        Adds the next batch of rows (all batches need the same columns).
+        """
+        # one random number per row (in the order of the rows), even for the rows which are skipped afterwards
+        df_batch = df_batch.with_columns(pl.Series(RANDOM_COLUMN, self.rng.random(len(df_batch))))
+        if self.strata == [ALL_STRATUM]:
+            df_batch = df_batch.with_columns(pl.lit(True).alias(ALL_STRATUM))
+
+        # count the rows per stratum over all batches
+        df_available = df_batch.group_by(self.strata).agg(pl.len().alias("available"))
+        if self.df_available is not None:
+            df_available = (
+                pl.concat([self.df_available, df_available]).group_by(self.strata).agg(pl.col("available").sum())
+            )
+        self.df_available = df_available
+
+        if self.df_reservoir is not None:
+            # skip the rows, which can't get into the full reservoirs
+            df_thresholds = self.df_reservoir.group_by(self.strata).agg(
+                pl.col(RANDOM_COLUMN).max().alias("__threshold"),
+                pl.len().alias("__size"),
+            )
+            df_batch = (
+                df_batch.join(df_thresholds, on=self.strata, how="left")
+                .filter(
+                    pl.col("__threshold").is_null()
+                    | (pl.col("__size") < self.samplesize)
+                    | (pl.col(RANDOM_COLUMN) < pl.col("__threshold"))
+                )
+                .drop(["__threshold", "__size"])
+            )
+            df_batch = pl.concat([self.df_reservoir, df_batch], how="vertical_relaxed")
+
+        self.df_reservoir = df_batch.filter(pl.col(RANDOM_COLUMN).rank("ordinal").over(self.strata) <= self.samplesize)
+
+    def sample(self, sort_by: Optional[str] = None) -> pl.DataFrame:
+        """
+        Gives back the sampled rows of all strata.
+
+        Args:
+            sort_by : str | None
+                Sort the rows by this column (for example the row number in the file).
+
+        Returns:
+            df_sampled : pl.DataFrame
+                The sampled rows.
+        """
+        if self.df_reservoir is None:
+            raise ValueError("No rows were added to the reservoir.")
+
+        df_sampled = self.df_reservoir.drop(RANDOM_COLUMN)
+        if self.strata == [ALL_STRATUM]:
+            df_sampled = df_sampled.drop(ALL_STRATUM)
+        if sort_by:
+            df_sampled = df_sampled.sort(sort_by)
+        return df_sampled
+
+    def available(self) -> pl.DataFrame:
+        """
+        Gives back the number of rows per stratum (columns: <strata>, "available").
+        """
+        if self.df_available is None:
+            raise ValueError("No rows were added to the reservoir.")
+        if self.strata == [ALL_STRATUM]:
+            return self.df_available.drop(ALL_STRATUM)
+        return self.df_available
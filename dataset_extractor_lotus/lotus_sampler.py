@@ -0,0 +1,268 @@
+# Description:
+# sample N lines per member of a taxa level T (for many members at once) from a LOTUS dataset.
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np  # for the random numbers
+import polars as pl  # for data manipulation
+
+# name of the temporary column with the random numbers
+RANDOM_COLUMN = "__random"
+
+
+def read_members_file(path: Union[str, Path]) -> List[str]:
+    """
+    Reads the members to sample from a file (one member per line, empty lines and lines with "#" are skipped).
+
+    Args:
+        path : str | Path
+            The file with the members.
+
+    Returns:
+        members : list
+            The members in the order of the file.
+    """
+    with open(path) as f:
+        members = [line.strip() for line in f]
+    return [member for member in members if member and not member.startswith("#")]
+
+
+def sample_members(
+    lf: pl.LazyFrame,
+    taxalevel: str,
+    samplesize_per_member: int,
+    members: Optional[List[str]] = None,
+    seed: Optional[int] = None,
+) -> Tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Samples up to <samplesize_per_member> rows for every member of the taxa level in one pass.
+    Every row gets a random number and the rows with the smallest numbers per member are kept,
+    which is the same as sampling without replacement inside every member.
+
+    Args:
+        lf : pl.LazyFrame
+            The LOTUS dataset (see lotus_reader.scan_LOTUS_dataset).
+        taxalevel : str
+            The column of the taxa level (for example "organism_taxonomy_08genus").
+        samplesize_per_member : int
+            The number of rows to sample per member. If a member has less rows, all of them are taken.
+        members : list | None
+            The members to sample from. If None, all members of the taxa level are sampled.
+        seed : int | None
+            The seed for the random numbers. With the same seed and dataset, the same rows are sampled.
+
+    Returns:
+        df_sampled : pl.DataFrame
+            The sampled rows of all members.
+        df_counts : pl.DataFrame
+            Per member: the number of available and of sampled rows (columns: <taxalevel>, "available", "sampled").
+    """
+    if members is None:
+        lf = lf.filter(pl.col(taxalevel).is_not_null())
+    else:
+        lf = lf.filter(pl.col(taxalevel).is_in(members))
+
+    df = lf.collect()
+    random_numbers = np.random.default_rng(seed).random(len(df))
+
+    df_sampled = (
+        df.with_columns(pl.Series(RANDOM_COLUMN, random_numbers))
+        .filter(pl.col(RANDOM_COLUMN).rank("ordinal").over(taxalevel) <= int(samplesize_per_member))
+        .drop(RANDOM_COLUMN)
+    )
+
+    df_available = df.group_by(taxalevel).agg(pl.len().alias("available"))
+    return df_sampled, count_members(df_available, taxalevel, samplesize_per_member, members)
+
+
+def count_members(
+    df_available: pl.DataFrame,
+    taxalevel: str,
+    samplesize_per_member: int,
+    members: Optional[List[str]] = None,
+) -> pl.DataFrame:
+    """
+    Gives back the number of available and sampled rows per member.
+
+    Args:
+        df_available : pl.DataFrame
+            The number of rows per member (columns: <taxalevel>, "available").
+        taxalevel : str
+            The column of the taxa level.
+        samplesize_per_member : int
+            The number of rows to sample per member.
+        members : list | None
+            The members to sample from. The members without any row are added (in the given order).
+
+    Returns:
+        df_counts : pl.DataFrame
+            Per member: the number of available and of sampled rows (columns: <taxalevel>, "available", "sampled").
+    """
+    df_counts = (
+        df_available.with_columns(
+            pl.min_horizontal("available", pl.lit(int(samplesize_per_member), dtype=pl.UInt32)).alias("sampled")
+        )
+        .sort(taxalevel)
+    )
+
+    # add the members without any row
+    if members is not None:
+        df_counts = (
+            pl.DataFrame({taxalevel: members}, schema={taxalevel: df_counts.schema[taxalevel]})
+            .unique(maintain_order=True)
+            .join(df_counts, on=taxalevel, how="left")
+            .fill_null(0)
+        )
+
+    return df_counts
+
+
+# level name of the quota for the rows (instead of the members of a taxa level)
+ROWS = "rows"
+
+
+def parse_quota_spec(spec: str) -> List[dict]:
+    """
+    Parses a quota specification like "organism_taxonomy_06family=*; organism_taxonomy_08genus=10; rows=5"
+    (all families, 10 genera per family, 5 rows per genus).
+
+    Every entry is "<level>=<quota>[:<floor>[:<cap>]]" and the quota is a number, a percentage of the
+    group size (for example "10%") or "*" for everything. The last entry can be "rows".
+
+    Args:
+        spec : str
+            The quota specification.
+
+    Returns:
+        quotas : list
+            One dict per level with the keys "level", "n", "fraction", "floor" and "cap" (see sample_quotas).
+    """
+    quotas = []
+    for entry in spec.split(";"):
+        if not entry.strip():
+            continue
+        level, _, value = entry.partition("=")
+        amount, floor, cap = (value.split(":") + ["", ""])[:3]
+        amount = amount.strip()
+
+        quota: Dict[str, Any] = {"level": level.strip(), "n": None, "fraction": None, "floor": 0, "cap": None}
+        if amount.endswith("%"):
+            quota["fraction"] = float(amount[:-1]) / 100
+        elif amount not in ("*", ""):
+            quota["n"] = int(amount)
+        if floor.strip():
+            quota["floor"] = int(floor)
+        if cap.strip():
+            quota["cap"] = int(cap)
+        quotas.append(quota)
+
+    if any(quota["level"] == ROWS for quota in quotas[:-1]):
+        raise ValueError(f'The quota for "{ROWS}" has to be the last one: {spec}')
+    return quotas
+
+
+def _over(expr: pl.Expr, parents: List[str]) -> pl.Expr:
+    # window expression over the parents (or the whole frame for the first level)
+    return expr.over(parents) if parents else expr
+
+
+def _requested(quota: dict) -> pl.Expr:
+    # the requested number of members/rows per stratum (column "available" is the size of the stratum)
+    if quota.get("n") is not None:
+        requested = pl.lit(quota["n"])
+    elif quota.get("fraction") is not None:
+        requested = (pl.col("available") * quota["fraction"]).round(0)
+    else:
+        requested = pl.col("available")
+
+    requested = pl.max_horizontal(requested.cast(pl.Int64), pl.lit(quota.get("floor") or 0))
+    if quota.get("cap") is not None:
+        requested = pl.min_horizontal(requested, pl.lit(quota["cap"]))
+    return requested
+
+
+def sample_quotas(
+    lf: pl.LazyFrame, quotas: List[dict], seed: Optional[int] = None
+) -> Tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Samples hierarchical quotas over the taxonomy, for example 10 genera per family and 5 rows per genus:
+
+        [
+            {"level": "organism_taxonomy_06family"},
+            {"level": "organism_taxonomy_08genus", "n": 10},
+            {"level": "rows", "n": 5},
+        ]
+
+    Every quota chooses members of its level inside every member of the levels before (the strata).
+    The members and rows are chosen with random numbers ranked over the strata, so every level needs
+    only grouped operations over the full frame.
+
+    Args:
+        lf : pl.LazyFrame
+            The LOTUS dataset (see lotus_reader.scan_LOTUS_dataset).
+        quotas : list
+            One dict per level (see parse_quota_spec) with the keys:
+                level : the column of the taxa level or "rows"
+                n : the number of members/rows per stratum
+                fraction : the part of the stratum size (proportional allocation), if n is None
+                floor : the minimal number per stratum
+                cap : the maximal number per stratum
+            If neither n nor fraction is given, all members/rows are taken. Without a "rows" quota at the end,
+            all rows of the chosen members are taken.
+        seed : int | None
+            The seed for the random numbers. With the same seed and dataset, the same rows are sampled.
+
+    Returns:
+        df_sampled : pl.DataFrame
+            The sampled rows.
+        df_report : pl.DataFrame
+            Per level and stratum the number of "available", "requested" and "achieved" members/rows.
+    """
+    levels = [quota["level"] for quota in quotas if quota["level"] != ROWS]
+    if quotas and quotas[-1]["level"] == ROWS:
+        quotas = list(quotas)
+    else:
+        quotas = [*quotas, {"level": ROWS}]
+
+    # only "rows" (a simple random sample) has no level to filter
+    if levels:
+        lf = lf.filter(pl.all_horizontal([pl.col(level).is_not_null() for level in levels]))
+    df = lf.collect()
+    rng = np.random.default_rng(seed)
+    reports = []
+
+    for index, quota in enumerate(quotas):
+        parents = levels[:index]
+
+        # one unit per member of the level (or per row for the last quota)
+        if quota["level"] == ROWS:
+            df_units = df
+        else:
+            df_units = df.select([*parents, quota["level"]]).unique().sort([*parents, quota["level"]])
+
+        df_units = df_units.with_columns(
+            pl.Series(RANDOM_COLUMN, rng.random(len(df_units))),
+            _over(pl.len(), parents).alias("available"),
+        ).with_columns(_requested(quota).alias("requested"))
+        df_units = df_units.with_columns(pl.min_horizontal("requested", "available").alias("achieved"))
+
+        # the counts are the same for all units of a stratum, so one row per stratum is enough for the report
+        if parents:
+            stratum = pl.concat_str([pl.col(parent).cast(pl.Utf8) for parent in parents], separator=" / ")
+        else:
+            stratum = pl.lit("all")
+        reports.append(
+            df_units.select(
+                pl.lit(quota["level"]).alias("level"), stratum.alias("stratum"), "available", "requested", "achieved"
+            ).unique(subset="stratum", maintain_order=True)
+        )
+
+        df_units = df_units.filter(_over(pl.col(RANDOM_COLUMN).rank("ordinal"), parents) <= pl.col("requested"))
+        if quota["level"] == ROWS:
+            df = df_units.drop([RANDOM_COLUMN, "available", "requested", "achieved"])
+        else:
+            df = df.join(df_units.select([*parents, quota["level"]]), on=[*parents, quota["level"]], how="semi")
+
+    df_report = pl.concat(reports).with_columns(pl.col("available", "requested", "achieved").cast(pl.Int64))
+    return df, df_report
@@ -0,0 +1,201 @@
+# Description:
+# registry of the LOTUS export layouts with the explicit dtypes of all columns per layout, so the exports are read
+# without schema inference, and a new layout (new or missing columns) fails fast with a diff against the known ones.
+
+import csv
+import gzip
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import polars as pl  # for data manipulation
+
+# the columns and dtypes of the frozen_metadata exports (the releases since 2021, for example 230106_frozen_metadata.csv.gz).
+# "organism_taxonomy_gbifid" is read as text, because of the multiple IDs like "c(2685530, 7291394)" (see fix_gbifid)
+LOTUS_COLUMNS: Dict[str, pl.PolarsDataType] = {
+    "structure_wikidata": pl.Utf8,
+    "structure_inchikey": pl.Utf8,
+    "structure_inchi": pl.Utf8,
+    "structure_smiles": pl.Utf8,
+    "structure_molecular_formula": pl.Utf8,
+    "structure_exact_mass": pl.Float64,
+    "structure_xlogp": pl.Float32,
+    "structure_smiles_2D": pl.Utf8,
+    "structure_cid": pl.UInt32,
+    "structure_nameIupac": pl.Utf8,
+    "structure_nameTraditional": pl.Utf8,
+    "structure_stereocenters_total": pl.UInt32,
+    "structure_stereocenters_unspecified": pl.UInt32,
+    "structure_taxonomy_npclassifier_01pathway": pl.Utf8,
+    "structure_taxonomy_npclassifier_02superclass": pl.Utf8,
+    "structure_taxonomy_npclassifier_03class": pl.Utf8,
+    "structure_taxonomy_classyfire_chemontid": pl.Utf8,
+    "structure_taxonomy_classyfire_01kingdom": pl.Utf8,
+    "structure_taxonomy_classyfire_02superclass": pl.Utf8,
+    "structure_taxonomy_classyfire_03class": pl.Utf8,
+    "structure_taxonomy_classyfire_04directparent": pl.Utf8,
+    "organism_wikidata": pl.Utf8,
+    "organism_name": pl.Utf8,
+    "organism_taxonomy_gbifid": pl.Utf8,
+    "organism_taxonomy_ncbiid": pl.UInt32,
+    "organism_taxonomy_ottid": pl.UInt32,
+    "organism_taxonomy_01domain": pl.Utf8,
+    "organism_taxonomy_02kingdom": pl.Utf8,
+    "organism_taxonomy_03phylum": pl.Utf8,
+    "organism_taxonomy_04class": pl.Utf8,
+    "organism_taxonomy_05order": pl.Utf8,
+    "organism_taxonomy_06family": pl.Utf8,
+    "organism_taxonomy_07tribe": pl.Utf8,
+    "organism_taxonomy_08genus": pl.Utf8,
+    "organism_taxonomy_09species": pl.Utf8,
+    "organism_taxonomy_10varietas": pl.Utf8,
+    "reference_wikidata": pl.Utf8,
+    "reference_doi": pl.Utf8,
+    "manual_validation": pl.Utf8,
+}
+
+# the registry: per known layout (of a LOTUS release or of a file written by this tool) all the columns
+# in the order of the header, with their dtypes. Every layout has its own dtypes.
+# frozen_metadata is the only release layout known here: the releases read by this tool (220916, 230106) have
+# the same columns, and the layout is detected in any column order. The columns of other releases aren't known,
+# so they aren't guessed (a wrong layout would read a column with a wrong dtype); a release with other columns
+# fails with the diff and is added with register_layout.
+LOTUS_LAYOUTS: Dict[str, Dict[str, pl.PolarsDataType]] = {
+    "frozen_metadata": dict(LOTUS_COLUMNS),
+}
+
+
+class SchemaMismatchError(ValueError):
+    """
+    The header of a file is not one of the registered layouts (a new LOTUS release with new or missing columns).
+    """
+
+
+def register_layout(
+    name: str,
+    columns: List[str],
+    dtypes: Optional[Dict[str, pl.PolarsDataType]] = None,
+    base: Optional[str] = "frozen_metadata",
+) -> None:
+    """
+    Adds a layout to the registry (for example of a new LOTUS release). Nothing is changed, if it fails.
+
+    Args:
+        name : str
+            The name of the layout.
+        columns : list
+            The columns in the order of the header.
+        dtypes : dict | None
+            The dtypes of the columns. The columns without a dtype here get the dtype of the base layout.
+        base : str | None
+            The layout with the dtypes of the other columns (None: all columns need a dtype in dtypes).
+
+    Raises:
+        SchemaMismatchError
+            If a column has no dtype or the name is already registered with other columns or dtypes.
+    """
+    base_dtypes = LOTUS_LAYOUTS[base] if base else {}
+    dtypes = dtypes or {}
+    unknown = [column for column in columns if column not in dtypes and column not in base_dtypes]
+    if unknown:
+        raise SchemaMismatchError(f"The layout {name} has columns without a dtype: {unknown}")
+
+    layout = {column: dtypes[column] if column in dtypes else base_dtypes[column] for column in columns}
+    if name in LOTUS_LAYOUTS and LOTUS_LAYOUTS[name] != layout:
+        raise SchemaMismatchError(f"The layout {name} is already registered with other columns or dtypes.")
+    LOTUS_LAYOUTS[name] = layout
+
+
+def layout_version(name: str) -> str:
+    """
+    Gives back a short hash of the columns and dtypes of a layout. It is part of the cache key (see lotus_reader),
+    so the cached copies of a file are not used anymore, when its layout changes in the registry.
+    """
+    layout = [[column, str(dtype)] for column, dtype in LOTUS_LAYOUTS[name].items()]
+    return hashlib.sha256(json.dumps(layout).encode()).hexdigest()[:12]
+
+
+def read_LOTUS_header(file_to_sample: Union[str, Path]) -> List[str]:
+    """
+    Reads only the column names of a LOTUS dataset (*.csv or *.csv.gz), without decompressing the whole file.
+    """
+    if str(file_to_sample).endswith(".gz"):
+        with gzip.open(file_to_sample, "rt", newline="") as f:
+            return next(csv.reader([f.readline()]), [])
+    if str(file_to_sample).endswith((".zip", ".zst", ".bz2", ".xz")):
+        return pl.read_csv(file_to_sample, n_rows=0, infer_schema_length=0).columns
+    with open(file_to_sample, newline="") as f:
+        return next(csv.reader([f.readline()]), [])
+
+
+def detect_layout(header: List[str]) -> Optional[str]:
+    """
+    Gives back the name of the layout with exactly these columns (in any order) or None.
+    """
+    for name, columns in LOTUS_LAYOUTS.items():
+        if sorted(columns) == sorted(header):
+            return name
+    return None
+
+
+def schema_diff(header: List[str], layout: Optional[str] = None) -> str:
+    """
+    Describes the differences between a header and a layout (default: the layout with the fewest differences).
+    """
+    if layout is None:
+        layout = min(LOTUS_LAYOUTS, key=lambda name: len(set(LOTUS_LAYOUTS[name]) ^ set(header)))
+    columns = LOTUS_LAYOUTS[layout]
+    return (
+        f"Compared to the layout {layout}:\n"
+        f"  new columns: {[column for column in header if column not in columns]}\n"
+        f"  missing columns: {[column for column in columns if column not in header]}"
+    )
+
+
+def resolve_layout(header: List[str], layout: Optional[str] = None) -> str:
+    """
+    Gives back the registered layout of the header of a LOTUS export.
+
+    Args:
+        header : list
+            The columns of the file (see read_LOTUS_header).
+        layout : str | None
+            If given, the header has to be this layout.
+
+    Returns:
+        layout : str
+            The name of the layout with exactly the columns of the header (in any order).
+
+    Raises:
+        SchemaMismatchError
+            If the header has new or missing columns compared to the registered layouts, with the diff.
+    """
+    name = detect_layout(header)
+    if name is None or (layout is not None and name != layout):
+        raise SchemaMismatchError(
+            f"The columns don't match a known LOTUS layout (add it with lotus_schema.register_layout).\n"
+            f"{schema_diff(header, layout)}"
+        )
+    return name
+
+
+def schema_for(header: List[str], layout: Optional[str] = None) -> Dict[str, pl.PolarsDataType]:
+    """
+    Gives back the complete schema (the dtypes of all the columns) for the header of a LOTUS export
+    (see resolve_layout).
+
+    Returns:
+        schema : dict
+            The dtype of every column of the header, in the order of the header.
+
+    Raises:
+        SchemaMismatchError
+            If the header is not a registered layout, with the diff.
+    """
+    dtypes = LOTUS_LAYOUTS[resolve_layout(header, layout)]
+    return {column: dtypes[column] for column in header}
+
+
+# the MINEs format written by this tool (see lotus_mines), so it can be read again
+register_layout("mines", ["id", "smiles"], {"id": pl.Utf8, "smiles": pl.Utf8}, base=None)
@@ -0,0 +1,175 @@
+# Description:
+# content-addressed local store of the downloaded LOTUS files (keyed by the Zenodo checksum), with a catalog
+# record -> filename -> checksum. The same file in many versions is stored (and downloaded) only once.
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from dataset_extractor_lotus import zenodo_downloader as zd
+
+# name of the catalog in the store directory
+CATALOG_FILENAME = "catalog.json"
+
+
+def get_store_dir(store_dir: Optional[Union[str, Path]] = None) -> Path:
+    """
+    Gives back the store directory. The order is: given store_dir, $LOTUS_STORE_DIR,
+    ~/.local/share/dataset_extractor_lotus/store
+
+    Args:
+        store_dir : str | Path | None
+            The directory of the store.
+
+    Returns:
+        store_dir : Path
+            The (created) store directory.
+    """
+    if store_dir is None:
+        store_dir = os.environ.get(
+            "LOTUS_STORE_DIR", Path.home() / ".local" / "share" / "dataset_extractor_lotus" / "store"
+        )
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    return store_dir
+
+
+def object_path(checksum: str, filename: str, store_dir: Optional[Union[str, Path]] = None) -> Path:
+    """
+    Gives back the path of a file in the store: objects/<algorithm>/<first 2 characters>/<hexdigest><suffixes>.
+    The suffixes of the filename (for example ".csv.gz") are kept, so the readers know the format.
+
+    Args:
+        checksum : str
+            The checksum in the Zenodo format "<algorithm>:<hexdigest>".
+        filename : str
+            The name of the file on Zenodo.
+        store_dir : str | Path | None
+            The directory of the store (see get_store_dir).
+    """
+    algorithm, _, hexdigest = checksum.partition(":")
+    suffixes = "".join(Path(filename).suffixes)
+    return get_store_dir(store_dir) / "objects" / algorithm / hexdigest[:2] / f"{hexdigest}{suffixes}"
+
+
+def read_catalog(store_dir: Optional[Union[str, Path]] = None) -> Dict[str, Any]:
+    """
+    Reads the catalog of the store ({"records": {record_id: {filename: checksum}}}).
+    If there is no catalog, an empty one is given back.
+    """
+    try:
+        with open(get_store_dir(store_dir) / CATALOG_FILENAME) as f:
+            catalog: Dict[str, Any] = json.load(f)
+            return catalog
+    except FileNotFoundError:
+        return {"records": {}}
+
+
+def _write_catalog(catalog: Dict[str, Any], store_dir: Optional[Union[str, Path]] = None) -> None:
+    # write to a temporary file first, so an interrupted run doesn't leave a broken catalog
+    path = get_store_dir(store_dir) / CATALOG_FILENAME
+    tmp_path = path.with_name(f"{CATALOG_FILENAME}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(catalog, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def store_file(
+    record_id: str,
+    filename: str,
+    download_url: str,
+    checksum: Optional[str] = None,
+    store_dir: Optional[Union[str, Path]] = None,
+    **download_options: Any,
+) -> Path:
+    """
+    Downloads a file of a Zenodo record into the store and adds it to the catalog.
+    If a file with the same checksum is already in the store (for example from another version), nothing is downloaded.
+
+    Args:
+        record_id : str
+            The record id of the file on Zenodo.
+        filename : str
+            The name of the file on Zenodo.
+        download_url : str
+            The download url of the file.
+        checksum : str | None
+            The checksum of the file from the Zenodo metadata. If None, the md5 is calculated after the download.
+        store_dir : str | Path | None
+            The directory of the store (see get_store_dir).
+        download_options
+            More arguments for zenodo_downloader.download_file (for example session or segments).
+
+    Returns:
+        path : Path
+            The path of the file in the store.
+    """
+    if checksum:
+        path = object_path(checksum, filename, store_dir)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            zd.download_file(str(path), download_url, checksum=checksum, **download_options)
+    else:
+        # without the checksum, the place in the store is only known after the download
+        incoming = get_store_dir(store_dir) / "incoming" / str(record_id) / filename
+        incoming.parent.mkdir(parents=True, exist_ok=True)
+        zd.download_file(str(incoming), download_url, **download_options)
+        checksum = zd.file_checksum(incoming)
+        path = object_path(checksum, filename, store_dir)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(incoming, path)
+
+    catalog = read_catalog(store_dir)
+    catalog["records"].setdefault(str(record_id), {})[filename] = checksum
+    _write_catalog(catalog, store_dir)
+    return path
+
+
+def resolve(reference: Union[str, Path], store_dir: Optional[Union[str, Path]] = None) -> Path:
+    """
+    Gives back the path of a dataset. The reference is a path or "<record_id>:<filename>" of a file in the store.
+
+    Args:
+        reference : str | Path
+            The path or the reference (for example "7534071:230106_frozen_metadata.csv.gz").
+        store_dir : str | Path | None
+            The directory of the store (see get_store_dir).
+
+    Returns:
+        path : Path
+            The path of the file.
+
+    Raises:
+        FileNotFoundError
+            If the reference is neither an existing file nor in the store.
+    """
+    if os.path.exists(reference):
+        return Path(reference)
+
+    record_id, _, filename = str(reference).partition(":")
+    checksum = read_catalog(store_dir)["records"].get(record_id, {}).get(filename)
+    if checksum is not None:
+        path = object_path(checksum, filename, store_dir)
+        if path.exists():
+            return path
+    raise FileNotFoundError(f"{reference} is neither a file nor a <record_id>:<filename> in the store.")
+
+
+def link(path: Union[str, Path], destination: Union[str, Path]) -> Path:
+    """
+    Makes a link to a file in the store (a symlink, or a copy if the filesystem has no links).
+    An existing file at the destination is replaced.
+
+    Returns:
+        destination : Path
+    """
+    destination = Path(destination)
+    if destination.is_symlink() or destination.exists():
+        destination.unlink()
+    try:
+        os.symlink(Path(path).resolve(), destination)
+    except OSError:
+        shutil.copy2(path, destination)
+    return destination
@@ -0,0 +1,186 @@
+# Description:
+# streaming mode for LOTUS exports bigger than the memory: the file is read in batches of csv records and
+# filter -> sample -> dedupe -> write runs with a memory use, which depends on the batch size and the sample size.
+
+import bz2
+import contextlib
+import csv
+import gzip
+import io
+import itertools
+import lzma
+import zipfile
+from pathlib import Path
+from typing import IO, Iterable, Iterator, List, Optional, Tuple, Union
+
+import polars as pl  # for data manipulation
+
+from dataset_extractor_lotus.lotus_reader import fix_gbifid
+from dataset_extractor_lotus.lotus_reservoir import ReservoirSampler
+from dataset_extractor_lotus.lotus_sampler import count_members
+from dataset_extractor_lotus.lotus_schema import read_LOTUS_header, schema_for  # noqa: F401 (read_LOTUS_header was defined here)
+
+# number of csv records parsed at once
+DEFAULT_BATCH_SIZE = 100_000
+
+
+@contextlib.contextmanager
+def _open_text(file_to_sample: Union[str, Path]) -> Iterator[IO[str]]:
+    # open the (compressed) file as text stream, without decompressing it first
+    # (*.gz, *.bz2, *.xz, *.zip with the dataset as first file and *.zst with the package zstandard)
+    name = str(file_to_sample)
+    if name.endswith(".gz"):
+        with gzip.open(file_to_sample, "rt", newline="") as f:
+            yield f
+    elif name.endswith(".bz2"):
+        with bz2.open(file_to_sample, "rt", newline="") as f:
+            yield f
+    elif name.endswith(".xz"):
+        with lzma.open(file_to_sample, "rt", newline="") as f:
+            yield f
+    elif name.endswith(".zip"):
+        with zipfile.ZipFile(file_to_sample) as archive, archive.open(archive.namelist()[0]) as raw:
+            yield io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    elif name.endswith(".zst"):
+        try:
+            import zstandard  # type: ignore[import-not-found]
+        except ImportError as err:
+            raise ImportError("Streaming a *.zst file needs the package zstandard.") from err
+        with open(file_to_sample, "rb") as raw, zstandard.ZstdDecompressor().stream_reader(raw) as reader:
+            yield io.TextIOWrapper(reader, encoding="utf-8", newline="")
+    else:
+        with open(file_to_sample, newline="") as f:
+            yield f
+
+
+def iter_csv_records(lines: Iterable[str], batch_size: int) -> Iterator[List[str]]:
+    """
+    Groups the lines of a csv file into batches of <batch_size> complete records. A quoted value can have
+    line breaks, so a record ends only at a line break outside of quotes (an even number of quotes so far,
+    an escaped quote "" counts twice).
+
+    Yields:
+        records : list
+            The next <batch_size> records (the last batch can be smaller), every record with its line breaks.
+    """
+    records: List[str] = []
+    pending: List[str] = []
+    quotes = 0
+    for line in lines:
+        pending.append(line)
+        quotes += line.count('"')
+        if quotes % 2:
+            continue
+        records.append(pending[0] if len(pending) == 1 else "".join(pending))
+        pending, quotes = [], 0
+        if len(records) == batch_size:
+            yield records
+            records = []
+    if pending:
+        records.append("".join(pending))
+    if records:
+        yield records
+
+
+def iter_LOTUS_batches(
+    file_to_sample: Union[str, Path],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    keep_all_gbifids: bool = False,
+    row_index_name: Optional[str] = None,
+) -> Iterator[pl.DataFrame]:
+    """
+    Reads a LOTUS dataset in batches of <batch_size> rows. Only one batch is in memory at once.
+    The dtypes of all the columns come from the schema registry (see lotus_schema), so every batch has the same dtypes.
+
+    The file is split on the csv records (see iter_csv_records), so a quoted value with a line break stays whole.
+
+    Args:
+        file_to_sample : str | Path
+            The path to the LOTUS dataset (*.csv, *.csv.gz, *.bz2, *.xz, *.zip or *.zst).
+        batch_size : int
+            The number of rows per batch.
+        keep_all_gbifids : bool
+            If True, "organism_taxonomy_gbifid" is a List[Int32] column (see lotus_reader).
+        row_index_name : str | None
+            If given, a column with the row number in the file is added (for the manifest).
+
+    Yields:
+        df : pl.DataFrame
+            The next batch of the LOTUS dataset (a file without rows gives one empty batch with all the columns).
+    """
+    offset = 0
+
+    with _open_text(file_to_sample) as f:
+        header = f.readline()
+        dtypes = schema_for(next(csv.reader([header]), []))
+        # the first batch is read even without records, so a file without rows gives the columns and dtypes
+        batches = iter_csv_records(f, batch_size)
+        for records in itertools.chain([next(batches, [])], batches):
+            df = pl.read_csv(
+                io.StringIO(header + "".join(records)),
+                dtypes=dtypes,
+                separator=",",
+                infer_schema_length=0,
+                null_values=["", "NA"],
+            )
+
+            df = fix_gbifid(df.lazy(), keep_all_gbifids=keep_all_gbifids).collect()
+            if row_index_name:
+                df = df.with_row_index(row_index_name, offset=offset)
+            offset += len(records)
+            yield df
+
+
+def stream_sample_members(
+    file_to_sample: Union[str, Path],
+    taxalevel: str,
+    samplesize_per_member: int,
+    members: Optional[List[str]] = None,
+    seed: Optional[int] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    row_index_name: Optional[str] = None,
+    keep_all_gbifids: bool = False,
+) -> Tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Samples up to <samplesize_per_member> rows for every member of the taxa level in one pass over the file,
+    like lotus_sampler.sample_members (with the same seed, the same rows are sampled), but with bounded memory
+    (see lotus_reservoir.ReservoirSampler).
+
+    Args:
+        file_to_sample : str | Path
+            The path to the LOTUS dataset (*.csv, *.csv.gz, *.bz2, *.xz, *.zip or *.zst).
+        taxalevel : str
+            The column of the taxa level (for example "organism_taxonomy_08genus").
+        samplesize_per_member : int
+            The number of rows to sample per member.
+        members : list | None
+            The members to sample from. If None, all members of the taxa level are sampled.
+        seed : int | None
+            The seed for the random numbers.
+        batch_size : int
+            The number of rows read at once.
+        row_index_name : str | None
+            If given, a column with the row number in the file is added (for the manifest).
+        keep_all_gbifids : bool
+            If True, "organism_taxonomy_gbifid" is a List[Int32] column (see lotus_reader).
+
+    Returns:
+        df_sampled : pl.DataFrame
+            The sampled rows of all members.
+        df_counts : pl.DataFrame
+            Per member: the number of available and of sampled rows (columns: <taxalevel>, "available", "sampled").
+    """
+    sampler = ReservoirSampler(samplesize_per_member, strata=[taxalevel], seed=seed)
+
+    batches = iter_LOTUS_batches(
+        file_to_sample, batch_size=batch_size, keep_all_gbifids=keep_all_gbifids, row_index_name=row_index_name
+    )
+    for df_batch in batches:
+        if members is None:
+            sampler.add(df_batch.filter(pl.col(taxalevel).is_not_null()))
+        else:
+            sampler.add(df_batch.filter(pl.col(taxalevel).is_in(members)))
+
+    # keep the order of the file (like the in-memory sampling)
+    df_sampled = sampler.sample(sort_by=row_index_name)
+    return df_sampled, count_members(sampler.available(), taxalevel, samplesize_per_member, members)
@@ -0,0 +1,305 @@
+# Description:
+# synthetic LOTUS-shaped datasets (same columns and dtypes, taxonomy cardinalities, "c(...)" gbifids and
+# string lengths like the frozen_metadata exports) at any scale, for the benchmarks and tests without the real data.
+
+import gzip
+from pathlib import Path
+from typing import IO, Dict, List, Optional, Union, cast
+
+import numpy as np  # for the random numbers
+import polars as pl  # for data manipulation
+
+from dataset_extractor_lotus.lotus_schema import LOTUS_COLUMNS, LOTUS_LAYOUTS
+
+# the number of rows of a real release (230106_frozen_metadata.csv.gz), the cardinalities below are for this size
+REAL_ROWS = 750_000
+
+# per taxa level: the number of members in a real release and the suffix of the names
+TAXONOMY_LEVELS = [
+    ("organism_taxonomy_01domain", 4, ""),
+    ("organism_taxonomy_02kingdom", 12, ""),
+    ("organism_taxonomy_03phylum", 90, "phyta"),
+    ("organism_taxonomy_04class", 300, "opsida"),
+    ("organism_taxonomy_05order", 900, "ales"),
+    ("organism_taxonomy_06family", 2500, "aceae"),
+    ("organism_taxonomy_08genus", 12000, ""),
+    ("organism_taxonomy_09species", 40000, ""),
+]
+TRIBES = 1500
+VARIETIES = 2000
+
+# the number of structures and references in a real release
+STRUCTURES = 270_000
+REFERENCES = 140_000
+
+# the chemical taxonomy (number of members per level in a real release)
+NPCLASSIFIER_LEVELS = [
+    ("structure_taxonomy_npclassifier_01pathway", 7),
+    ("structure_taxonomy_npclassifier_02superclass", 70),
+    ("structure_taxonomy_npclassifier_03class", 650),
+]
+CLASSYFIRE_LEVELS = [
+    ("structure_taxonomy_classyfire_01kingdom", 2),
+    ("structure_taxonomy_classyfire_02superclass", 25),
+    ("structure_taxonomy_classyfire_03class", 350),
+    ("structure_taxonomy_classyfire_04directparent", 1800),
+]
+
+# the parts of the latin-like names (two letters each)
+SYLLABLES = [
+    "ab", "ac", "al", "an", "ar", "ba", "ca", "ce", "ci", "co", "da", "de", "di", "do", "el", "en", "er",
+    "fa", "fi", "ga", "ge", "gi", "ha", "he", "ia", "ie", "il", "in", "is", "la", "le", "li", "lo", "lu",
+    "ma", "me", "mi", "mo", "na", "ne", "ni", "no", "nu", "pa", "pe", "pi", "po", "ra", "re", "ri", "ro",
+    "ru", "sa", "se", "si", "so", "ta", "te", "ti", "to", "tu", "um", "us", "va", "ve", "vi",
+]  # fmt: skip
+SMILES_ATOMS = ["C", "C", "C", "C", "O", "N", "c1ccccc1", "C(=O)", "O", "[C@@H]", "[C@H]", "(C)", "(O)", "=C", "S"]
+
+
+def _scaled(count: int, n_rows: int, minimum: int = 12) -> int:
+    # the cardinalities grow with the rows up to the real ones (more rows than a release: more rows per member),
+    # the small levels (domains, kingdoms...) have always their real number of members
+    return max(min(count, minimum), round(count * min(1.0, n_rows / REAL_ROWS)))
+
+
+def _words(count: int, rng: np.random.Generator, suffix: str = "", capitalize: bool = True) -> List[str]:
+    # unique words: one or two random syllables and the index written in syllables (always the same number)
+    base = len(SYLLABLES)
+    width = max(1, int(np.ceil(np.log(max(count, 2)) / np.log(base))))
+    prefixes = rng.integers(base, size=(count, 2)).tolist()
+    lengths = rng.integers(1, 3, size=count).tolist()
+    words = []
+    for index in range(count):
+        word = "".join(SYLLABLES[i] for i in prefixes[index][: lengths[index]])
+        word += "".join(SYLLABLES[index // base**digit % base] for digit in range(width))
+        words.append((word.capitalize() if capitalize else word) + suffix)
+    return words
+
+
+def _null(values: pl.Series, fraction: float, rng: np.random.Generator) -> pl.Series:
+    # sets a part of the values to null
+    return values.set(pl.Series(rng.random(len(values)) < fraction), None)
+
+
+def _random_strings(count: int, length: int, rng: np.random.Generator, low: str = "A", high: str = "Z") -> pl.Series:
+    # <count> random strings of fixed length (vectorized)
+    letters = rng.integers(ord(low), ord(high) + 1, size=(count, length), dtype=np.uint8)
+    return pl.Series(letters.view(f"S{length}").ravel()).cast(pl.Utf8)
+
+
+def _gbifids(n_species: int, rng: np.random.Generator) -> pl.Series:
+    # the gbifids of some organisms are several IDs, written as "c(2685530, 7291394)"
+    gbifids = rng.integers(2_000_000, 10_000_000, size=(n_species, 3))
+    kind = rng.random(n_species)
+    gbifid_values: List[Optional[str]] = []
+    for index in range(n_species):
+        if kind[index] < 0.05:
+            gbifid_values.append(None)
+        elif kind[index] > 0.98:
+            gbifid_values.append(f"c({', '.join(str(gbifid) for gbifid in gbifids[index][: 2 + index % 2])})")
+        else:
+            gbifid_values.append(str(gbifids[index][0]))
+    return pl.Series(gbifid_values, dtype=pl.Utf8)
+
+
+def _entities(n_rows: int, rng: np.random.Generator) -> Dict[str, pl.DataFrame]:
+    # the organisms, structures and references, which the rows are drawn from
+    organisms: Dict[str, pl.Series] = {}
+    counts: List[int] = []
+    for _, count, _ in TAXONOMY_LEVELS:
+        counts.append(max(_scaled(count, n_rows), counts[-1] if counts else 1))
+    n_species = counts[-1]
+    species = np.arange(n_species)
+
+    # every level is a monotone mapping of the level below, so the taxonomy is a tree
+    members_per_level = [species]
+    for count, child_count in zip(counts[-2::-1], counts[:0:-1]):
+        members_per_level.insert(0, members_per_level[0] * count // child_count)
+
+    for (level, _, suffix), count, members in zip(TAXONOMY_LEVELS, counts, members_per_level):
+        if level == "organism_taxonomy_01domain":
+            names = ["Eukaryota", "Bacteria", "Archaea", "Viruses"][:count]
+            names += _words(count - len(names), rng)
+        elif level == "organism_taxonomy_09species":
+            genera = organisms["organism_taxonomy_08genus"].to_list()
+            epithets = _words(count, rng, capitalize=False)
+            names = [f"{genera[index]} {epithet}" for index, epithet in enumerate(epithets)]
+        else:
+            names = _words(count, rng, suffix)
+        organisms[level] = pl.Series(names).gather(members)
+
+    n_genera, genus_members = counts[-2], members_per_level[-2]
+    n_tribes = _scaled(TRIBES, n_rows)
+    organisms["organism_taxonomy_07tribe"] = _null(
+        pl.Series(_words(n_tribes, rng, "eae")).gather(genus_members * n_tribes // n_genera), 0.7, rng
+    )
+    organisms["organism_name"] = organisms["organism_taxonomy_09species"]
+    organisms["organism_wikidata"] = pl.Series([f"Q{1_000_000 + 7 * index}" for index in species])
+    organisms["organism_taxonomy_ncbiid"] = _null(pl.Series(rng.integers(1, 3_000_000, n_species), dtype=pl.UInt32), 0.15, rng)
+    organisms["organism_taxonomy_ottid"] = _null(pl.Series(rng.integers(1, 8_000_000, n_species), dtype=pl.UInt32), 0.1, rng)
+    organisms["organism_taxonomy_10varietas"] = pl.Series([None] * n_species, dtype=pl.Utf8)
+
+    organisms["organism_taxonomy_gbifid"] = _gbifids(n_species, rng)
+
+    # the structures: formula, mass, smiles, inchi and the chemical taxonomy
+    n_structures = _scaled(STRUCTURES, n_rows, minimum=min(n_rows, 10))
+    atoms = rng.integers(0, 40, size=(n_structures, 4))
+    carbons, hydrogens, oxygens, nitrogens = atoms[:, 0] + 3, atoms[:, 1] * 2 + 2, atoms[:, 2] // 3, atoms[:, 3] // 10
+    formulas = [
+        f"C{c}H{h}" + (f"N{n}" if n else "") + (f"O{o}" if o else "")
+        for c, h, o, n in zip(carbons, hydrogens, oxygens, nitrogens)
+    ]
+    # one atom (or group) per carbon, concatenated per structure
+    smiles = (
+        pl.DataFrame({
+            "structure": np.repeat(np.arange(n_structures), carbons),
+            "atom": pl.Series(SMILES_ATOMS).gather(rng.integers(len(SMILES_ATOMS), size=carbons.sum())),
+        })
+        .group_by("structure", maintain_order=True)
+        .agg(pl.col("atom").str.concat(""))
+        .get_column("atom")
+        .to_list()
+    )
+    structures: Dict[str, pl.Series] = {
+        "structure_wikidata": pl.Series([f"Q{100_000 + 3 * index}" for index in range(n_structures)]),
+        "structure_inchikey": (
+            _random_strings(n_structures, 14, rng) + "-" + _random_strings(n_structures, 10, rng) + "-N"
+        ),
+        "structure_inchi": (
+            pl.Series([f"InChI=1S/{formula}/c{smile[:40]}" for formula, smile in zip(formulas, smiles)])
+            + "/h"
+            + _random_strings(n_structures, 30, rng, "0", "9")
+        ),
+        "structure_smiles": pl.Series(smiles),
+        "structure_molecular_formula": pl.Series(formulas),
+        "structure_exact_mass": pl.Series(carbons * 12.0 + hydrogens * 1.007825 + oxygens * 15.994915 + nitrogens * 14.003074),
+        "structure_xlogp": _null(pl.Series(rng.normal(2, 3, n_structures), dtype=pl.Float32), 0.05, rng),
+        "structure_smiles_2D": pl.Series(smiles).str.replace_all("@", "", literal=True),
+        "structure_cid": _null(pl.Series(rng.integers(1, 160_000_000, n_structures), dtype=pl.UInt32), 0.1, rng),
+        "structure_nameIupac": _null(pl.Series(_words(n_structures, rng, "ic acid", capitalize=False)), 0.4, rng),
+        "structure_nameTraditional": _null(pl.Series(_words(n_structures, rng, "ine", capitalize=False)), 0.3, rng),
+    }
+    stereocenters = rng.integers(0, 12, n_structures)
+    structures["structure_stereocenters_total"] = pl.Series(stereocenters, dtype=pl.UInt32)
+    structures["structure_stereocenters_unspecified"] = pl.Series(rng.integers(0, stereocenters + 1), dtype=pl.UInt32)
+
+    for levels, missing in ((NPCLASSIFIER_LEVELS, 0.1), (CLASSYFIRE_LEVELS, 0.05)):
+        last = _scaled(levels[-1][1], n_rows, minimum=levels[-1][1] // 10)
+        classes = rng.integers(0, last, n_structures)
+        is_missing = pl.Series(rng.random(n_structures) < missing)
+        for level, count in levels:
+            count = min(count, last)
+            structures[level] = pl.Series(_words(count, rng)).gather(classes * count // last).set(is_missing, None)
+    chemontids = structures["structure_taxonomy_classyfire_04directparent"].rank("dense").cast(pl.Utf8).str.zfill(7)
+    structures["structure_taxonomy_classyfire_chemontid"] = "CHEMONTID:" + chemontids
+
+    n_references = _scaled(REFERENCES, n_rows, minimum=min(n_rows, 10))
+    journals = rng.integers(1000, 10000, n_references)
+    words = _words(n_references, rng, capitalize=False)
+    references = {
+        "reference_wikidata": pl.Series([f"Q{50_000_000 + 11 * index}" for index in range(n_references)]),
+        "reference_doi": pl.Series([f"10.{journal}/{word}.{index}" for index, (journal, word) in enumerate(zip(journals, words))]),
+    }
+
+    return {
+        "organisms": pl.DataFrame(organisms),
+        "structures": pl.DataFrame(structures),
+        "references": pl.DataFrame(references),
+    }
+
+
+def generate_LOTUS(n_rows: int, seed: Optional[int] = 0, entities: Optional[Dict[str, pl.DataFrame]] = None) -> pl.DataFrame:
+    """
+    Generates a synthetic LOTUS dataset with the columns and dtypes of the frozen_metadata layout
+    (see lotus_schema). Every row is one structure-organism-reference pair: the organisms and structures are
+    skewed (a few are in many rows, like in the real data) and the taxonomy is a tree. Up to the size of a
+    release (REAL_ROWS), the number of members per taxa level grows with the rows, above they stay the same.
+
+    About 5% of the rows have a varietas, 2% of the organisms several gbifids ("c(...)") and a few rows are
+    duplicated (the same pair twice), so the deduplication has something to do.
+
+    Args:
+        n_rows : int
+            The number of rows.
+        seed : int | None
+            The seed. With the same seed, the same dataset is generated.
+        entities : dict | None
+            The organisms, structures and references to draw from (internal, see write_synthetic_LOTUS).
+
+    Returns:
+        df : pl.DataFrame
+            The dataset (organism_taxonomy_gbifid as text, like in the csv, see lotus_reader.fix_gbifid).
+    """
+    rng = np.random.default_rng(seed)
+    entities = entities or _entities(n_rows, rng)
+    df_organisms, df_structures, df_references = entities["organisms"], entities["structures"], entities["references"]
+
+    # skewed: the first organisms and structures are in many rows
+    organisms = (len(df_organisms) * rng.random(n_rows) ** 3).astype(np.int64)
+    structures = (len(df_structures) * rng.random(n_rows) ** 2).astype(np.int64)
+    references = rng.integers(0, len(df_references), n_rows)
+
+    # a few duplicated pairs
+    duplicates = rng.random(n_rows) < 0.01
+    duplicated_rows = np.maximum(np.arange(n_rows) - 1, 0)
+    organisms[duplicates] = organisms[duplicated_rows[duplicates]]
+    structures[duplicates] = structures[duplicated_rows[duplicates]]
+    references[duplicates] = references[duplicated_rows[duplicates]]
+
+    df = pl.concat(
+        [df_structures[structures], df_organisms[organisms], df_references[references]], how="horizontal"
+    )
+
+    # the varietas of some rows: "<species> var. <name>"
+    varieties = pl.Series(_words(_scaled(VARIETIES, n_rows), rng, capitalize=False))
+    df = df.with_columns(
+        pl.when(pl.Series(rng.random(n_rows) < 0.05))
+        .then(pl.col("organism_taxonomy_09species") + " var. " + varieties.gather(rng.integers(0, len(varieties), n_rows)))
+        .alias("organism_taxonomy_10varietas"),
+        pl.when(pl.Series(rng.random(n_rows) < 0.05)).then(pl.lit("Y")).alias("manual_validation"),
+    )
+
+    columns = LOTUS_LAYOUTS["frozen_metadata"]
+    return df.select([pl.col(column).cast(LOTUS_COLUMNS[column]) for column in columns])
+
+
+def _open_output(path: Path) -> IO[bytes]:
+    # the default level of gzip (like the exports), level 9 is much slower
+    if path.suffix == ".gz":
+        return cast(IO[bytes], gzip.open(path, "wb", compresslevel=6))
+    return open(path, "wb")
+
+
+def write_synthetic_LOTUS(
+    path: Union[str, Path],
+    n_rows: int,
+    seed: Optional[int] = 0,
+    chunk_size: int = 1_000_000,
+) -> Path:
+    """
+    Writes a synthetic LOTUS dataset (see generate_LOTUS) as *.csv or *.csv.gz, like the exports on Zenodo
+    (empty values for null). Big datasets are generated and written in chunks, so only one chunk is in memory.
+
+    Args:
+        path : str | Path
+            The file (*.csv or *.csv.gz).
+        n_rows : int
+            The number of rows (for example 10_000 to 10_000_000).
+        seed : int | None
+            The seed. With the same seed, the same file is written.
+        chunk_size : int
+            The number of rows generated at once.
+
+    Returns:
+        path : Path
+    """
+    path = Path(path)
+    rng = np.random.default_rng(seed)
+    entities = _entities(n_rows, rng)
+    chunk_seeds = rng.integers(0, 2**32, size=max(1, -(-n_rows // chunk_size)))
+
+    with _open_output(path) as f:
+        for index, chunk_seed in enumerate(chunk_seeds):
+            rows = min(chunk_size, n_rows - index * chunk_size)
+            df = generate_LOTUS(rows, seed=int(chunk_seed), entities=entities)
+            df.write_csv(f, include_header=index == 0)
+    return path
@@ -0,0 +1,173 @@
+# Description:
+# append sampled rows to an output file without reading it again. The keys of the written rows are kept
+# in a compact sidecar index (<output>.keys), so new rows are only deduplicated against these keys.
+
+import csv
+import hashlib
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import numpy as np  # for the binary key index
+import polars as pl  # for data manipulation
+
+from dataset_extractor_lotus.lotus_dedup import (  # noqa: F401 (DEFAULT_KEY_COLUMNS was defined here)
+    DEFAULT_KEY_COLUMNS,
+    ROW_HASH,
+    key_columns_for,
+)
+
+# the keys in the index are blake2b (8 bytes) over the key values joined with KEY_SEPARATOR, a null value is NULL_KEY.
+# Don't change them (the existing key indexes would not match anymore), the name is written into the key indexes.
+# (pl.Expr.hash isn't used, it isn't the same in every polars version)
+HASH_ALGORITHM = "blake2b-64"
+KEY_SEPARATOR = "\x1f"
+NULL_KEY = "\x00"
+
+
+def hash_keys(keys: pl.Series) -> pl.Series:
+    """
+    Gives back the stable 64-bit hash (see HASH_ALGORITHM) of every string, as UInt64.
+    The hash is the same on every machine and with every polars version, so it can be saved on disk.
+    """
+    blake2b = hashlib.blake2b
+    return pl.Series(
+        keys.name,
+        [int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), "little") for key in keys.to_list()],
+        dtype=pl.UInt64,
+    )
+
+# the first element of a key index, it is the hash of the hash algorithm. An index with another first element
+# (another algorithm or an index written before, with the polars hash) is built again from the output file.
+KEY_INDEX_HEADER = hash_keys(pl.Series([f"key index {HASH_ALGORITHM}"]))[0]
+
+
+def keys_path(output_path_file: Union[str, Path]) -> Path:
+    """
+    Gives back the path of the key index next to the output file (<output>.keys).
+    """
+    return Path(f"{output_path_file}.keys")
+
+
+def row_keys(df: pl.DataFrame, key_columns: List[str]) -> np.ndarray:
+    """
+    Gives back the stable hash over the key columns (see hash_keys). The columns are compared as strings,
+    so the keys are the same, no matter which dtypes were used to read the file.
+
+    Returns:
+        keys : np.ndarray
+            The hashes as uint64 array.
+    """
+    keys = df.select(
+        pl.concat_str(
+            [pl.col(column).cast(pl.Utf8).fill_null(NULL_KEY) for column in key_columns], separator=KEY_SEPARATOR
+        )
+    ).to_series()
+    return hash_keys(keys).to_numpy().astype(np.uint64)
+
+
+def read_header(output_path_file: Union[str, Path]) -> List[str]:
+    """
+    Reads only the header (column names) of a csv file.
+    """
+    with open(output_path_file, newline="") as f:
+        return next(csv.reader(f), [])
+
+
+def _read_key_index(output_path_file: Union[str, Path], key_columns: List[str]) -> Tuple[np.ndarray, bool]:
+    # the index is KEY_INDEX_HEADER, the size of the output file, when the index was written, and the keys.
+    # If the header or the size doesn't match (the file was changed by someone else), the keys are read from the file.
+    try:
+        index = np.fromfile(keys_path(output_path_file), dtype=np.uint64)
+    except FileNotFoundError:
+        index = np.array([], dtype=np.uint64)
+
+    if len(index) > 1 and index[0] == KEY_INDEX_HEADER and index[1] == os.path.getsize(output_path_file):
+        return index[2:], True
+
+    df_exist = pl.read_csv(output_path_file, columns=key_columns, infer_schema_length=0)
+    return row_keys(df_exist, key_columns), False
+
+
+def _write_key_index(output_path_file: Union[str, Path], keys: np.ndarray, append: bool) -> None:
+    # with append, only the new keys are written at the end and the file size after the header is updated
+    header = np.array([KEY_INDEX_HEADER, os.path.getsize(output_path_file)], dtype=np.uint64)
+    if not append:
+        np.concatenate([header, keys.astype(np.uint64)]).tofile(keys_path(output_path_file))
+        return
+
+    with open(keys_path(output_path_file), "r+b") as f:
+        f.seek(0, os.SEEK_END)
+        keys.astype(np.uint64).tofile(f)
+        f.seek(0)
+        header.tofile(f)
+
+
+def append_rows(
+    df: pl.DataFrame,
+    output_path_file: Union[str, Path],
+    key_columns: Optional[List[str]] = None,
+) -> Tuple[int, int]:
+    """
+    Writes the rows, which aren't already in the output file, at the end of the output file.
+    The existing file isn't read, only its header and the key index. The cost depends only on the new rows
+    (and the size of the key index, 8 bytes per row). The keys are a stable hash (see hash_keys),
+    so the index stays valid after an update of polars.
+
+    Args:
+        df : pl.DataFrame
+            The new rows. They need the same columns as the output file (the order can be different).
+            A column ROW_HASH (see lotus_dedup.dedupe) isn't written.
+        output_path_file : str | Path
+            The csv file to write to. If it doesn't exist, it is created.
+        key_columns : list | None
+            The columns, which identify a row. If None, see key_columns_for.
+
+    Returns:
+        written : int
+            The number of rows written.
+        skipped : int
+            The number of rows skipped, because they were duplicates.
+
+    Raises:
+        ValueError
+            If the columns of the new rows and the existing file are not the same.
+    """
+    output_exists = os.path.exists(output_path_file) and os.path.getsize(output_path_file) > 0
+
+    # the in-memory row hash isn't stable across polars versions, so it isn't used for the key index
+    df = df.drop(ROW_HASH) if ROW_HASH in df.columns else df
+
+    if output_exists:
+        header = read_header(output_path_file)
+        if sorted(header) != sorted(df.columns):
+            raise ValueError(
+                f"The columns of {output_path_file} are not the same as the new rows.\n"
+                f"Only in the file: {sorted(set(header) - set(df.columns))}\n"
+                f"Only in the new rows: {sorted(set(df.columns) - set(header))}"
+            )
+        df = df.select(header)
+
+    key_columns = key_columns or key_columns_for(df.columns)
+    existing_keys = np.array([], dtype=np.uint64)
+    index_valid = False
+    if output_exists:
+        existing_keys, index_valid = _read_key_index(output_path_file, key_columns)
+
+    # drop the duplicates inside the new rows and the rows which are already in the file
+    keys = pl.Series("key", row_keys(df, key_columns))
+    is_new = keys.is_first_distinct() & ~keys.is_in(pl.Series(existing_keys))
+    df_new = df.filter(is_new)
+
+    if output_exists:
+        with open(output_path_file, "ab") as f:
+            df_new.write_csv(f, include_header=False)
+    else:
+        df_new.write_csv(output_path_file)
+
+    new_keys = keys.filter(is_new).to_numpy()
+    if index_valid:
+        _write_key_index(output_path_file, new_keys, append=True)
+    else:
+        _write_key_index(output_path_file, np.concatenate([existing_keys, new_keys]), append=False)
+    return len(df_new), len(df) - len(df_new)
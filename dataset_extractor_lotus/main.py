@@ -2,9 +2,9 @@
 # extract a small LOTUS dataset to sample N lines from M members of taxa level T.
 
 import polars as pl  # for data manipulation
-import numpy as np  # specialy for NaN
 import sys  # for command line arguments
 import getopt  # for checking command line arguments
+import glob  # for several input files
 import datetime  # for naming the output file
 import logging
 
@@ -14,54 +14,95 @@ from InquirerPy import inquirer
 from InquirerPy.base.control import Choice
 from InquirerPy.separator import Separator
 from pathlib import Path
+from typing import List, Union
 
-import zenodo_downloader as zd
 from InquirerPy.validator import PathValidator
 
+from dataset_extractor_lotus import lotus_store
+from dataset_extractor_lotus import zenodo_downloader as zd
+from dataset_extractor_lotus.lotus_dedup import ROW_HASH, dedupe
+from dataset_extractor_lotus.lotus_diff import diff_LOTUS_files, write_diff
+from dataset_extractor_lotus.lotus_index import load_taxonomy_index
+from dataset_extractor_lotus.lotus_jobs import format_job_report, read_job_spec, run_jobs, write_job_report
+from dataset_extractor_lotus.lotus_manifest import (
+    ROW_INDEX,
+    add_row_keys,
+    materialize_manifest,
+    new_seed,
+    pop_row_keys,
+    pop_source_row_keys,
+    scan_sources,
+    write_manifest,
+)
+from dataset_extractor_lotus.lotus_mines import (
+    format_mines_report,
+    mines_report,
+    suffix_duplicate_ids,
+    write_mines_report,
+)
+from dataset_extractor_lotus.lotus_reader import (  # noqa: F401 (read_LOTUS_dataset was defined here)
+    categorical_memory_report,
+    gbifids_to_text,
+    read_LOTUS_dataset,
+    scan_LOTUS_dataset,
+    to_categorical,
+)
+from dataset_extractor_lotus.lotus_sampler import parse_quota_spec, read_members_file, sample_members, sample_quotas
+from dataset_extractor_lotus.lotus_stream import DEFAULT_BATCH_SIZE, read_LOTUS_header, stream_sample_members
+from dataset_extractor_lotus.lotus_writer import append_rows
+from dataset_extractor_lotus.zenodo_cache import MetadataCache
+
 # change the configsetting, to see the full tables
 pl.Config.set_tbl_rows(200)
 pl.Config(fmt_str_lengths=550)
 
-def read_LOTUS_dataset(file_to_sample):
-    df = pl.read_csv(
-        file_to_sample,
-        dtypes={
-            "structure_xlogp": pl.Float32,
-            "structure_cid": pl.UInt32,
-            "organism_taxonomy_ncbiid": pl.UInt32,
-            "organism_taxonomy_ottid": pl.UInt32,
-            "structure_stereocenters_total": pl.UInt32,
-            "structure_stereocenters_unspecified": pl.UInt32,
-        },
-        separator=",",
-        infer_schema_length=50000,
-        null_values=["", "NA"],
-    )
-
-    # print("Before type: ", df["organism_taxonomy_gbifid"].dtype)
-
-    if not df["organism_taxonomy_gbifid"].dtype.is_numeric():
-        df = df.with_columns(
-            pl.col("organism_taxonomy_gbifid")
-            .map_elements(lambda x: np.nan if x.startswith("c(") else x, return_dtype=pl.Float64)
-            .cast(pl.Int32, strict=False)  # Cast with strict=False to allow NaN to be retained
-            .alias("organism_taxonomy_gbifid")
-        )
-    else:
-        df = df.with_columns(
-            pl.col("organism_taxonomy_gbifid")
-            .cast(pl.Int32, strict=False)  # Cast with strict=False to allow NaN to be retained
-            .alias("organism_taxonomy_gbifid")
-        )
-
-    # print("After type: ", df["organism_taxonomy_gbifid"].dtype)
-    return df
-
 def read_arg(argv):
 
     arg_help = f'''
     Please give the arguments as following:
-        {argv[0]} -i <input_path_file> -o <output_path_file> -t <taxalevel> -s <samplesize_per_member>
+        {argv[0]} -i <input_path_file> -o <output_path_file> -t <taxalevel> -m <taxalevel_membername> -s <samplesize_per_member>
+
+    Several input files (for example several Zenodo versions), sampled as one dataset:
+        -i can be given multiple times and can be a glob pattern (for example -i "data/*_frozen_metadata.csv.gz"),
+        the files are scanned in parallel and their schemas harmonized (not with --streaming)
+
+    Batch mode (sample N lines from every member in one pass):
+        -m can be given multiple times
+        --members_file <file>    file with one member per line
+        --all_members            sample from all members of the taxalevel
+
+    Quota mode (hierarchical quotas over the taxonomy, instead of -t/-m/-s):
+        --quotas "organism_taxonomy_06family=*; organism_taxonomy_08genus=10; rows=5"
+            every entry is <level>=<number|percentage|*>[:<floor>[:<cap>]] (see lotus_sampler.parse_quota_spec)
+
+    Reproducible samples:
+        --seed <int>                 seed for the sampling (without it, a random seed is chosen)
+        --from_manifest <manifest>   write the toydataset of a manifest again (with -o, optional -i for a moved input)
+    Every run writes or extends the manifest <output_path_file>.manifest.json (see lotus_manifest.py).
+
+    Streaming mode (for input files bigger than the memory, not with --quotas or --categorical):
+        --streaming             single pass over the input in batches with reservoir sampling,
+                                only the sample is kept in memory (see lotus_stream.py and lotus_reservoir.py)
+        --batch_size <int>      number of rows per batch (default: 100000)
+
+    Diff between two releases (no sampling):
+        --diff_from <old_file>    write the added, removed and changed rows of -i compared to the old file
+                                  into <output_path_file>.added.csv, .removed.csv and .changed.csv (see lotus_diff.py)
+
+    MINEs report (no sampling):
+        --mines_report <report.json>    write the uniqueness and the duplicates of structure_inchikey (id) and
+                                        structure_smiles (smiles) of -i as JSON (see lotus_mines.py)
+
+    Batch jobs (many extractions from a job spec, no other options needed):
+        --jobs <spec.toml|spec.yaml>    run all the tasks of the spec, the tasks with the same input load it once
+                                        and the independent tasks run in parallel (see lotus_jobs.py)
+
+    Optional:
+        --no-cache       don't read or write the columnar cache of the input file (see lotus_cache.py)
+        --categorical    load the taxonomy, reference and wikidata columns as categoricals (less memory,
+                         faster filters) and show the memory saved per column (see lotus_reader.py)
+        --keep_all_gbifids    keep all the IDs of the organisms with several gbifids ("c(2685530, 7291394)"),
+                              by default these gbifids are empty (see lotus_reader.fix_gbifid)
     
     Or don't give any arguments, so the script will start in interactive mode.
     '''
@@ -74,8 +115,21 @@ def read_arg(argv):
                 "input_path_file=",
                 "output_path_file=",
                 "taxalevel=",
-                "taxalevel_membername="
+                "taxalevel_membername=",
                 "samplesize_per_member=",
+                "members_file=",
+                "all_members",
+                "quotas=",
+                "seed=",
+                "from_manifest=",
+                "diff_from=",
+                "mines_report=",
+                "jobs=",
+                "streaming",
+                "batch_size=",
+                "no-cache",
+                "categorical",
+                "keep_all_gbifids",
             ],
         )
     except getopt.GetoptError as err:
@@ -83,11 +137,24 @@ def read_arg(argv):
         print(arg_help)  
         sys.exit(2)
 
-    input_path_file = str()
+    input_path_files = list()
     output_path_file = str()
     taxalevel = str()
-    taxalevel_membername = str()
+    taxalevel_membername = list()
+    members_file = str()
+    all_members = False
+    quotas = str()
+    seed = None
+    from_manifest = str()
+    diff_from = str()
+    mines_report_file = str()
+    jobs = str()
+    streaming = False
+    batch_size = DEFAULT_BATCH_SIZE
     samplesize_per_member = int()
+    use_cache = True
+    categorical = False
+    keep_all_gbifids = False
 
     # If argument values given, overwrite the default values
     for o, a in opts:
@@ -95,65 +162,255 @@ def read_arg(argv):
             print(arg_help)
             sys.exit()
         elif o in ("-i", "--input_path_file"):
-            input_path_file = a
+            input_path_files.append(a)
         elif o in ("-o", "--output_path_file"):
             output_path_file = a
         elif o in ("-t", "--taxalevel"):
             taxalevel = a
         elif o in ("-m", "--taxalevel_membername"):
-            taxalevel_membername = a
+            taxalevel_membername.append(a)
+        elif o == "--members_file":
+            members_file = a
+        elif o == "--all_members":
+            all_members = True
+        elif o == "--quotas":
+            quotas = a
+        elif o == "--seed":
+            seed = int(a)
+        elif o == "--from_manifest":
+            from_manifest = a
+        elif o == "--diff_from":
+            diff_from = a
+        elif o == "--mines_report":
+            mines_report_file = a
+        elif o == "--jobs":
+            jobs = a
+        elif o == "--streaming":
+            streaming = True
+        elif o == "--batch_size":
+            batch_size = int(a)
         elif o in ("-s", "--samplesize_per_member"):
             samplesize_per_member = a
+        elif o == "--no-cache":
+            use_cache = False
+        elif o == "--categorical":
+            categorical = True
+        elif o == "--keep_all_gbifids":
+            keep_all_gbifids = True
         else:
             assert False, "unhandled option"
         
     return {
-            "input_path_file" : input_path_file, 
+            "input_path_file" : input_path_files[0] if input_path_files else str(),
+            "input_path_files" : input_path_files,
             "output_path_file" : output_path_file, 
             "taxalevel" : taxalevel, 
             "taxalevel_membername" : taxalevel_membername,
+            "members_file" : members_file,
+            "all_members" : all_members,
+            "quotas" : quotas,
+            "seed" : seed,
+            "from_manifest" : from_manifest,
+            "diff_from" : diff_from,
+            "mines_report" : mines_report_file,
+            "jobs" : jobs,
+            "streaming" : streaming,
+            "batch_size" : batch_size,
             "samplesize_per_member" : samplesize_per_member,
+            "use_cache" : use_cache,
+            "categorical" : categorical,
+            "keep_all_gbifids" : keep_all_gbifids,
             }
 
 
 
+def is_dataset(reference: str) -> bool:
+    """
+    Checks, if the input is a file or a <record_id>:<filename> in the store (see lotus_store.resolve).
+    """
+    try:
+        return lotus_store.resolve(reference).is_file()
+    except FileNotFoundError:
+        return False
+
+
 if __name__ == "__main__":
 
-    url_all_doi = "https://zenodo.org/search?q=parent.id%3A5794106&f=allversions%3Atrue&l=list&p=1&s=20&sort=version"
     filenames_list = list()
 
     # Read arguments after the scriptname
     if sys.argv[1:]:
         file_info = read_arg(sys.argv)
 
-        # load the dataset (can load *.csv, *.csv.gz...)
-        df = read_LOTUS_dataset(file_info["input_path_file"])
-        
-        # select all the possible samples
-        df_filtered_taxonomy = df.filter(pl.col(file_info["taxalevel"]) == file_info["taxalevel_membername"])
-        df_filtered_taxonomy_size = len(df_filtered_taxonomy)
+        # run the tasks of a job spec (the inputs and outputs are in the spec)
+        if file_info["jobs"]:
+            job_spec = read_job_spec(file_info["jobs"])
+            job_report = run_jobs(
+                job_spec["tasks"],
+                max_workers=job_spec["max_workers"],
+                progress=lambda result: print(f'{result["name"]}: {result["status"]} ({result["seconds"]:.2f} s)'),
+            )
+            print(format_job_report(job_report))
+            if job_spec["report"]:
+                print("Written to:", write_job_report(job_report, job_spec["report"]))
+            for result in job_report:
+                if result["error"]:
+                    print(f'{result["name"]} failed: {result["error"]}')
+            sys.exit(1 if any(result["status"] == "failed" for result in job_report) else 0)
+
+        # the input can be a path or <record_id>:<filename> of a downloaded file in the store (or a glob pattern)
+        file_info["input_path_files"] = [
+            path if glob.has_magic(path) else str(lotus_store.resolve(path)) for path in file_info["input_path_files"]
+        ]
+        if file_info["input_path_files"]:
+            file_info["input_path_file"] = file_info["input_path_files"][0]
+        multiple_inputs = len(file_info["input_path_files"]) > 1 or glob.has_magic(file_info["input_path_file"])
+
+        # write the toydataset of a manifest again (no sampling)
+        if file_info["from_manifest"]:
+            df_sampled = materialize_manifest(
+                file_info["from_manifest"],
+                source=file_info["input_path_file"] or None,
+                use_cache=file_info["use_cache"],
+            )
+            df_sampled.write_csv(file_info["output_path_file"])
+            print(f'Toydataset of {file_info["from_manifest"]} written to {file_info["output_path_file"]} ({len(df_sampled)} rows).')
+            sys.exit()
 
-        # check the samplesize and if it's bigger, just take max
-        if int(file_info["samplesize_per_member"]) > df_filtered_taxonomy_size:
-            file_info["samplesize_per_member"] = df_filtered_taxonomy_size
+        # compare two releases (no sampling)
+        if file_info["diff_from"]:
+            df_added, df_removed, df_changed = diff_LOTUS_files(
+                lotus_store.resolve(file_info["diff_from"]), file_info["input_path_file"], use_cache=file_info["use_cache"]
+            )
+            paths = write_diff(file_info["output_path_file"], df_added, df_removed, df_changed)
+            print(f'Added: {len(df_added)}, removed: {len(df_removed)}, changed: {len(df_changed)} rows.')
+            print("Written to:", *paths, sep="\n")
+            sys.exit()
+
+        # report of the MINEs export of a release (no sampling)
+        if file_info["mines_report"]:
+            lf = scan_LOTUS_dataset(file_info["input_path_file"], use_cache=file_info["use_cache"])
+            report = mines_report(lf.select(id="structure_inchikey", smiles="structure_smiles"))
+            print(format_mines_report(report))
+            print("Written to:", write_mines_report(report, file_info["mines_report"]))
+            sys.exit()
+
+        # without a seed, choose one. So the sample can be repeated with the manifest.
+        seed = file_info["seed"] if file_info["seed"] is not None else new_seed()
+        print(f"Seed: {seed}")
+
+        if file_info["streaming"] and file_info["quotas"]:
+            print("The quotas can't be sampled in the streaming mode.")
+            sys.exit(2)
+        if file_info["streaming"] and multiple_inputs:
+            print("Several input files can't be sampled in the streaming mode.")
+            sys.exit(2)
+        if file_info["streaming"] and file_info["categorical"]:
+            print("The categorical load profile can't be used in the streaming mode.")
+            sys.exit(2)
+
+        # scan the dataset lazily (can load *.csv, *.csv.gz...) and keep the row numbers for the manifest
+        # (several files are scanned in parallel as one dataset, with the file of every row)
+        if multiple_inputs:
+            lf = scan_sources(
+                file_info["input_path_files"],
+                use_cache=file_info["use_cache"],
+                keep_all_gbifids=file_info["keep_all_gbifids"],
+            )
+            if file_info["categorical"]:
+                lf = to_categorical(lf)
+        elif not file_info["streaming"]:
+            lf = scan_LOTUS_dataset(
+                file_info["input_path_file"],
+                keep_all_gbifids=file_info["keep_all_gbifids"],
+                use_cache=file_info["use_cache"],
+            )
+            if file_info["categorical"]:
+                print(f'Memory of the categorical columns:\n{categorical_memory_report(lf)}')
+                lf = to_categorical(lf)
+            lf = add_row_keys(lf)
         
-        print(f'We can sample {file_info["samplesize_per_member"]} (Max. possible: {df_filtered_taxonomy_size}).')
-
-        # sample from the data
-        df_sampled = df_filtered_taxonomy.sample(n=file_info["samplesize_per_member"])
-
-        try:
-            # if the file exists, read it and append the data
-            df_exist = read_LOTUS_dataset(file_info["output_path_file"])
-            print(f'File {file_info["output_path_file"]} exists. Appending to file.') 
-            df_sampled.extend(df_exist)       
-        except:
-            # if the file does not exist, create a new dataframe (df_exist)
+        if file_info["quotas"]:
+            # sample the hierarchical quotas and show the strata, which didn't get the requested amount
+            df_sampled, df_report = sample_quotas(lf, parse_quota_spec(file_info["quotas"]), seed=seed)
+            parameters = {"quotas": file_info["quotas"]}
+            print(f'We can sample {len(df_sampled)} rows.')
+            df_missing = df_report.filter(pl.col("achieved") < pl.col("requested"))
+            if not df_missing.is_empty():
+                print(f'Strata with less than the requested amount:\n{df_missing}')
+
+        else:
+            # collect the members to sample from (None: all members of the taxalevel)
+            members = file_info["taxalevel_membername"]
+            if file_info["members_file"]:
+                members = members + read_members_file(file_info["members_file"])
+            if file_info["all_members"]:
+                members = None
+
+            # sample from all the members in one pass (the filter is pushed down to the reader),
+            # if the samplesize is bigger than a member, just take max
+            if file_info["streaming"]:
+                df_sampled, df_counts = stream_sample_members(
+                    file_info["input_path_file"],
+                    taxalevel=file_info["taxalevel"],
+                    samplesize_per_member=int(file_info["samplesize_per_member"]),
+                    members=members,
+                    seed=seed,
+                    batch_size=file_info["batch_size"],
+                    row_index_name=ROW_INDEX,
+                    keep_all_gbifids=file_info["keep_all_gbifids"],
+                )
+            else:
+                df_sampled, df_counts = sample_members(
+                    lf,
+                    taxalevel=file_info["taxalevel"],
+                    samplesize_per_member=int(file_info["samplesize_per_member"]),
+                    members=members,
+                    seed=seed,
+                )
+            parameters = {
+                "taxalevel": file_info["taxalevel"],
+                "members": members,
+                "samplesize_per_member": int(file_info["samplesize_per_member"]),
+            }
+
+            if len(df_counts) == 1:
+                print(f'We can sample {df_counts["sampled"][0]} (Max. possible: {df_counts["available"][0]}).')
+            else:
+                print(f'We can sample {df_counts["sampled"].sum()} from {len(df_counts)} members.')
+                df_too_small = df_counts.filter(pl.col("available") < int(file_info["samplesize_per_member"]))
+                if not df_too_small.is_empty():
+                    print(f'Members with less rows than the samplesize:\n{df_too_small}')
+
+        # the manifest remembers the gbifids option, so the sample can be materialized the same way
+        if file_info["keep_all_gbifids"]:
+            parameters["keep_all_gbifids"] = True
+            df_sampled = gbifids_to_text(df_sampled)
+
+        if multiple_inputs:
+            df_sampled, source_row_keys = pop_source_row_keys(df_sampled)
+        else:
+            df_sampled, row_keys = pop_row_keys(df_sampled)
+            source_row_keys = {file_info["input_path_file"]: row_keys}
+
+        # append only the new rows (without reading the existing file again) or create a new file
+        output_exists = Path(file_info["output_path_file"]).exists()
+        written, skipped = append_rows(df_sampled, file_info["output_path_file"])
+        if output_exists:
+            print(f'File {file_info["output_path_file"]} exists. Appending {written} rows ({skipped} duplicates skipped).')
+        else:
             print(f'File {file_info["output_path_file"]} does not exist. Creating new file.')
 
-        # drop all the duplicates and save it
-        df_sampled = df_sampled.unique()
-        df_sampled.write_csv(file_info["output_path_file"])
+        # save how to get this sample again (one entry per input file)
+        for index, (source, row_keys) in enumerate(source_row_keys.items()):
+            write_manifest(
+                file_info["output_path_file"],
+                source=source,
+                row_keys=row_keys,
+                seed=seed,
+                parameters=parameters,
+                append=output_exists or index > 0,
+            )
         
     else:   
         print("Start interactive mode.")
@@ -182,12 +439,17 @@ if __name__ == "__main__":
         #################### 
         elif user_option == "download":
             print("The datasets will be searched from the internet. One moment please...")
-            all_doi_list = zd.get_all_records(url=url_all_doi)
-            filenames_records, filenames, download_urls = zd.get_filenames(all_doi_list)
+            # one session for all the requests, so the connections are reused
+            # and the metadata cache, so nothing is asked again, which didn't change
+            session = zd.make_session(zd.DEFAULT_WORKERS)
+            metadata_cache = MetadataCache()
+            all_doi_list = zd.get_all_records(parent_id=zd.LOTUS_PARENT_ID, session=session, cache=metadata_cache)
+            filenames_records, filenames, download_urls, checksums = zd.get_filenames(
+                all_doi_list, session=session, cache=metadata_cache
+            )
 
             # make the options for downloading and sort them
-            options = filenames_records.copy()
-            options.sort(reverse=True)
+            options: List[Union[str, Separator]] = [*sorted(filenames_records, reverse=True)]
             
             # Add for the option for exit
             options.append(Separator())
@@ -209,10 +471,17 @@ if __name__ == "__main__":
                 ).execute()
 
             print(f'The dataset will be downloaded to {dest_path}/{download_option}.')
-            for filename, filenames_record, download_url in zip(filenames, filenames_records, download_urls):
+            for filename, filenames_record, download_url, checksum in zip(filenames, filenames_records, download_urls, checksums):
                 if download_option == filenames_record:
-                    zd.download_file(download_url=download_url, filename=dest_path + '/' + filename)
+                    # the file is downloaded into the store (only if it isn't there yet, for example from another version)
+                    # parallel and resumable (if interrupted, choose the same file again to continue)
+                    record_id = filenames_record.rsplit("(record: ", 1)[1].rstrip(")")
+                    stored_path = lotus_store.store_file(
+                        record_id, filename, download_url, checksum=checksum, session=session
+                    )
+                    lotus_store.link(stored_path, Path(dest_path) / filename)
                     print("Download complete:", filename)
+                    print(f'It can be sampled as "{record_id}:{filename}" from everywhere.')
 
 
         ####################
@@ -222,18 +491,32 @@ if __name__ == "__main__":
             
             # get the filepath for sampling (theoreticaly we can sample from diffrent sources for one toydataset)
             file_to_sample = inquirer.filepath(
-                message="Enter the filepath to sample from:",
-                validate=PathValidator(is_file=True, message="Input is not a file"),
+                message="Enter the filepath (or <record_id>:<filename> of a download) to sample from:",
+                validate=is_dataset,
+                invalid_message="Input is not a file or a downloaded <record_id>:<filename>",
                 # only_directories=True,
                 ).execute()
+            file_to_sample = str(lotus_store.resolve(file_to_sample))
 
-            # load the dataset (can load *.csv, *.csv.gz...)
-            df = read_LOTUS_dataset(file_to_sample)
+            # a single pass (reservoir sampling) never loads the whole file, but the members can't be listed before
+            single_pass = inquirer.confirm(
+                message="Sample in a single pass over the file (reservoir sampling, for files bigger than the memory)?",
+                default=False,
+                ).execute()
+
+            if single_pass:
+                columns = read_LOTUS_header(file_to_sample)
+            else:
+                # scan the dataset lazily (can load *.csv, *.csv.gz...)
+                lf = add_row_keys(scan_LOTUS_dataset(file_to_sample))
+                columns = lf.columns
+                # members, counts and rows per taxalevel (built once per dataset and cached)
+                taxonomy_index = load_taxonomy_index(file_to_sample)
 
             
             # get all columns with "taxonomy" inside
             taxonomy = list()
-            for col_name in df.columns:
+            for col_name in columns:
                 if "taxonomy" in col_name:
                     taxonomy.append(col_name)
 
@@ -244,29 +527,40 @@ if __name__ == "__main__":
                 choices=taxonomy,
                 ).execute()
             
-            # get all possible members in this taxalevel
-            members_list = df[taxalevel].unique().drop_nulls()
+            if single_pass:
+                # the members and their sizes are only known after the pass
+                membername = inquirer.text(
+                    message="Choose from which member to sample:",
+                    ).execute()
 
-            members_dict = dict()
-            for member in members_list:
-                members_dict[member] = None
+                samplesize_per_member = inquirer.text(
+                    message="Please enter the amount of members to sample (if the member is smaller, all are taken):",
+                    validate=lambda result: result.isdigit() and 0 < int(result),
+                    ).execute()
 
-            # choose from which members to sample / check if it in member_list
-            membername = inquirer.text(
-                message=f"Choose from which member to sample ({len(members_list)} options):",
-                completer=members_dict,
-                ).execute()
+            else:
+                # get all possible members in this taxalevel
+                members_list = taxonomy_index.members(taxalevel)
 
+                members_dict = dict()
+                for member in members_list:
+                    members_dict[member] = None
 
-            # select all the possible samples
-            df_filtered_taxonomy = df.filter(pl.col(taxalevel) == membername)
-            df_filtered_taxonomy_size = len(df_filtered_taxonomy)
+                # choose from which members to sample / check if it in member_list
+                membername = inquirer.text(
+                    message=f"Choose from which member to sample ({len(members_list)} options):",
+                    completer=members_dict,
+                    ).execute()
 
-            # choose how many to sample
-            samplesize_per_member = inquirer.text(
-                message=f"Please enter the amount of members to sample (max. {df_filtered_taxonomy_size}):",
-                validate=lambda result: isinstance(int(result), int) and 0 < int(result) <= df_filtered_taxonomy_size,
-                ).execute()
+
+                # count the possible samples (the rows are taken after choosing the format)
+                df_filtered_taxonomy_size = taxonomy_index.count(taxalevel, membername)
+
+                # choose how many to sample
+                samplesize_per_member = inquirer.text(
+                    message=f"Please enter the amount of members to sample (max. {df_filtered_taxonomy_size}):",
+                    validate=lambda result: isinstance(int(result), int) and 0 < int(result) <= df_filtered_taxonomy_size,
+                    ).execute()
 
             # choose the format of output among full or "for MINES" (this will just return the structure_wikidata and structure_smiles)
             possible_output_format = ["full", "MINES"]
@@ -284,37 +578,74 @@ if __name__ == "__main__":
                 # validate=PathValidator(is_file=False, message="Input is not a file"),
                 ).execute()
 
+            # choose a seed, so the sample can be repeated (empty: random seed)
+            seed = inquirer.text(
+                message="Enter a seed for the sampling (empty for a random seed):",
+                validate=lambda result: result == "" or result.isdigit(),
+                ).execute()
+            seed = int(seed) if seed else new_seed()
+            print(f"Seed: {seed}")
 
-            # sample from the data
-            data_sampled = df_filtered_taxonomy.sample(n=samplesize_per_member)
+            select = None
+            rename = None
 
             # depending on the output format, drop the columns. And rename the columns
             # structure_wikidata to id, structure_smiles to smiles
+            # (the selection is pushed down, so only the needed columns are materialized)
 
             if output_format == "MINES":
-                data_sampled = data_sampled.select([
+                select = [
                     "structure_wikidata",
                     "structure_smiles",
-                ])
-                data_sampled = data_sampled.rename({
+                ]
+                rename = {
                     "structure_wikidata": "id",
                     "structure_smiles": "smiles"
-                })
+                }
+
+            # sample from the data
+            if single_pass:
+                data_sampled, df_counts = stream_sample_members(
+                    file_to_sample,
+                    taxalevel=taxalevel,
+                    samplesize_per_member=int(samplesize_per_member),
+                    members=[membername],
+                    seed=seed,
+                    row_index_name=ROW_INDEX,
+                )
+                print(f'We sampled {df_counts["sampled"][0]} (Max. possible: {df_counts["available"][0]}).')
+                if select and rename:
+                    data_sampled = data_sampled.select([ROW_INDEX, *select]).rename(rename)
+            else:
+                if select and rename:
+                    lf = lf.select([ROW_INDEX, *select]).rename(rename)
+                data_sampled = taxonomy_index.take(lf, taxalevel, membername).sample(n=int(samplesize_per_member), seed=seed)
+
+            data_sampled, row_keys = pop_row_keys(data_sampled)
+
+            # append only the new rows (without reading the existing file again) or create a new file
+            output_exists = Path(output_path_file).exists()
+            written, skipped = append_rows(data_sampled, output_path_file)
+            if output_exists:
+                print(f'File {output_path_file} exists. Appending {written} rows ({skipped} duplicates skipped).')
             else:
-                data_sampled = data_sampled
-
-            try:
-                # if the file exists, read it and append the data
-                df_exist = read_LOTUS_dataset(output_path_file)
-                print(f'File {output_path_file} exists. Appending to file.') 
-                data_sampled.extend(df_exist)  
-                data_sampled = data_sampled.unique()
-            except:
-                # if the file does not exist, create a new dataframe (df_exist)
                 print(f'File {output_path_file} does not exist. Creating new file.')
 
-            # drop all the duplicates and save it
-            data_sampled.write_csv(output_path_file)
+            # save how to get this sample again
+            write_manifest(
+                output_path_file,
+                source=file_to_sample,
+                row_keys=row_keys,
+                seed=seed,
+                parameters={
+                    "taxalevel": taxalevel,
+                    "members": [membername],
+                    "samplesize_per_member": int(samplesize_per_member),
+                },
+                select=select,
+                rename=rename,
+                append=output_exists,
+            )
 
 
         ##########################
@@ -325,15 +656,17 @@ if __name__ == "__main__":
 
             # Get the filepath for sampling (theoretically we can sample from different sources for one toydataset)
             file_to_sample = inquirer.filepath(
-                message="Enter the filepath to sample from:",
-                validate=lambda path: Path(path).is_file(),
+                message="Enter the filepath (or <record_id>:<filename> of a download) to sample from:",
+                validate=is_dataset,
+                invalid_message="Input is not a file or a downloaded <record_id>:<filename>",
             ).execute()
+            file_to_sample = str(lotus_store.resolve(file_to_sample))
 
-            # Load the dataset using the existing read_LOTUS_dataset function
-            df = read_LOTUS_dataset(file_to_sample)
+            # Scan the dataset lazily, only the chosen columns will be materialized
+            lf = scan_LOTUS_dataset(file_to_sample)
 
-            # Get the list of columns from the DataFrame
-            columns = df.columns
+            # Get the list of columns from the LazyFrame
+            columns = lf.columns
 
             # Choose the column names for ID and SMILES interactively
             id_column = inquirer.select(
@@ -353,33 +686,32 @@ if __name__ == "__main__":
                 message="Enter the output file name or existing filename to append:",
             ).execute()
 
-            df = df.select(
-                [
-                    id_column,
-                    smiles_column,
-                ]
-            ).rename(
-                {
-                    id_column: "id",
-                    smiles_column: "smiles"
-                }
-            ).unique()
-            #).unique(subset=["smiles"])
-
-            # Find duplicates in the columns
-            duplicates_id = df.group_by("id").count().filter(pl.col("count") > 1)
-            duplicates_smiles = df.group_by("smiles").count().filter(pl.col("count") > 1)
-
-            # info about dataframe
-            print(f"""--- Uniqueness of dataframe ---\nall columns: {df.unique().shape[1]}\nid: {df.unique(subset="id").shape[0]}\nsmiles: {df.unique(subset="smiles").shape[0]}""")
-
-            # Print the duplicate IDs
-            if not duplicates_id.is_empty():
-                print(f'Duplicate IDs found:\n{duplicates_id}')
-
-            # Print the duplicate SMILES
-            if not duplicates_smiles.is_empty():
-                print(f'Duplicate SMILES found:\n{duplicates_smiles}')
+            # remove the duplicated rows with one hash per row (verified, so a hash collision drops nothing)
+            df, dedupe_stats = dedupe(
+                lf.select(
+                    [
+                        id_column,
+                        smiles_column,
+                    ]
+                ).rename(
+                    {
+                        id_column: "id",
+                        smiles_column: "smiles"
+                    }
+                ),
+                key_columns=["id", "smiles"],
+            )
+            print(f'Removed {dedupe_stats["duplicates"]} duplicated rows ({dedupe_stats["collisions"]} hash collisions verified).')
+            df = df.drop(ROW_HASH)
+
+            # uniqueness and duplicates of the ids and smiles (one aggregation), also saved as <output>.report.json
+            report = mines_report(df)
+            print(format_mines_report(report))
+            write_mines_report(report, f"{output_path_file}.report.json")
+
+            # number the ids with more than one smiles, so every id is unique (<id>_id1, <id>_id2...)
+            df = suffix_duplicate_ids(df)
+            print(f'IDs to rename: {sum(entry["count"] for entry in report["duplicate_ids"])}\n[because of different "SMILES" with same "ID".]')
 
             # Write the transformed DataFrame to a new CSV file
             df.write_csv(output_path_file)
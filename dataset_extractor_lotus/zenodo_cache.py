@@ -0,0 +1,129 @@
+# Description:
+# on-disk cache of the Zenodo metadata (version listing and file lists), with a TTL for the listing,
+# permanent entries for the published records and revalidation with ETag/If-Modified-Since.
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+from urllib.parse import urlencode
+
+import requests
+
+from dataset_extractor_lotus import lotus_cache
+
+# bump this, when the format of the cache file changes. Old cache files get ignored.
+METADATA_CACHE_VERSION = 1
+
+# name of the cache file in the cache directory (see lotus_cache.get_cache_dir)
+METADATA_FILENAME = "zenodo_metadata.json"
+
+# seconds until the version listing is asked again (new versions can be published)
+DEFAULT_LISTING_TTL = 24 * 60 * 60
+
+
+class MetadataCache:
+    """
+    JSON responses of the Zenodo API, stored in one JSON file. An entry is used without any request as long as it is
+    fresh (ttl=None: forever, for the published records, which never change). A stale entry is revalidated with
+    a conditional request (If-None-Match/If-Modified-Since), so an unchanged listing costs only a "304 Not Modified".
+    Without a connection, the stale entry is used.
+
+    Example:
+        cache = MetadataCache()
+        records = zenodo_downloader.get_all_records(cache=cache)
+    """
+
+    def __init__(
+        self, path: Optional[Union[str, Path]] = None, listing_ttl: Optional[float] = DEFAULT_LISTING_TTL
+    ) -> None:
+        """
+        Args:
+            path : str | Path | None
+                The cache file. If None, it is in the cache directory (see lotus_cache.get_cache_dir).
+            listing_ttl : float | None
+                The seconds until the version listing is revalidated (None: never).
+        """
+        self.path = Path(path) if path else lotus_cache.get_cache_dir() / METADATA_FILENAME
+        self.listing_ttl = listing_ttl
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+
+        try:
+            with open(self.path) as f:
+                content = json.load(f)
+            if content.get("version") == METADATA_CACHE_VERSION:
+                self.entries = content["entries"]
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    def _save(self) -> None:
+        # write to a temporary file first, so an interrupted run doesn't leave a broken cache
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"version": METADATA_CACHE_VERSION, "entries": self.entries}, f)
+        os.replace(tmp_path, self.path)
+
+    def get_json(
+        self,
+        session: requests.Session,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        ttl: Optional[float] = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """
+        Gives back the JSON response of a GET request, from the cache if possible.
+
+        Args:
+            session : requests.Session
+                The session for the request (see zenodo_downloader.make_session).
+            url : str
+                The url of the request.
+            params : dict | None
+                The query parameters of the request.
+            ttl : float | None
+                The seconds an entry is used without asking the server (None: forever).
+            timeout : float | None
+                The seconds to wait for the server.
+
+        Returns:
+            body : Any
+                The parsed JSON response.
+        """
+        key = f"{url}?{urlencode(sorted((params or {}).items()))}"
+        entry = self.entries.get(key)
+        if entry is not None and (ttl is None or time.time() - entry["fetched"] < ttl):
+            return entry["body"]
+
+        headers = {}
+        if entry is not None and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry is not None and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            r = session.get(url, params=params, headers=headers, timeout=timeout)
+        except requests.RequestException:
+            # offline: the old entry is better than nothing
+            if entry is not None:
+                return entry["body"]
+            raise
+
+        if r.status_code == 304 and entry is not None:
+            body = entry["body"]
+        else:
+            r.raise_for_status()
+            body = r.json()
+
+        with self.lock:
+            self.entries[key] = {
+                "fetched": time.time(),
+                "etag": r.headers.get("ETag") or (entry or {}).get("etag"),
+                "last_modified": r.headers.get("Last-Modified") or (entry or {}).get("last_modified"),
+                "body": body,
+            }
+            self._save()
+        return body
@@ -1,157 +1,456 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AbstractSet, Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+
 import requests
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from time import sleep
 
-
-
-def get_filename(record_id:str, ACCESS_TOKEN=None):
+from dataset_extractor_lotus.zenodo_cache import MetadataCache
+
+# settings for the downloads
+DEFAULT_SEGMENTS = 4  # number of parallel HTTP Range requests per file
+DEFAULT_CHUNK_SIZE = 1024**2  # bytes written at once
+DEFAULT_TIMEOUT = 60  # seconds to wait for the server (connect and between two chunks)
+DEFAULT_RETRIES = 3  # retries per segment, before the download fails
+
+# settings for the Zenodo API
+ZENODO_API_URL = "https://zenodo.org/api"
+LOTUS_PARENT_ID = "5794106"  # the parent record of all the LOTUS versions
+DEFAULT_PAGE_SIZE = 25  # records per page (the maximum of Zenodo without access token)
+DEFAULT_WORKERS = 4  # number of pages or records requested at the same time
+
+
+
+def _get_json(
+    session: requests.Session,
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    cache: Optional[MetadataCache] = None,
+    ttl: Optional[float] = None,
+) -> Any:
+    # GET request with the JSON response, from the metadata cache if one is given (see zenodo_cache)
+    if cache is not None:
+        return cache.get_json(session, url, params=params, ttl=ttl, timeout=timeout)
+    r = session.get(url, params=params, timeout=timeout)
+    r.raise_for_status()
+    return r.json()
+
+
+def get_filename(
+    record_id: str,
+    ACCESS_TOKEN: Optional[str] = None,
+    api_url: str = ZENODO_API_URL,
+    timeout: float = DEFAULT_TIMEOUT,
+    session: Optional[requests.Session] = None,
+    cache: Optional[MetadataCache] = None,
+) -> Tuple[List[str], List[str], List[str], List[Optional[str]]]:
     """
     Args:
         ACCESS_TOKEN : str
             The access token for the Zenodo API. You have to sign in and make one yourself.
         record_id : str
             The record id of the dataset on Zenodo. It is the the number after records/ in the url.
+        api_url : str
+            The url of the Zenodo API.
+        timeout : int
+            The seconds to wait for the server.
+        session : requests.Session
+            The session to use (see make_session). If None, a new one is made.
+        cache : zenodo_cache.MetadataCache
+            The metadata cache. A published record never changes, so it is only requested once.
 
     Returns:
+        filenames_with_record : list
+            The filenames with the suffix "(record: <record_id>)".
         filenames : list
             The filenames of the files in the dataset.
+        download_urls : list
+            The download urls of the files in the dataset.
+        checksums : list
+            The checksums of the files in the dataset (for example "md5:1a79a4d60de6718e8e5b326e338ae533").
     """
+    session = session or make_session(1, ACCESS_TOKEN)
 
-    if ACCESS_TOKEN:
-        r = requests.get(f"https://zenodo.org/api/records/{record_id}", params={'access_token': ACCESS_TOKEN})
-    else:
-        r = requests.get(f"https://zenodo.org/api/records/{record_id}")
-
+    files = _get_json(session, f"{api_url}/records/{record_id}", timeout=timeout, cache=cache)['files']
 
-    download_urls = [f['links']['self'] for f in r.json()['files']]
-    filenames = [f['key'] for f in r.json()['files']]
+    download_urls = [f['links']['self'] for f in files]
+    filenames = [f['key'] for f in files]
+    checksums = [f.get('checksum') for f in files]
 
     # add suffix with record_id
     filenames_with_record = [f'{sub} (record: {record_id})' for sub in filenames]
 
-    # print(r.status_code)
+    return filenames_with_record, filenames, download_urls, checksums
 
-    return filenames_with_record, filenames, download_urls
 
-
-def get_filenames(record_ids:[list, set], ACCESS_TOKEN=None):
+def get_filenames(
+    record_ids: Union[Sequence[str], AbstractSet[str]],
+    ACCESS_TOKEN: Optional[str] = None,
+    api_url: str = ZENODO_API_URL,
+    max_workers: int = DEFAULT_WORKERS,
+    timeout: float = DEFAULT_TIMEOUT,
+    session: Optional[requests.Session] = None,
+    cache: Optional[MetadataCache] = None,
+) -> Tuple[List[str], List[str], List[str], List[Optional[str]]]:
     """
-    _summary_
+    Gets the files of many records (see get_filename). The records are requested at the same time
+    over one session, so the connections are reused.
+
+    Args:
+        record_ids : list | set
+            The record ids. A list keeps its order, a set is sorted, so the result has always the same order.
+        ACCESS_TOKEN : str
+            The access token for the Zenodo API.
+        api_url : str
+            The url of the Zenodo API.
+        max_workers : int
+            The number of records requested at the same time.
+        timeout : int
+            The seconds to wait for the server.
+        session : requests.Session
+            The session to use (see make_session). If None, a new one is made.
+        cache : zenodo_cache.MetadataCache
+            The metadata cache (see get_filename).
 
     Returns:
-        _type_: _description_
+        filenames_with_record, filenames, download_urls, checksums : list
+            The lists of get_filename of all the records one after another.
     """
+    if isinstance(record_ids, (set, frozenset)):
+        record_ids = sorted(record_ids)
+    session = session or make_session(max_workers, ACCESS_TOKEN)
 
-    if not ACCESS_TOKEN:
-        ACCESS_TOKEN = None
-
-    filenames_list = []
-    filenames_record_list = []
-    download_urls_list = []
+    # executor.map gives the results in the order of the records
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(
+            lambda record: get_filename(record, api_url=api_url, timeout=timeout, session=session, cache=cache), record_ids
+        ))
 
-    for record in record_ids:
-        filenames_with_record, filenames, download_url = get_filename(ACCESS_TOKEN=ACCESS_TOKEN, record_id=record)
-        for file_record in filenames_with_record:
-            filenames_record_list.append(file_record)
-        for file in filenames:
-            filenames_list.append(file)
-        for url in download_url:
-            download_urls_list.append(url)
+    filenames_record_list = [file_record for result in results for file_record in result[0]]
+    filenames_list = [file for result in results for file in result[1]]
+    download_urls_list = [url for result in results for url in result[2]]
+    checksums_list = [checksum for result in results for checksum in result[3]]
 
-    return filenames_record_list, filenames_list, download_urls_list
+    return filenames_record_list, filenames_list, download_urls_list, checksums_list
 
 
-def download_file(filename, download_url, ACCESS_TOKEN=None):
+def make_session(pool_size: int = DEFAULT_SEGMENTS, ACCESS_TOKEN: Optional[str] = None) -> requests.Session:
     """
+    Makes a requests.Session, which keeps the connections open (keep-alive) for all the requests.
+
     Args:
+        pool_size : int
+            The number of connections per host, which can be used at the same time.
         ACCESS_TOKEN : str
-            The access token for the Zenodo API. You have to sign in and make one yourself.
-        filename : str
-            The filenames of the files in the dataset.
-        download_url : str
-            The download urls of the files in the dataset.
+            The access token for the Zenodo API (added to every request).
 
     Returns:
-        path : str
-            If file could be downloaded, return path to file. Else, return None.
+        session : requests.Session
     """
-    # print("Downloading:", filename)
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
     if ACCESS_TOKEN:
-        r = requests.get(download_url, params={'access_token': ACCESS_TOKEN})
-    else:
-        r = requests.get(download_url)
+        session.params = {'access_token': ACCESS_TOKEN}
+    return session
 
-    with open(filename, 'wb') as f:
-            f.write(r.content)
 
-    # print(f"Download complete: {filename}")
-    return filename
-
-
-def get_all_records(url, wait_time=5, headless=True):
+def file_checksum(path: Union[str, "os.PathLike[str]"], algorithm: str = "md5", chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
     """
-    Searchs for all possible DOIs in the given Zenodo website.
+    Calculates the checksum of a file (without loading the whole file into memory).
 
-        Args:
-            url : str
-                The url of the Zenodo website with all the versions (for example: 
-                https://zenodo.org/search?q=parent.id%3A5794106&f=allversions%3Atrue&l=list&p=1&s=20&sort=version).
-            wait_time : int 
-                The time in seconds to wait for the website to load.
-            headless : bool
-                If True, the chrombrowser will be set to headless (browserwindow is hidden). If False, the browserwindow will be visible.
+    Args:
+        path : str | os.PathLike
+            The file.
+        algorithm : str
+            The hash algorithm (every algorithm of hashlib, Zenodo uses "md5").
 
-        Returns:
-            doi : set
-                A set of all the DOIs found with "record" in the linkname.
+    Returns:
+        checksum : str
+            The checksum in the Zenodo format "<algorithm>:<hexdigest>".
     """
-    
-    # Because the website "zenodo" uses javascript for loading the page, we need to use selenium to get the html.
-    
-    # The chrombrowserfunction can be set to headless (browserwindow is hidden) or not headless.
-    chrome_options = Options()
-    if headless:
-        chrome_options.add_argument('--headless')
-
-    # Chrombrowser will be set up 
-    driver = webdriver.Chrome(options=chrome_options)
-
-    # Open the webpage and wait <seconds> seconds for the page to load.
-    driver.get(url)
-    sleep(wait_time) 
-    
-    # save the html of the webpage
-    html = driver.page_source
+    hasher = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return f"{algorithm}:{hasher.hexdigest()}"
+
+
+def _probe(session: requests.Session, url: str, timeout: float) -> Tuple[str, Optional[int], bool]:
+    # get the size of the file and if the server accepts HTTP Range requests (after the redirects)
+    r = session.head(url, allow_redirects=True, timeout=timeout)
+    if r.status_code >= 400:
+        # some servers don't allow HEAD, so ask for the first byte
+        r = session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=timeout)
+        r.close()
+        r.raise_for_status()
+        if r.status_code == 206 and '/' in r.headers.get('Content-Range', ''):
+            return r.url, int(r.headers['Content-Range'].split('/')[-1]), True
+
+    size = int(r.headers['Content-Length']) if r.headers.get('Content-Length') else None
+    return r.url, size, r.headers.get('Accept-Ranges') == 'bytes'
+
+
+def _read_progress(progress_path: str, url: str, size: int) -> Optional[Dict[str, Any]]:
+    # the progress of a former (interrupted) download, if it was the same file
+    try:
+        with open(progress_path) as f:
+            progress: Dict[str, Any] = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if progress.get('url') != url or progress.get('size') != size:
+        return None
+    return progress
+
+
+def _write_progress(progress_path: str, progress: Dict[str, Any]) -> None:
+    tmp_path = progress_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(progress, f)
+    os.replace(tmp_path, progress_path)
+
+
+def _download_segment(
+    session: requests.Session,
+    url: str,
+    part_path: str,
+    progress_path: str,
+    progress: Dict[str, Any],
+    index: int,
+    lock: threading.Lock,
+    chunk_size: int,
+    timeout: float,
+    retries: int,
+) -> None:
+    # download the byte range of one segment into the .part file, continue where it stopped before
+    start, end = progress['segments'][index]['start'], progress['segments'][index]['end']
+
+    for attempt in range(retries + 1):
+        done = progress['segments'][index]['done']
+        if start + done > end:
+            return
+        try:
+            with session.get(url, headers={'Range': f'bytes={start + done}-{end}'}, stream=True, timeout=timeout) as r:
+                r.raise_for_status()
+                if r.status_code != 206:
+                    raise requests.RequestException(f"The server ignored the Range request for {url}.")
+                with open(part_path, 'r+b') as f:
+                    f.seek(start + done)
+                    for chunk in r.iter_content(chunk_size):
+                        f.write(chunk)
+                        f.flush()
+                        with lock:
+                            progress['segments'][index]['done'] += len(chunk)
+                            _write_progress(progress_path, progress)
+            if start + progress['segments'][index]['done'] > end:
+                return
+            raise requests.RequestException(f"The connection was closed before the end of the segment {index}.")
+        except (requests.RequestException, OSError):
+            if attempt == retries:
+                raise
+            sleep(2**attempt)
+
+
+def download_file(
+    filename: str,
+    download_url: str,
+    ACCESS_TOKEN: Optional[str] = None,
+    checksum: Optional[str] = None,
+    segments: int = DEFAULT_SEGMENTS,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    timeout: float = DEFAULT_TIMEOUT,
+    retries: int = DEFAULT_RETRIES,
+    session: Optional[requests.Session] = None,
+) -> str:
+    """
+    Downloads a file in chunks directly to the disk (never the whole file in memory).
 
-    # close the Chrombrowser
-    driver.quit() 
+    If the server accepts HTTP Range requests, the file is split into <segments> parts, which are downloaded
+    in parallel over one pooled session. The data is written into <filename>.part and the progress into
+    <filename>.part.json, so an interrupted download continues where it stopped. When everything is there,
+    the checksum is verified and the .part file is renamed to <filename>.
 
-    # parse the html with BeautifulSoup. lxml: fastest "reader". It helps to encode the html.
-    soup = BeautifulSoup(html, 'lxml')
+    Args:
+        filename : str
+            The path to save the file.
+        download_url : str
+            The download url of the file.
+        ACCESS_TOKEN : str
+            The access token for the Zenodo API. You have to sign in and make one yourself.
+        checksum : str
+            The checksum of the file from the Zenodo metadata (for example "md5:1a79a4d6..."). If None, no check.
+        segments : int
+            The number of parallel Range requests.
+        chunk_size : int
+            The number of bytes written at once.
+        timeout : int
+            The seconds to wait for the server.
+        retries : int
+            The number of retries per segment.
+        session : requests.Session
+            The session to use (see make_session). If None, a new one is made.
 
-    ## search for links with "record" in the name
-    # save the DOIs in a set <dois>
-    records = set()
+    Returns:
+        path : str
+            The path to the downloaded file.
 
-    # search for all possible links in the html
-    for a in soup.find_all('a', href=True):
-   
-        # if the link contains "records", save the link in the set
-        if "records" in a['href']:
-            record = a['href']
+    Raises:
+        ValueError
+            If the checksum of the downloaded file is wrong (the .part file is removed).
+    """
+    session = session or make_session(pool_size=segments, ACCESS_TOKEN=ACCESS_TOKEN)
+    part_path = filename + '.part'
+    progress_path = part_path + '.json'
+
+    url, size, accepts_ranges = _probe(session, download_url, timeout)
+
+    if accepts_ranges and size:
+        progress = _read_progress(progress_path, url, size)
+        if progress is None or not os.path.exists(part_path):
+            # split the file into segments and allocate the .part file
+            segment_size = -(-size // max(1, segments))
+            progress = {
+                'url': url,
+                'size': size,
+                'segments': [
+                    {'start': start, 'end': min(start + segment_size, size) - 1, 'done': 0}
+                    for start in range(0, size, segment_size)
+                ],
+            }
+            with open(part_path, 'wb') as f:
+                f.truncate(size)
+            _write_progress(progress_path, progress)
+
+        lock = threading.Lock()
+        with ThreadPoolExecutor(max_workers=len(progress['segments'])) as executor:
+            futures = [
+                executor.submit(
+                    _download_segment, session, url, part_path, progress_path, progress, index, lock,
+                    chunk_size, timeout, retries,
+                )
+                for index in range(len(progress['segments']))
+            ]
+            for future in futures:
+                future.result()
+    else:
+        # without Range requests, the file can only be streamed from the beginning
+        with session.get(url, stream=True, timeout=timeout) as r:
+            r.raise_for_status()
+            with open(part_path, 'wb') as f:
+                for chunk in r.iter_content(chunk_size):
+                    f.write(chunk)
+
+    if checksum:
+        algorithm = checksum.split(':')[0] if ':' in checksum else 'md5'
+        if file_checksum(part_path, algorithm) != f"{algorithm}:{checksum.split(':')[-1]}":
+            os.remove(part_path)
+            if os.path.exists(progress_path):
+                os.remove(progress_path)
+            raise ValueError(f"The checksum of {filename} is wrong (expected {checksum}). Please download it again.")
+
+    os.replace(part_path, filename)
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
 
-            # remove the record part. Only the DOI will be kept.
-            record = record.split('/')[2]
+    return filename
 
-            # add the DOI to the return variable <dois>
-            records.add(record)
 
-    return records
+def _get_records_page(
+    session: requests.Session,
+    api_url: str,
+    parent_id: str,
+    page: int,
+    page_size: int,
+    timeout: float,
+    cache: Optional[MetadataCache],
+) -> Any:
+    # one page of the version listing of the parent record
+    return _get_json(
+        session,
+        f"{api_url}/records",
+        params={
+            'q': f'parent.id:{parent_id}',
+            'all_versions': 'true',
+            'sort': 'version',
+            'size': page_size,
+            'page': page,
+        },
+        timeout=timeout,
+        cache=cache,
+        ttl=cache.listing_ttl if cache is not None else None,
+    )
+
+
+def get_all_records(
+    parent_id: str = LOTUS_PARENT_ID,
+    ACCESS_TOKEN: Optional[str] = None,
+    api_url: str = ZENODO_API_URL,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    max_workers: int = DEFAULT_WORKERS,
+    timeout: float = DEFAULT_TIMEOUT,
+    session: Optional[requests.Session] = None,
+    cache: Optional[MetadataCache] = None,
+) -> Set[str]:
+    """
+    Searchs for all versions (records) of a dataset with the Zenodo REST API.
+    The first page gives the total number of versions, the other pages are fetched at the same time.
 
+        Args:
+            parent_id : str
+                The id of the parent record, which has all the versions (LOTUS: 5794106).
+            ACCESS_TOKEN : str
+                The access token for the Zenodo API (optional, the listing is public).
+            api_url : str
+                The url of the Zenodo API.
+            page_size : int
+                The number of records per page.
+            max_workers : int
+                The number of pages fetched at the same time.
+            timeout : int
+                The seconds to wait for the server.
+            session : requests.Session
+                The session to use (see make_session). If None, a new one is made.
+            cache : zenodo_cache.MetadataCache
+                The metadata cache. The pages are revalidated after its listing_ttl.
 
-def doi_info(doi, print_info=True):
+        Returns:
+            records : set
+                The record ids of all the versions.
+    """
+    session = session or make_session(max_workers, ACCESS_TOKEN)
+
+    first_page = _get_records_page(session, api_url, parent_id, 1, page_size, timeout, cache)
+    pages = [first_page]
+
+    # the total is the number of versions, so the number of pages is known after the first page
+    total = first_page['hits']['total']
+    if isinstance(total, dict):
+        total = total['value']
+    n_pages = -(-total // page_size)
+
+    if n_pages > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pages += executor.map(
+                lambda page: _get_records_page(session, api_url, parent_id, page, page_size, timeout, cache),
+                range(2, n_pages + 1),
+            )
+
+    return {str(hit['id']) for page in pages for hit in page['hits']['hits']}
+
+
+def doi_info(
+    doi: str,
+    print_info: bool = True,
+    api_url: str = ZENODO_API_URL,
+    timeout: float = DEFAULT_TIMEOUT,
+    session: Optional[requests.Session] = None,
+    cache: Optional[MetadataCache] = None,
+) -> List[str]:
     """
     Gives back the path to downlaod the dataset. It also can display the information of the dataset.
     
@@ -160,6 +459,15 @@ def doi_info(doi, print_info=True):
                 The DOI of the dataset.
             print_info : bool
                 If True, the filename, version and downloadlink.
+            api_url : str
+                The url of the Zenodo API.
+            timeout : float
+                The seconds to wait for the server.
+            session : requests.Session
+                The session to use (see make_session). If None, a new one is made.
+            cache : zenodo_cache.MetadataCache
+                The metadata cache. If None, the default cache file is used, so the file list of a record
+                (which never changes) is only requested once and is there offline.
 
         Returns:
             download_link : str
@@ -168,13 +476,11 @@ def doi_info(doi, print_info=True):
 
     # good links to download (both files) https://zenodo.org/api/records/5794107/files-archive
 
-    # get the webpagelink from one DOI
-    url_doi = 'https://zenodo.org/api/records/' + doi + '/files'
-
-    # get the info as a json file (no API key needed)
-    info = requests.get(url_doi)
+    session = session or make_session(1)
+    cache = cache if cache is not None else MetadataCache()
 
-    info_json = info.json()
+    # get the info as a json file (no API key needed), the files of a published record never change
+    info_json = _get_json(session, f"{api_url}/records/{doi}/files", timeout=timeout, cache=cache)
 
     links_for_download = []
     for index in range(len(info_json['entries'])):
@@ -196,7 +502,7 @@ def doi_info(doi, print_info=True):
     return links_for_download
 
 
-def download_file_with_url(url, filename):
+def download_file_with_url(url: str, filename: Optional[str]) -> str:
     """
     Download the file from the given url and save it as the given filename (optional).
 
@@ -207,19 +513,13 @@ def download_file_with_url(url, filename):
             The path with filename with to save. If None, the filename will be the last part of the url and saved in the directory where it was run.
 
     Returns:
-
+        path : str
+            The path to the downloaded file (see download_file).
     """
-    # get the file from the url
-    file_link = requests.get(url, allow_redirects=True)
-
-    # save the file
-    if filename:
-        open(filename, 'wb').write(file_link.content)
-    else:
-        # if no filename is given, the filename will be the last part of the url
+    # if no filename is given, the filename will be the last part of the url
+    if not filename:
         filename = url.split('/')[-1]
-        open(filename, 'wb').write(file_link.content)
-    return
+    return download_file(filename=filename, download_url=url)
 
 
 
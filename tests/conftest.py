@@ -0,0 +1,156 @@
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from dataset_extractor_lotus.lotus_schema import register_layout
+
+# a few LOTUS-shaped rows: 3 families, 4 genera and gbifids with multiple IDs ("c(...)")
+LOTUS_HEADER = [
+    "structure_wikidata",
+    "structure_inchikey",
+    "structure_smiles",
+    "structure_xlogp",
+    "structure_cid",
+    "structure_stereocenters_total",
+    "structure_stereocenters_unspecified",
+    "organism_wikidata",
+    "organism_name",
+    "organism_taxonomy_gbifid",
+    "organism_taxonomy_ncbiid",
+    "organism_taxonomy_ottid",
+    "organism_taxonomy_06family",
+    "organism_taxonomy_08genus",
+    "reference_wikidata",
+]
+
+LOTUS_ROWS = [
+    ["Q1", "AAAA-1", "C", "0.5", "1", "0", "0", "O1", "Abies alba", "2685484", "45372", "1", "Pinaceae", "Abies", "R1"],
+    ["Q2", "AAAA-2", "CC", "1.5", "2", "1", "0", "O1", "Abies alba", "2685484", "45372", "1", "Pinaceae", "Abies", "R1"],
+    ["Q3", "AAAA-3", "CCC", "", "3", "2", "1", "O2", "Abies sachalinensis", "c(2685530, 7291394)", "78261", "2", "Pinaceae", "Abies", "R2"],
+    ["Q4", "AAAA-4", "CCCC", "2.5", "", "0", "0", "O3", "Pinus nigra", "5285385", "", "3", "Pinaceae", "Pinus", "R3"],
+    ["Q5", "AAAA-5", "CO", "NA", "5", "0", "0", "O4", "Rosa canina", "8395064", "74635", "4", "Rosaceae", "Rosa", "R4"],
+    ["Q6", "AAAA-6", "CCO", "0.1", "6", "3", "2", "O4", "Rosa canina", "8395064", "74635", "4", "Rosaceae", "Rosa", "R5"],
+    ["Q1", "AAAA-1", "C", "0.5", "1", "0", "0", "O5", "Rosa gallica", "c(3005039)", "74649", "5", "Rosaceae", "Rosa", "R6"],
+    ["Q7", "AAAA-7", "C=O", "-0.2", "7", "0", "0", "O6", "Quercus robur", "2878688", "38942", "6", "Fagaceae", "Quercus", "R7"],
+]
+
+
+# the toydatasets of the tests have only some of the columns of a release, so they are their own layout
+register_layout("tests", LOTUS_HEADER)
+
+
+def _write_lotus_csv(path):
+    lines = [",".join(LOTUS_HEADER)]
+    for row in LOTUS_ROWS:
+        # quote the values with commas (like the "c(...)" gbifids in the real exports)
+        lines.append(",".join(f'"{value}"' if "," in value else value for value in row))
+    content = "\n".join(lines) + "\n"
+
+    if str(path).endswith(".gz"):
+        with gzip.open(path, "wt") as f:
+            f.write(content)
+    else:
+        path.write_text(content)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def lotus_cache_dir(tmp_path, monkeypatch):
+    # never write the columnar cache (or the store) into the home directory of the user
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("LOTUS_CACHE_DIR", str(cache_dir))
+    monkeypatch.setenv("LOTUS_STORE_DIR", str(tmp_path / "store"))
+    return cache_dir
+
+
+@pytest.fixture
+def lotus_csv(tmp_path):
+    return _write_lotus_csv(tmp_path / "lotus.csv")
+
+
+@pytest.fixture
+def lotus_csv_gz(tmp_path):
+    return _write_lotus_csv(tmp_path / "lotus.csv.gz")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the Zenodo server. The routes of the server are {path: {"body": bytes, ...}}
+    with the optional keys "headers" (dict), "status" (int), "ranges" (bool) and "fail_after" (int: close the
+    connection after so many bytes, once). The body can also be a function, which gets the query parameters.
+    A request with the "ETag" of the route as "If-None-Match" gets a "304 Not Modified".
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def _route(self):
+        self.server.requests.append((self.command, self.path, dict(self.headers)))
+        path, _, query = self.path.partition("?")
+        self.query = {key: values[0] for key, values in parse_qs(query).items()}
+        route = self.server.routes.get(path)
+        if route is None:
+            self.send_error(404)
+        return route
+
+    def do_HEAD(self):
+        route = self._route()
+        if route is not None:
+            self._send(route, head=True)
+
+    def do_GET(self):
+        route = self._route()
+        if route is not None:
+            self._send(route)
+
+    def _send(self, route, head=False):
+        etag = route.get("headers", {}).get("ETag")
+        if etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        body = route["body"](self.query) if callable(route["body"]) else route["body"]
+        start, end, status = 0, len(body) - 1, route.get("status", 200)
+
+        range_header = self.headers.get("Range")
+        if range_header and route.get("ranges", True) and status == 200:
+            first, _, last = range_header.replace("bytes=", "").partition("-")
+            start, end, status = int(first), min(int(last or len(body) - 1), len(body) - 1), 206
+
+        self.send_response(status)
+        for key, value in route.get("headers", {}).items():
+            self.send_header(key, value)
+        if route.get("ranges", True):
+            self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if head:
+            return
+
+        data = body[start : end + 1]
+        if route.get("fail_after") is not None:
+            data = data[: route.pop("fail_after")]
+            self.wfile.write(data)
+            self.close_connection = True
+            return
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def http_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.routes = {}
+    server.requests = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,35 @@
+import pytest
+
+from dataset_extractor_lotus.lotus_bench import STAGES, PeakRSS, compare_benchmarks, main, run_benchmarks
+
+
+def test_run_benchmarks(tmp_path):
+    results = run_benchmarks([2000], stages=["read_csv", "sample_members", "mines_export"], workdir=tmp_path)
+    assert [result["stage"] for result in results] == ["read_csv", "sample_members", "mines_export"]
+    for result in results:
+        assert result["rows"] == 2000
+        assert result["seconds"] > 0 and result["rows_per_second"] > 0
+        assert result["peak_rss_mb"] > 0 and result["rss_increase_mb"] >= 0
+
+    with pytest.raises(ValueError, match="Unknown stages"):
+        run_benchmarks([2000], stages=["nope"])
+
+
+def test_all_stages_run(tmp_path):
+    output = tmp_path / "bench.json"
+    assert main(["--rows", "1000", "--workdir", str(tmp_path), "--output", str(output)]) == 0
+    assert main(["--rows", "1000", "--stages", "dedupe", "--baseline", str(output), "--tolerance", "1000"]) == 0
+
+
+def test_compare_benchmarks():
+    baseline = [{"rows": 10, "stage": "read_csv", "seconds": 1.0}, {"rows": 10, "stage": "dedupe", "seconds": 1.0}]
+    results = [{"rows": 10, "stage": "read_csv", "seconds": 1.1}, {"rows": 10, "stage": "dedupe", "seconds": 2.0}]
+    assert [regression["stage"] for regression in compare_benchmarks(results, baseline)] == ["dedupe"]
+    assert "append_rows" in STAGES
+
+
+def test_peak_rss():
+    with PeakRSS() as rss:
+        data = bytearray(50 * 1024**2)
+    assert rss.peak - rss.start >= 40 * 1024**2
+    del data
@@ -0,0 +1,51 @@
+import os
+
+from dataset_extractor_lotus import lotus_cache
+from dataset_extractor_lotus.lotus_reader import cache_variant, read_LOTUS_dataset, scan_LOTUS_dataset
+
+
+def test_cache_is_written_and_reused(lotus_csv_gz, lotus_cache_dir):
+    df = read_LOTUS_dataset(lotus_csv_gz)
+    cache_files = list(lotus_cache_dir.glob("*.arrow"))
+    assert len(cache_files) == 1
+
+    # a cache hit doesn't parse the source again
+    def fail():
+        raise AssertionError("source parsed again")
+
+    lf = lotus_cache.cached_scan(lotus_csv_gz, load=fail, variant=cache_variant(lotus_csv_gz))
+    assert lf.collect().equals(df)
+    assert df.equals(read_LOTUS_dataset(lotus_csv_gz, use_cache=False))
+
+
+def test_cache_variants_are_separated(lotus_csv, lotus_cache_dir):
+    read_LOTUS_dataset(lotus_csv)
+    read_LOTUS_dataset(lotus_csv, keep_all_gbifids=True)
+    assert len(list(lotus_cache_dir.glob("*.arrow"))) == 2
+
+
+def test_no_cache(lotus_csv, lotus_cache_dir):
+    scan_LOTUS_dataset(lotus_csv, use_cache=False).collect()
+    assert not lotus_cache_dir.exists()
+
+
+def test_cache_invalidated_on_change(lotus_csv, lotus_cache_dir):
+    read_LOTUS_dataset(lotus_csv)
+    with open(lotus_csv, "a") as f:
+        f.write("Q8,AAAA-8,N,,,,,O7,Salix alba,,,,Salicaceae,Salix,R8\n")
+    os.utime(lotus_csv, (0, 0))
+
+    assert len(read_LOTUS_dataset(lotus_csv)) == 9
+    assert len(list(lotus_cache_dir.glob("*.arrow"))) == 2
+
+
+def test_evict_least_recently_used(tmp_path):
+    for i, name in enumerate(["a", "b", "c"]):
+        path = tmp_path / f"{name}-v{lotus_cache.CACHE_SCHEMA_VERSION}.arrow"
+        path.write_bytes(b"x" * 10)
+        os.utime(path, (i, i))
+    old_version = tmp_path / "d-v0.arrow"
+    old_version.write_bytes(b"x")
+
+    removed = lotus_cache.evict(tmp_path, max_size=20)
+    assert sorted(path.name[0] for path in removed) == ["a", "d"]
@@ -0,0 +1,31 @@
+import polars as pl
+
+from dataset_extractor_lotus.lotus_dedup import ROW_HASH, add_row_hash, dedupe, row_hash
+from dataset_extractor_lotus.lotus_reader import read_LOTUS_dataset
+
+
+def test_dedupe(lotus_csv):
+    df = read_LOTUS_dataset(lotus_csv)
+
+    df_unique, stats = dedupe(pl.concat([df, df[:3]]).lazy())
+
+    assert df_unique.drop(ROW_HASH).equals(df)
+    assert stats == {"rows": 11, "unique": 8, "duplicates": 3, "verified": 6, "collisions": 0}
+
+
+def test_row_hash_ignores_dtypes(lotus_csv):
+    df = read_LOTUS_dataset(lotus_csv)
+    key_columns = ["structure_inchikey", "organism_taxonomy_gbifid"]
+    df_utf8 = df.with_columns(pl.col("organism_taxonomy_gbifid").cast(pl.Utf8))
+    assert df_utf8.select(row_hash(key_columns)).equals(df.select(row_hash(key_columns)))
+    assert add_row_hash(df, ["organism_wikidata"])[ROW_HASH].n_unique() == 6
+
+
+def test_dedupe_verifies_collisions():
+    # a cached hash column is reused: the same hash for different keys is a collision
+    df = pl.DataFrame({"id": ["a", "b", "a"], "smiles": ["C", "CC", "C"], ROW_HASH: [1, 1, 1]})
+
+    df_unique, stats = dedupe(df, key_columns=["id", "smiles"])
+
+    assert df_unique["id"].to_list() == ["a", "b"]
+    assert stats["collisions"] == 1 and stats["duplicates"] == 1
@@ -0,0 +1,56 @@
+import polars as pl
+
+from dataset_extractor_lotus.lotus_diff import diff_LOTUS, diff_LOTUS_files, write_diff
+from dataset_extractor_lotus.lotus_reader import read_LOTUS_dataset
+
+
+def test_diff_LOTUS(lotus_csv, tmp_path):
+    df_old = read_LOTUS_dataset(lotus_csv)
+    # new release: without the last row, one changed smiles and one new row
+    df_new = pl.concat([
+        df_old[:7].with_columns(
+            pl.when(pl.col("structure_wikidata") == "Q2").then(pl.lit("CC=C")).otherwise(pl.col("structure_smiles"))
+            .alias("structure_smiles")
+        ),
+        df_old[:1].with_columns(pl.lit("R99").alias("reference_wikidata")),
+    ])
+
+    df_added, df_removed, df_changed = diff_LOTUS(df_old.lazy(), df_new.lazy())
+
+    assert df_added["reference_wikidata"].to_list() == ["R99"]
+    assert df_removed["structure_wikidata"].to_list() == ["Q7"]
+    assert df_changed["structure_wikidata"].to_list() == ["Q2"]
+    assert df_changed["structure_smiles"].to_list() == ["CC=C"]
+    assert df_changed["structure_smiles_old"].to_list() == ["CC"]
+    assert df_changed["changed_columns"].to_list() == [["structure_smiles"]]
+
+
+def test_diff_same_release(lotus_csv, lotus_csv_gz, tmp_path):
+    # the same content, with other infered dtypes, isn't a change
+    df_added, df_removed, df_changed = diff_LOTUS_files(lotus_csv, lotus_csv_gz)
+    assert df_added.is_empty() and df_removed.is_empty() and df_changed.is_empty()
+
+    paths = write_diff(tmp_path / "diff", df_added, df_removed, df_changed)
+    assert [path.name for path in paths] == ["diff.added.csv", "diff.removed.csv", "diff.changed.csv"]
+
+
+def test_diff_with_null_keys(lotus_csv):
+    # a null in a key column is the same pair in both releases, not an added and a removed row
+    df = read_LOTUS_dataset(lotus_csv).with_columns(
+        pl.when(pl.col("structure_wikidata") == "Q2").then(None).otherwise(pl.col("reference_wikidata"))
+        .alias("reference_wikidata")
+    )
+    df_added, df_removed, df_changed = diff_LOTUS(df.lazy(), df.lazy())
+    assert df_added.is_empty() and df_removed.is_empty() and df_changed.is_empty()
+
+    df_new = df.with_columns(pl.lit("CC=C").alias("structure_smiles"))
+    _, _, df_changed = diff_LOTUS(df.lazy(), df_new.lazy())
+    assert len(df_changed) == len(df)
+
+
+def test_diff_only_key_columns(lotus_csv):
+    df = read_LOTUS_dataset(lotus_csv)
+    keys = ["structure_inchikey", "organism_wikidata", "reference_wikidata"]
+    df_added, df_removed, df_changed = diff_LOTUS(df[:5].select(keys).lazy(), df[2:].select(keys).lazy())
+    assert (len(df_added), len(df_removed), len(df_changed)) == (3, 2, 0)
+    assert df_changed.columns == [*keys, "changed_columns"]
@@ -0,0 +1,41 @@
+import polars as pl
+
+from dataset_extractor_lotus import lotus_schema
+from dataset_extractor_lotus.lotus_index import INDEX_VARIANT, TaxonomyIndex, load_taxonomy_index
+from dataset_extractor_lotus.lotus_reader import read_LOTUS_dataset
+
+
+def test_taxonomy_index(lotus_csv):
+    df = read_LOTUS_dataset(lotus_csv)
+    index = TaxonomyIndex.build(df.lazy())
+
+    assert "organism_taxonomy_08genus" in index.levels()
+    assert index.members("organism_taxonomy_08genus") == ["Abies", "Pinus", "Quercus", "Rosa"]
+    assert index.code("organism_taxonomy_08genus", "Quercus") == 2
+    assert index.count("organism_taxonomy_08genus", "Rosa") == 3
+    assert index.count("organism_taxonomy_08genus", "Ficus") == 0
+    assert index.row_ids("organism_taxonomy_06family", "Pinaceae").tolist() == [0, 1, 2, 3]
+    # the id columns can be looked up with the text of the member
+    assert index.count("organism_taxonomy_gbifid", "8395064") == 2
+
+    df_rosa = df.filter(df["organism_taxonomy_08genus"] == "Rosa")
+    assert index.take(df.lazy(), "organism_taxonomy_08genus", "Rosa").equals(df_rosa)
+    assert index.take(df, "organism_taxonomy_08genus", "Rosa").equals(df_rosa)
+    assert index.take(df.lazy(), "organism_taxonomy_08genus", "Ficus").is_empty()
+
+
+def test_taxonomy_index_is_cached(lotus_csv, lotus_cache_dir):
+    index = load_taxonomy_index(lotus_csv)
+    assert len(list(lotus_cache_dir.glob(f"*-{INDEX_VARIANT}-tests-*.arrow"))) == 1
+
+    cached = load_taxonomy_index(lotus_csv)
+    assert cached.df_index.equals(index.df_index)
+    assert cached.members("organism_taxonomy_08genus") == index.members("organism_taxonomy_08genus")
+
+
+def test_taxonomy_index_follows_the_layout_version(lotus_csv, lotus_cache_dir, monkeypatch):
+    # another dtype in the registry is another layout version, so the index is built again
+    load_taxonomy_index(lotus_csv)
+    monkeypatch.setitem(lotus_schema.LOTUS_LAYOUTS, "tests", {**lotus_schema.LOTUS_LAYOUTS["tests"], "structure_cid": pl.Utf8})
+    load_taxonomy_index(lotus_csv)
+    assert len(list(lotus_cache_dir.glob(f"*-{INDEX_VARIANT}-*.arrow"))) == 2
@@ -0,0 +1,128 @@
+import polars as pl
+import pytest
+
+from dataset_extractor_lotus import lotus_jobs
+from dataset_extractor_lotus.lotus_jobs import parse_job_spec, plan_jobs, read_job_spec, run_jobs
+from dataset_extractor_lotus.lotus_manifest import manifest_path, materialize_manifest
+
+
+def _spec_toml(lotus_csv, tmp_path):
+    path = tmp_path / "jobs.toml"
+    path.write_text(
+        f"""
+[defaults]
+input = "{lotus_csv}"
+seed = 7
+
+[[tasks]]
+name = "abies"
+output = "{tmp_path / 'abies.csv'}"
+taxalevel = "organism_taxonomy_08genus"
+members = ["Abies"]
+samplesize_per_member = 2
+
+[[tasks]]
+name = "families"
+output = "{tmp_path / 'families.csv'}"
+format = "MINES"
+quotas = "organism_taxonomy_06family=*; rows=1"
+
+[[tasks]]
+name = "rosa"
+output = "{tmp_path / 'abies.csv'}"
+taxalevel = "organism_taxonomy_08genus"
+members = "Rosa"
+samplesize_per_member = 5
+"""
+    )
+    return path
+
+
+def test_read_job_spec(lotus_csv, tmp_path):
+    spec = read_job_spec(_spec_toml(lotus_csv, tmp_path))
+    assert [task["name"] for task in spec["tasks"]] == ["abies", "families", "rosa"]
+    assert spec["tasks"][1]["format"] == "mines"
+    assert spec["tasks"][2]["members"] == ["Rosa"]
+    assert all(task["input"] == [str(lotus_csv)] and task["seed"] == 7 for task in spec["tasks"])
+
+    yaml_path = tmp_path / "jobs.yaml"
+    yaml_path.write_text(f"tasks:\n  - input: {lotus_csv}\n    output: out.csv\n    quotas: rows=1\n")
+    assert read_job_spec(yaml_path)["tasks"][0]["name"] == "task_1"
+
+
+@pytest.mark.parametrize(
+    "task, error",
+    [
+        ({"output": "out.csv", "quotas": "rows=1"}, "no input"),
+        ({"input": "in.csv", "output": "out.csv"}, "needs quotas"),
+        ({"input": "in.csv", "output": "out.csv", "quotas": "rows=1", "sample": 1}, "unknown keys"),
+        ({"input": "in.csv", "output": "out.csv", "quotas": "rows=1", "format": "parquet"}, "unknown format"),
+    ],
+)
+def test_parse_job_spec_errors(task, error):
+    with pytest.raises(ValueError, match=error):
+        parse_job_spec({"tasks": [task]})
+
+
+def test_plan_jobs_shares_inputs_and_chains_outputs(lotus_csv, tmp_path):
+    tasks = read_job_spec(_spec_toml(lotus_csv, tmp_path))["tasks"]
+    inputs, chains = plan_jobs(tasks)
+    assert list(inputs.values()) == [["abies", "families", "rosa"]]
+    assert [[task["name"] for task in chain] for chain in chains] == [["abies", "rosa"], ["families"]]
+
+
+def test_run_jobs(lotus_csv, tmp_path, monkeypatch):
+    loads = []
+    load_input = lotus_jobs.load_input
+    monkeypatch.setattr(lotus_jobs, "load_input", lambda key: loads.append(key) or load_input(key))
+
+    spec = read_job_spec(_spec_toml(lotus_csv, tmp_path))
+    report = run_jobs(spec["tasks"], max_workers=2)
+
+    assert len(loads) == 1
+    assert [result["status"] for result in report] == ["ok", "ok", "ok"]
+    assert [result["rows"] for result in report] == [2, 3, 3]
+    assert all(result["seconds"] >= 0 and result["load_seconds"] > 0 for result in report)
+
+    df_abies = pl.read_csv(tmp_path / "abies.csv")
+    assert sorted(df_abies["organism_taxonomy_08genus"].to_list()) == ["Abies", "Abies", "Rosa", "Rosa", "Rosa"]
+    assert pl.read_csv(tmp_path / "families.csv").columns == ["id", "smiles"]
+
+    # every task is in the manifest of its output
+    df = materialize_manifest(manifest_path(tmp_path / "abies.csv"))
+    assert len(df) == 5
+
+
+def test_shared_scan_gets_the_lazy_input(lotus_csv, tmp_path, monkeypatch):
+    # the input isn't collected before the shared scan, so the combined filter is pushed down to the reader
+    scans = []
+    shared_scan = lotus_jobs.shared_scan
+    monkeypatch.setattr(lotus_jobs, "shared_scan", lambda data, requests: scans.append(data) or shared_scan(data, requests))
+
+    run_jobs(read_job_spec(_spec_toml(lotus_csv, tmp_path))["tasks"])
+
+    assert len(scans) == 1 and isinstance(scans[0], pl.LazyFrame)
+    assert "SELECTION" in scans[0].filter(pl.col("organism_taxonomy_08genus") == "Abies").explain()
+
+
+def test_failed_task_does_not_stop_the_others(lotus_csv, tmp_path):
+    tasks = parse_job_spec({
+        "defaults": {"output": str(tmp_path / "out.csv"), "quotas": "rows=1"},
+        "tasks": [{"input": str(tmp_path / "missing.csv")}, {"input": str(lotus_csv)}],
+    })["tasks"]
+    report = run_jobs(tasks)
+    assert [result["status"] for result in report] == ["failed", "ok"]
+    assert "FileNotFoundError" in report[0]["error"]
+
+
+def test_invalid_taxalevel_fails_only_its_task(lotus_csv, tmp_path):
+    tasks = parse_job_spec({
+        "defaults": {"input": str(lotus_csv), "samplesize_per_member": 1, "all_members": True},
+        "tasks": [
+            {"output": str(tmp_path / "genus.csv"), "taxalevel": "organism_taxonomy_08genus"},
+            {"output": str(tmp_path / "nope.csv"), "taxalevel": "organism_taxonomy_nope"},
+        ],
+    })["tasks"]
+    report = run_jobs(tasks)
+    assert [result["status"] for result in report] == ["ok", "failed"]
+    assert report[0]["rows"] == 4
@@ -0,0 +1,90 @@
+import pytest
+
+from dataset_extractor_lotus import lotus_cache
+from dataset_extractor_lotus.lotus_manifest import (
+    add_row_keys,
+    manifest_path,
+    materialize_manifest,
+    pop_row_keys,
+    pop_source_row_keys,
+    read_manifest,
+    scan_sources,
+    write_manifest,
+)
+from dataset_extractor_lotus.lotus_reader import scan_LOTUS_dataset
+from dataset_extractor_lotus.lotus_sampler import sample_members
+
+
+def _sample(lotus_csv, seed):
+    lf = add_row_keys(scan_LOTUS_dataset(lotus_csv))
+    df_sampled, _ = sample_members(lf, "organism_taxonomy_08genus", 2, members=["Abies", "Rosa"], seed=seed)
+    return pop_row_keys(df_sampled)
+
+
+def test_seed_is_reproducible(lotus_csv):
+    assert _sample(lotus_csv, 3)[1] == _sample(lotus_csv, 3)[1]
+    assert _sample(lotus_csv, 3)[0].equals(_sample(lotus_csv, 3)[0])
+
+
+def test_materialize_manifest(lotus_csv, tmp_path):
+    output = tmp_path / "out.csv"
+    df_first, rows_first = _sample(lotus_csv, 1)
+    write_manifest(output, lotus_csv, rows_first, 1, {"taxalevel": "organism_taxonomy_08genus"}, append=False)
+    df_second, rows_second = _sample(lotus_csv, 2)
+    write_manifest(output, lotus_csv, rows_second, 2, {"taxalevel": "organism_taxonomy_08genus"})
+
+    manifest = read_manifest(manifest_path(output))
+    assert [sample["seed"] for sample in manifest["samples"]] == [1, 2]
+
+    df_expected = df_first.vstack(df_second).unique().sort("structure_inchikey", "organism_wikidata")
+    df = materialize_manifest(manifest_path(output)).sort("structure_inchikey", "organism_wikidata")
+    assert df.equals(df_expected)
+
+
+def test_materialize_manifest_select_and_rename(lotus_csv, tmp_path):
+    output = tmp_path / "out.csv"
+    write_manifest(output, lotus_csv, [0, 4], 1, {}, select=["structure_wikidata", "structure_smiles"],
+                   rename={"structure_wikidata": "id", "structure_smiles": "smiles"}, append=False)
+    assert materialize_manifest(manifest_path(output)).rows() == [("Q1", "C"), ("Q5", "CO")]
+
+
+
+def test_materialize_manifest_keeps_all_gbifids(lotus_csv, tmp_path):
+    output = tmp_path / "out.csv"
+    write_manifest(output, lotus_csv, [2, 3], 1, {"keep_all_gbifids": True}, append=False)
+    df = materialize_manifest(manifest_path(output))
+    assert df["organism_taxonomy_gbifid"].to_list() == ["c(2685530, 7291394)", "5285385"]
+
+def test_manifest_reuses_the_source_hash_of_the_cache(lotus_csv, tmp_path, monkeypatch):
+    # the source was hashed by the cached read, the manifest doesn't read the whole file again
+    output = tmp_path / "out.csv"
+    _, rows = _sample(lotus_csv, 1)
+    monkeypatch.setattr(lotus_cache, "file_hash", lambda path: pytest.fail("source hashed again"))
+
+    write_manifest(output, lotus_csv, rows, 1, {}, append=False)
+    assert len(materialize_manifest(manifest_path(output))) == len(rows)
+
+
+def test_materialize_manifest_changed_source(lotus_csv, tmp_path):
+    output = tmp_path / "out.csv"
+    write_manifest(output, lotus_csv, [0], 1, {}, append=False)
+    with open(lotus_csv, "a") as f:
+        f.write("Q8,AAAA-8,N,,,,,O7,Salix alba,,,,Salicaceae,Salix,R8\n")
+
+    with pytest.raises(ValueError, match="not the same"):
+        materialize_manifest(manifest_path(output))
+
+
+def test_manifest_of_several_sources(lotus_csv, lotus_csv_gz, tmp_path):
+    output = tmp_path / "out.csv"
+    df, _ = sample_members(scan_sources([lotus_csv, lotus_csv_gz]), "organism_taxonomy_08genus", 5, seed=3)
+    df, source_row_keys = pop_source_row_keys(df)
+    assert set(source_row_keys) == {str(lotus_csv), str(lotus_csv_gz)}
+
+    for index, (source, row_keys) in enumerate(source_row_keys.items()):
+        write_manifest(output, source, row_keys, seed=3, parameters={}, append=index > 0)
+
+    # both sources have the same rows, so the materialized toydataset has no duplicates
+    df_again = materialize_manifest(manifest_path(output))
+    assert len(read_manifest(manifest_path(output))["samples"]) == 2
+    assert len(df_again) == len(df.unique(subset=["structure_inchikey", "organism_wikidata", "reference_wikidata"]))
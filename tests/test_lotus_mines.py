@@ -0,0 +1,49 @@
+import json
+
+import polars as pl
+
+from dataset_extractor_lotus.lotus_dedup import ROW_HASH, dedupe
+from dataset_extractor_lotus.lotus_mines import (
+    format_mines_report,
+    mines_report,
+    suffix_duplicate_ids,
+    write_mines_report,
+)
+
+
+def test_mines_report(tmp_path):
+    df = pl.DataFrame({
+        "id": ["a", "a", "b", "c", "c", "d"],
+        "smiles": ["C", "CC", "C", "O", "O", "C"],
+    })
+
+    report = mines_report(df.lazy())
+
+    assert report["rows"] == 6
+    assert report["unique_rows"] == 5
+    assert report["unique_ids"] == 4
+    assert report["unique_smiles"] == 3
+    assert report["duplicate_ids"] == [{"id": "a", "count": 2}]
+    assert report["duplicate_smiles"] == [{"smiles": "C", "count": 3}]
+    assert "Duplicate IDs found (1):" in format_mines_report(report)
+
+    path = write_mines_report(report, tmp_path / "report.json")
+    assert json.loads(path.read_text()) == report
+
+
+def test_suffix_duplicate_ids():
+    df = pl.DataFrame({"id": ["a", "b", "a", "a"], "smiles": ["C", "CC", "O", "CO"]})
+
+    df_suffixed = suffix_duplicate_ids(df)
+
+    assert df_suffixed["id"].to_list() == ["a_id1", "b", "a_id2", "a_id3"]
+    assert df_suffixed["smiles"].equals(df["smiles"])
+    assert mines_report(df_suffixed)["duplicate_ids"] == []
+
+
+def test_mines_report_ignores_the_row_hash():
+    # the pairs are compared by their values, a row hash column of dedupe doesn't change the report
+    df, _ = dedupe(pl.DataFrame({"id": ["a", "a", "b"], "smiles": ["C", "CC", "C"]}), ["id", "smiles"])
+    df = df.with_columns(pl.lit(1, dtype=pl.UInt64).alias(ROW_HASH))
+    assert mines_report(df)["unique_rows"] == 3
+    assert suffix_duplicate_ids(df)["id"].to_list() == ["a_id1", "a_id2", "b"]
@@ -0,0 +1,41 @@
+import polars as pl
+
+from dataset_extractor_lotus.lotus_planner import combined_predicate, shared_scan
+from dataset_extractor_lotus.lotus_reader import read_LOTUS_dataset, scan_LOTUS_dataset
+from dataset_extractor_lotus.lotus_sampler import parse_quota_spec
+
+REQUESTS = [
+    {"taxalevel": "organism_taxonomy_08genus", "members": ["Abies"]},
+    {"taxalevel": "organism_taxonomy_08genus", "members": ["Pinus", "Nope"]},
+    {"taxalevel": "organism_taxonomy_06family", "members": ["Rosaceae"]},
+]
+
+
+def test_shared_scan_partitions(lotus_csv):
+    df = read_LOTUS_dataset(lotus_csv)
+    partitions = shared_scan(df, REQUESTS)
+
+    for request, df_partition in zip(REQUESTS, partitions):
+        assert df_partition.equals(df.filter(pl.col(request["taxalevel"]).is_in(request["members"])))
+    assert [len(df_partition) for df_partition in partitions] == [3, 1, 3]
+
+
+def test_shared_scan_lazy_and_categorical(lotus_csv):
+    partitions = shared_scan(scan_LOTUS_dataset(lotus_csv, categorical=True), REQUESTS)
+    assert partitions[2]["organism_taxonomy_06family"].dtype == pl.Categorical
+    assert partitions[2]["structure_wikidata"].cast(pl.Utf8).to_list() == ["Q5", "Q6", "Q1"]
+
+
+def test_combined_predicate_one_is_in_per_level(lotus_csv):
+    predicate = str(combined_predicate(REQUESTS))
+    assert predicate.count("is_in") == 2
+
+    # all the members of a level or a quota with only rows need all the rows of the level or dataset
+    assert "is_not_null" in str(combined_predicate([*REQUESTS, {"taxalevel": "organism_taxonomy_08genus", "members": None}]))
+    assert combined_predicate([*REQUESTS, {"quotas": parse_quota_spec("rows=5")}]) is None
+
+
+def test_shared_scan_quotas(lotus_csv):
+    df = read_LOTUS_dataset(lotus_csv)
+    (df_quota,) = shared_scan(df, [{"quotas": parse_quota_spec("organism_taxonomy_06family=*; rows=1")}])
+    assert df_quota.equals(df)
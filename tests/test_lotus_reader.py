@@ -0,0 +1,120 @@
+import polars as pl
+
+from dataset_extractor_lotus import lotus_schema
+from dataset_extractor_lotus.lotus_reader import (
+    categorical_memory_report,
+    gbifids_to_text,
+    read_LOTUS_dataset,
+    scan_LOTUS_dataset,
+    scan_LOTUS_datasets,
+)
+from dataset_extractor_lotus.lotus_sampler import parse_quota_spec, sample_members, sample_quotas
+from tests.conftest import LOTUS_HEADER
+
+
+def test_scan_returns_lazyframe(lotus_csv):
+    assert isinstance(scan_LOTUS_dataset(lotus_csv), pl.LazyFrame)
+
+
+def test_read_fixes_dtypes(lotus_csv):
+    df = read_LOTUS_dataset(lotus_csv)
+    assert df["structure_xlogp"].dtype == pl.Float32
+    assert df["organism_taxonomy_ncbiid"].dtype == pl.UInt32
+    assert df["organism_taxonomy_gbifid"].dtype == pl.Int32
+    assert df["organism_taxonomy_gbifid"].to_list() == [2685484, 2685484, None, 5285385, 8395064, 8395064, None, 2878688]
+
+
+def test_read_keeps_all_gbifids(lotus_csv):
+    df = read_LOTUS_dataset(lotus_csv, keep_all_gbifids=True)
+    assert df["organism_taxonomy_gbifid"].dtype == pl.List(pl.Int32)
+    assert df["organism_taxonomy_gbifid"][2].to_list() == [2685530, 7291394]
+    assert df["organism_taxonomy_gbifid"][6].to_list() == [3005039]
+    assert df["organism_taxonomy_gbifid"][0].to_list() == [2685484]
+
+
+
+def test_gbifids_to_text(lotus_csv):
+    # written like in the LOTUS exports, so the output file can be read again
+    df = gbifids_to_text(read_LOTUS_dataset(lotus_csv, keep_all_gbifids=True))
+    assert df["organism_taxonomy_gbifid"].to_list()[:3] == ["2685484", "2685484", "c(2685530, 7291394)"]
+    assert df["organism_taxonomy_gbifid"][6] == "3005039"
+
+    df_collapsed = read_LOTUS_dataset(lotus_csv)
+    assert gbifids_to_text(df_collapsed).equals(df_collapsed)
+
+def test_scan_pushes_down_filter_and_selection(lotus_csv):
+    df = (
+        scan_LOTUS_dataset(lotus_csv)
+        .filter(pl.col("organism_taxonomy_08genus") == "Abies")
+        .select(["structure_wikidata", "structure_smiles"])
+        .collect()
+    )
+    assert df.columns == ["structure_wikidata", "structure_smiles"]
+    assert df["structure_wikidata"].to_list() == ["Q1", "Q2", "Q3"]
+
+
+def test_scan_compressed_equals_plain(lotus_csv, lotus_csv_gz):
+    assert read_LOTUS_dataset(lotus_csv_gz).equals(read_LOTUS_dataset(lotus_csv))
+
+
+def test_read_without_gbifid_column(tmp_path):
+    path = tmp_path / "mines.csv"
+    path.write_text("id,smiles\nQ1,C\n")
+    assert read_LOTUS_dataset(path).columns == ["id", "smiles"]
+
+
+def test_categorical_profile(lotus_csv):
+    df = read_LOTUS_dataset(lotus_csv)
+    df_categorical = read_LOTUS_dataset(lotus_csv, categorical=True)
+
+    assert df_categorical["organism_taxonomy_08genus"].dtype == pl.Categorical
+    assert df_categorical["reference_wikidata"].dtype == pl.Categorical
+    assert df_categorical["structure_smiles"].dtype == pl.Utf8
+    assert df_categorical.with_columns(pl.col(pl.Categorical).cast(pl.Utf8)).equals(df)
+
+
+def test_categorical_profile_samples_the_same(lotus_csv):
+    lf = scan_LOTUS_dataset(lotus_csv)
+    lf_categorical = scan_LOTUS_dataset(lotus_csv, categorical=True)
+
+    df_sampled, _ = sample_members(lf, "organism_taxonomy_08genus", 2, members=["Abies", "Rosa"], seed=1)
+    df_categorical, _ = sample_members(lf_categorical, "organism_taxonomy_08genus", 2, members=["Abies", "Rosa"], seed=1)
+    assert df_categorical.with_columns(pl.col(pl.Categorical).cast(pl.Utf8)).equals(df_sampled)
+
+    quotas = parse_quota_spec("organism_taxonomy_06family=2; rows=1")
+    df_sampled, _ = sample_quotas(lf, quotas, seed=1)
+    df_categorical, _ = sample_quotas(lf_categorical, quotas, seed=1)
+    assert df_categorical.with_columns(pl.col(pl.Categorical).cast(pl.Utf8)).equals(df_sampled)
+
+
+def test_categorical_memory_report(lotus_csv):
+    # all the columns are read at once
+    reads = []
+    lf = scan_LOTUS_dataset(lotus_csv).map_batches(lambda df: reads.append(len(df)) or df)
+
+    df_report = categorical_memory_report(lf)
+
+    assert reads == [8]
+    assert "organism_taxonomy_06family" in df_report["column"].to_list()
+    assert df_report.columns == ["column", "utf8_bytes", "categorical_bytes", "saved_bytes", "saved_percent"]
+
+
+def test_scan_several_datasets(lotus_csv, lotus_csv_gz, tmp_path, monkeypatch):
+    # a second release without one column and with another dtype
+    monkeypatch.setattr(lotus_schema, "LOTUS_LAYOUTS", dict(lotus_schema.LOTUS_LAYOUTS))
+    lotus_schema.register_layout(
+        "tests_other", [column for column in LOTUS_HEADER if column != "structure_cid"], {"structure_wikidata": pl.Int64}, base="tests"
+    )
+    other = tmp_path / "other.csv"
+    df_other = read_LOTUS_dataset(lotus_csv).drop("structure_cid")
+    df_other.with_columns(pl.int_range(0, 8).alias("structure_wikidata")).write_csv(other)
+
+    lf = scan_LOTUS_datasets([lotus_csv_gz, str(tmp_path / "*.csv")], source_column="source", row_index_name="row")
+    df = lf.collect()
+
+    assert len(df) == 3 * 8
+    assert df["source"].unique(maintain_order=True).to_list() == [str(lotus_csv_gz), str(lotus_csv), str(other)]
+    assert df["row"].to_list() == list(range(8)) * 3
+    assert df["structure_cid"].null_count() == 8 + 2
+    assert df["structure_wikidata"].dtype == pl.Utf8
+    assert df["structure_wikidata"].to_list()[-2:] == ["6", "7"]
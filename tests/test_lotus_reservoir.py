@@ -0,0 +1,53 @@
+import numpy as np
+import polars as pl
+import pytest
+
+from dataset_extractor_lotus.lotus_reservoir import ReservoirSampler
+from dataset_extractor_lotus.lotus_sampler import sample_members
+
+
+def _batches(df, batch_size):
+    return [df[offset : offset + batch_size] for offset in range(0, len(df), batch_size)]
+
+
+def test_reservoir_equals_sample_members():
+    df = pl.DataFrame({"group": ["a", "b", "a", "c", "a", "b", "a", "a"], "value": range(8)})
+    df_expected, _ = sample_members(df.lazy(), "group", 2, seed=11)
+
+    sampler = ReservoirSampler(2, strata=["group"], seed=11)
+    for df_batch in _batches(df, 3):
+        sampler.add(df_batch)
+
+    assert sampler.sample(sort_by="value").equals(df_expected)
+    assert sampler.available().sort("group").rows() == [("a", 5), ("b", 2), ("c", 1)]
+
+
+def test_reservoir_one_stratum():
+    sampler = ReservoirSampler(3, seed=1)
+    for df_batch in _batches(pl.DataFrame({"value": range(10)}), 4):
+        sampler.add(df_batch)
+
+    assert sampler.sample().columns == ["value"]
+    assert len(sampler.sample()) == 3
+    assert sampler.available()["available"].to_list() == [10]
+
+
+def test_reservoir_is_uniform():
+    # every row of a stratum has the same chance to be sampled (like ".sample(n)")
+    df = pl.DataFrame({"value": range(10)})
+    counts = np.zeros(10)
+    for seed in range(400):
+        sampler = ReservoirSampler(2, seed=seed)
+        for df_batch in _batches(df, 3):
+            sampler.add(df_batch)
+        counts[sampler.sample()["value"].to_numpy()] += 1
+
+    # expected: 400 * 2 / 10 = 80 per row
+    assert counts.sum() == 800
+    assert counts.min() > 50
+    assert counts.max() < 110
+
+
+def test_reservoir_without_rows():
+    with pytest.raises(ValueError):
+        ReservoirSampler(2).sample()
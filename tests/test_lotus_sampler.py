@@ -0,0 +1,68 @@
+import polars as pl
+
+from dataset_extractor_lotus.lotus_reader import scan_LOTUS_dataset
+from dataset_extractor_lotus.lotus_sampler import parse_quota_spec, read_members_file, sample_members, sample_quotas
+
+
+def test_sample_members(lotus_csv):
+    df_sampled, df_counts = sample_members(
+        scan_LOTUS_dataset(lotus_csv), "organism_taxonomy_08genus", 2, members=["Abies", "Rosa", "Nope"]
+    )
+    assert df_sampled.group_by("organism_taxonomy_08genus").len().sort("organism_taxonomy_08genus").rows() == [
+        ("Abies", 2),
+        ("Rosa", 2),
+    ]
+    assert df_counts.rows() == [("Abies", 3, 2), ("Rosa", 3, 2), ("Nope", 0, 0)]
+
+
+def test_sample_all_members(lotus_csv):
+    df_sampled, df_counts = sample_members(scan_LOTUS_dataset(lotus_csv), "organism_taxonomy_06family", 10)
+    assert len(df_sampled) == 8
+    assert df_counts["organism_taxonomy_06family"].to_list() == ["Fagaceae", "Pinaceae", "Rosaceae"]
+    assert df_counts["sampled"].sum() == 8
+
+
+def test_sample_members_keeps_columns(lotus_csv):
+    lf = scan_LOTUS_dataset(lotus_csv)
+    df_sampled, _ = sample_members(lf, "organism_taxonomy_08genus", 1, members=["Pinus"])
+    assert df_sampled.schema == lf.schema
+    assert df_sampled["structure_wikidata"].to_list() == ["Q4"]
+
+
+def test_read_members_file(tmp_path):
+    path = tmp_path / "members.txt"
+    path.write_text("# genera\nAbies\n\n Rosa \n")
+    assert read_members_file(path) == ["Abies", "Rosa"]
+
+
+def test_parse_quota_spec():
+    assert parse_quota_spec("organism_taxonomy_06family=*; organism_taxonomy_08genus=10; rows=50%:1:5") == [
+        {"level": "organism_taxonomy_06family", "n": None, "fraction": None, "floor": 0, "cap": None},
+        {"level": "organism_taxonomy_08genus", "n": 10, "fraction": None, "floor": 0, "cap": None},
+        {"level": "rows", "n": None, "fraction": 0.5, "floor": 1, "cap": 5},
+    ]
+
+
+def test_sample_quotas(lotus_csv):
+    quotas = parse_quota_spec("organism_taxonomy_06family=*; organism_taxonomy_08genus=1; rows=2")
+    df_sampled, df_report = sample_quotas(scan_LOTUS_dataset(lotus_csv), quotas)
+
+    # one genus per family and up to 2 rows per genus
+    df_genera = df_sampled.group_by("organism_taxonomy_06family").agg(pl.col("organism_taxonomy_08genus").n_unique())
+    assert df_genera["organism_taxonomy_08genus"].to_list() == [1, 1, 1]
+    assert df_sampled.group_by("organism_taxonomy_08genus").len()["len"].max() <= 2
+    assert df_report.filter(pl.col("level") == "rows")["achieved"].sum() == len(df_sampled)
+    assert df_report.filter(pl.col("stratum") == "Fagaceae / Quercus").row(0) == ("rows", "Fagaceae / Quercus", 1, 2, 1)
+
+
+def test_sample_quotas_proportional(lotus_csv):
+    quotas = [{"level": "organism_taxonomy_06family"}, {"level": "rows", "fraction": 0.5, "floor": 1, "cap": 1}]
+    df_sampled, df_report = sample_quotas(scan_LOTUS_dataset(lotus_csv), quotas)
+    assert sorted(df_sampled["organism_taxonomy_06family"].to_list()) == ["Fagaceae", "Pinaceae", "Rosaceae"]
+    assert df_report.filter(pl.col("level") == "rows")["requested"].to_list() == [1, 1, 1]
+
+
+def test_sample_quotas_only_rows(lotus_csv):
+    df_sampled, df_report = sample_quotas(scan_LOTUS_dataset(lotus_csv), parse_quota_spec("rows=3"), seed=1)
+    assert len(df_sampled) == 3
+    assert df_report.rows() == [("rows", "all", 8, 3, 3)]
@@ -0,0 +1,89 @@
+import polars as pl
+import pytest
+
+from dataset_extractor_lotus import lotus_schema
+from dataset_extractor_lotus.lotus_reader import read_LOTUS_dataset
+from dataset_extractor_lotus.lotus_schema import (
+    LOTUS_COLUMNS,
+    LOTUS_LAYOUTS,
+    SchemaMismatchError,
+    detect_layout,
+    layout_version,
+    read_LOTUS_header,
+    schema_for,
+)
+from tests.conftest import LOTUS_HEADER
+
+
+def test_schema_for_known_columns(lotus_csv_gz):
+    header = read_LOTUS_header(lotus_csv_gz)
+    assert header == LOTUS_HEADER
+
+    schema = schema_for(header)
+    assert list(schema) == header
+    assert schema["structure_cid"] == pl.UInt32
+    assert schema["organism_taxonomy_gbifid"] == pl.Utf8
+
+
+def test_detect_layout():
+    assert detect_layout(list(reversed(LOTUS_LAYOUTS["frozen_metadata"]))) == "frozen_metadata"
+    assert detect_layout(LOTUS_HEADER) == "tests"
+    assert detect_layout(LOTUS_HEADER[1:]) is None
+    with pytest.raises(SchemaMismatchError):
+        schema_for(LOTUS_HEADER, layout="frozen_metadata")
+
+
+def test_missing_column_fails_with_diff():
+    # a release without a column fails too, not only one with a new column
+    with pytest.raises(SchemaMismatchError, match=r"missing columns: \['structure_wikidata'\]"):
+        schema_for(LOTUS_HEADER[1:])
+
+
+def test_new_column_fails_with_diff(tmp_path):
+    path = tmp_path / "new_release.csv"
+    path.write_text(",".join([*list(LOTUS_LAYOUTS["frozen_metadata"])[1:], "structure_new"]) + "\n")
+
+    with pytest.raises(SchemaMismatchError) as error:
+        read_LOTUS_dataset(path, use_cache=False)
+    assert "new columns: ['structure_new']" in str(error.value)
+    assert "missing columns: ['structure_wikidata']" in str(error.value)
+
+
+def test_register_layout(tmp_path, monkeypatch):
+    monkeypatch.setattr(lotus_schema, "LOTUS_LAYOUTS", dict(lotus_schema.LOTUS_LAYOUTS))
+    path = tmp_path / "new_release.csv"
+    path.write_text("structure_wikidata,structure_new\nQ1,1.5\n")
+
+    lotus_schema.register_layout("new_release", ["structure_wikidata", "structure_new"], {"structure_new": pl.Float32})
+
+    assert read_LOTUS_dataset(path, use_cache=False)["structure_new"].dtype == pl.Float32
+    assert read_LOTUS_dataset(path)["structure_new"].dtype == pl.Float32
+
+
+def test_layouts_have_their_own_dtypes(monkeypatch):
+    monkeypatch.setattr(lotus_schema, "LOTUS_LAYOUTS", dict(lotus_schema.LOTUS_LAYOUTS))
+    version = layout_version("frozen_metadata")
+    columns = list(LOTUS_COLUMNS)
+
+    # another dtype in a new release doesn't change the other layouts
+    lotus_schema.register_layout("release_cid_text", columns[:-1], {"structure_cid": pl.Utf8})
+    assert lotus_schema.LOTUS_LAYOUTS["release_cid_text"]["structure_cid"] == pl.Utf8
+    assert lotus_schema.LOTUS_LAYOUTS["frozen_metadata"]["structure_cid"] == pl.UInt32
+    assert layout_version("frozen_metadata") == version
+
+    # a failed registration changes nothing
+    layouts = dict(lotus_schema.LOTUS_LAYOUTS)
+    with pytest.raises(SchemaMismatchError, match="without a dtype"):
+        lotus_schema.register_layout("broken", ["structure_cid", "structure_new"], {"structure_cid": pl.Int64})
+    with pytest.raises(SchemaMismatchError, match="already registered"):
+        lotus_schema.register_layout("release_cid_text", columns[:-1])
+    assert lotus_schema.LOTUS_LAYOUTS == layouts
+
+
+def test_registry_change_invalidates_the_cache(lotus_csv, lotus_cache_dir, monkeypatch):
+    monkeypatch.setattr(lotus_schema, "LOTUS_LAYOUTS", dict(lotus_schema.LOTUS_LAYOUTS))
+    assert read_LOTUS_dataset(lotus_csv)["structure_xlogp"].dtype == pl.Float32
+
+    lotus_schema.LOTUS_LAYOUTS["tests"] = {**lotus_schema.LOTUS_LAYOUTS["tests"], "structure_xlogp": pl.Float64}
+    assert read_LOTUS_dataset(lotus_csv)["structure_xlogp"].dtype == pl.Float64
+    assert len(list(lotus_cache_dir.glob("*.arrow"))) == 2
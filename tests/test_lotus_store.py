@@ -0,0 +1,45 @@
+import hashlib
+
+import pytest
+
+from dataset_extractor_lotus import lotus_store
+
+CONTENT = b"structure_inchikey,organism_wikidata\nA,B\n" * 100
+CHECKSUM = "md5:" + hashlib.md5(CONTENT).hexdigest()
+
+
+def test_same_file_is_stored_once(http_server):
+    http_server.routes["/files/lotus.csv.gz"] = {"body": CONTENT}
+    url = http_server.url + "/files/lotus.csv.gz"
+
+    first = lotus_store.store_file("1", "lotus.csv.gz", url, checksum=CHECKSUM)
+    second = lotus_store.store_file("2", "lotus.csv.gz", url, checksum=CHECKSUM)
+
+    assert first == second
+    assert first.read_bytes() == CONTENT
+    assert first.name.endswith(".csv.gz")
+    # only the first file was downloaded (one probe, then the segments)
+    assert len([method for method, _, _ in http_server.requests if method == "HEAD"]) == 1
+    assert lotus_store.read_catalog()["records"] == {"1": {"lotus.csv.gz": CHECKSUM}, "2": {"lotus.csv.gz": CHECKSUM}}
+
+
+def test_store_without_checksum(http_server):
+    http_server.routes["/files/lotus.csv"] = {"body": CONTENT}
+
+    path = lotus_store.store_file("1", "lotus.csv", http_server.url + "/files/lotus.csv")
+
+    assert path == lotus_store.object_path(CHECKSUM, "lotus.csv")
+    assert path.read_bytes() == CONTENT
+
+
+def test_resolve_reference(http_server, lotus_csv, tmp_path):
+    http_server.routes["/files/lotus.csv"] = {"body": CONTENT}
+    path = lotus_store.store_file("7", "lotus.csv", http_server.url + "/files/lotus.csv", checksum=CHECKSUM)
+
+    assert lotus_store.resolve("7:lotus.csv") == path
+    assert lotus_store.resolve(str(lotus_csv)) == lotus_csv
+    with pytest.raises(FileNotFoundError):
+        lotus_store.resolve("7:other.csv")
+
+    linked = lotus_store.link(path, tmp_path / "lotus.csv")
+    assert linked.read_bytes() == CONTENT
@@ -0,0 +1,81 @@
+import bz2
+import lzma
+import zipfile
+
+import polars as pl
+import pytest
+
+from dataset_extractor_lotus.lotus_reader import read_LOTUS_dataset, scan_LOTUS_dataset
+from dataset_extractor_lotus.lotus_sampler import sample_members
+from dataset_extractor_lotus.lotus_stream import iter_csv_records, iter_LOTUS_batches, stream_sample_members
+
+
+def test_iter_batches_equals_read(lotus_csv_gz):
+    batches = list(iter_LOTUS_batches(lotus_csv_gz, batch_size=3, row_index_name="row"))
+    assert [len(batch) for batch in batches] == [3, 3, 2]
+
+    df = pl.concat(batches)
+    assert df["row"].to_list() == list(range(8))
+    assert df.drop("row").equals(read_LOTUS_dataset(lotus_csv_gz, use_cache=False))
+
+
+def test_stream_sample_equals_in_memory(lotus_csv):
+    df_memory, df_counts_memory = sample_members(
+        scan_LOTUS_dataset(lotus_csv).with_row_index("row"), "organism_taxonomy_06family", 2, seed=7
+    )
+    df_stream, df_counts_stream = stream_sample_members(
+        lotus_csv, "organism_taxonomy_06family", 2, seed=7, batch_size=2, row_index_name="row"
+    )
+    assert df_stream.equals(df_memory)
+    assert df_counts_stream.equals(df_counts_memory)
+
+
+def test_stream_sample_members(lotus_csv_gz):
+    df_sampled, df_counts = stream_sample_members(
+        lotus_csv_gz, "organism_taxonomy_08genus", 1, members=["Rosa", "Nope"], batch_size=2
+    )
+    assert df_sampled["organism_taxonomy_08genus"].to_list() == ["Rosa"]
+    assert df_counts.rows() == [("Rosa", 3, 1), ("Nope", 0, 0)]
+
+
+def test_stream_sample_without_rows(lotus_csv):
+    # a file with only the header gives an empty sample with all the columns, like the in-memory sampling
+    lotus_csv.write_text(lotus_csv.read_text().splitlines(keepends=True)[0])
+    df_memory, df_counts_memory = sample_members(
+        scan_LOTUS_dataset(lotus_csv, use_cache=False).with_row_index("row"), "organism_taxonomy_08genus", 2
+    )
+    df_stream, df_counts_stream = stream_sample_members(lotus_csv, "organism_taxonomy_08genus", 2, row_index_name="row")
+    assert df_stream.is_empty()
+    assert df_stream.schema == df_memory.schema
+    assert df_counts_stream.equals(df_counts_memory)
+
+    assert len(list(iter_LOTUS_batches(lotus_csv))) == 1
+
+
+def test_batches_split_on_records(lotus_csv):
+    # a quoted value with a line break (and an escaped quote) stays in its record
+    lines = lotus_csv.read_text().splitlines(keepends=True)
+    lines[2] = lines[2].replace("Abies alba", '"Abies\nalba ""x"""')
+    lotus_csv.write_text("".join(lines))
+
+    assert [len(records) for records in iter_csv_records(lotus_csv.read_text().splitlines(keepends=True)[1:], 3)] == [3, 3, 2]
+    batches = list(iter_LOTUS_batches(lotus_csv, batch_size=2, row_index_name="row"))
+    df = pl.concat(batches)
+    assert df["row"].to_list() == list(range(8))
+    assert df["organism_name"][1] == 'Abies\nalba "x"'
+    assert df.drop("row").equals(read_LOTUS_dataset(lotus_csv, use_cache=False))
+
+
+@pytest.mark.parametrize("suffix", [".bz2", ".xz", ".zip"])
+def test_batches_of_other_compressions(lotus_csv, tmp_path, suffix):
+    path = tmp_path / f"lotus.csv{suffix}"
+    if suffix == ".bz2":
+        path.write_bytes(bz2.compress(lotus_csv.read_bytes()))
+    elif suffix == ".xz":
+        path.write_bytes(lzma.compress(lotus_csv.read_bytes()))
+    else:
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.write(lotus_csv, "lotus.csv")
+
+    df = pl.concat(iter_LOTUS_batches(path, batch_size=3))
+    assert df.equals(read_LOTUS_dataset(lotus_csv, use_cache=False))
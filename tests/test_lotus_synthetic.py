@@ -0,0 +1,31 @@
+import polars as pl
+
+from dataset_extractor_lotus.lotus_reader import read_LOTUS_dataset
+from dataset_extractor_lotus.lotus_schema import LOTUS_COLUMNS, LOTUS_LAYOUTS, read_LOTUS_header
+from dataset_extractor_lotus.lotus_synthetic import generate_LOTUS, write_synthetic_LOTUS
+
+
+def test_generate_LOTUS_schema_and_taxonomy():
+    df = generate_LOTUS(5000, seed=1)
+    assert df.columns == list(LOTUS_LAYOUTS["frozen_metadata"])
+    assert df.schema == {column: LOTUS_COLUMNS[column] for column in df.columns}
+    assert df.equals(generate_LOTUS(5000, seed=1))
+
+    # the taxonomy is a tree: every genus is in exactly one family
+    families_per_genus = df.drop_nulls("organism_taxonomy_08genus").group_by("organism_taxonomy_08genus").agg(
+        pl.col("organism_taxonomy_06family").n_unique()
+    )
+    assert families_per_genus["organism_taxonomy_06family"].max() == 1
+    assert df["organism_taxonomy_01domain"].n_unique() == 4
+    assert df["structure_inchikey"].str.len_chars().unique().to_list() == [27]
+    assert df["organism_taxonomy_gbifid"].str.starts_with("c(").any()
+
+
+def test_write_synthetic_LOTUS_in_chunks(tmp_path):
+    path = write_synthetic_LOTUS(tmp_path / "synthetic.csv.gz", 2500, seed=2, chunk_size=1000)
+    assert read_LOTUS_header(path) == list(LOTUS_LAYOUTS["frozen_metadata"])
+
+    df = read_LOTUS_dataset(path, use_cache=False)
+    assert len(df) == 2500
+    # the "c(...)" gbifids are null after reading (see fix_gbifid)
+    assert df["organism_taxonomy_gbifid"].dtype == pl.Int32
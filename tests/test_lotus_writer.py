@@ -0,0 +1,77 @@
+import hashlib
+
+import numpy as np
+import polars as pl
+import pytest
+
+from dataset_extractor_lotus.lotus_reader import read_LOTUS_dataset
+from dataset_extractor_lotus.lotus_writer import KEY_INDEX_HEADER, append_rows, keys_path, row_keys
+
+
+def test_append_rows(lotus_csv, tmp_path):
+    df = read_LOTUS_dataset(lotus_csv)
+    output = tmp_path / "out.csv"
+
+    assert append_rows(df[:3], output) == (3, 0)
+    assert append_rows(df[2:5], output) == (2, 1)
+    assert keys_path(output).exists()
+
+    df_out = read_LOTUS_dataset(output, use_cache=False)
+    assert df_out.equals(df[:5])
+
+
+def test_append_rows_dedupes_new_rows(lotus_csv, tmp_path):
+    df = read_LOTUS_dataset(lotus_csv)
+    output = tmp_path / "out.csv"
+    assert append_rows(pl.concat([df[:2], df[:2]]), output) == (2, 2)
+
+
+def test_append_rows_without_key_index(lotus_csv, tmp_path):
+    # files written before the key index (or changed by hand) are read once to build it
+    df = read_LOTUS_dataset(lotus_csv)
+    output = tmp_path / "out.csv"
+    df[:4].write_csv(output)
+
+    assert append_rows(df[:6], output) == (2, 4)
+    assert append_rows(df, output) == (2, 6)
+    assert len(read_LOTUS_dataset(output, use_cache=False)) == 8
+
+
+def test_append_rows_other_columns(tmp_path):
+    output = tmp_path / "mines.csv"
+    df = pl.DataFrame({"id": ["Q1", "Q2"], "smiles": ["C", "CC"]})
+    assert append_rows(df, output) == (2, 0)
+    assert append_rows(df.select("smiles", "id"), output) == (0, 2)
+
+    with pytest.raises(ValueError, match="not the same"):
+        append_rows(df.rename({"smiles": "structure_smiles"}), output)
+
+
+def test_key_index_is_stable(tmp_path):
+    # the stored keys are blake2b over "<id>\x1f<smiles>", the same with every polars version
+    output = tmp_path / "mines.csv"
+    append_rows(pl.DataFrame({"id": ["Q1", "Q2"], "smiles": ["C", "CC"]}), output)
+
+    index = np.fromfile(keys_path(output), dtype=np.uint64)
+    assert index.tolist() == [KEY_INDEX_HEADER, output.stat().st_size, 16778970755645228631, 13919277398508025279]
+
+
+def test_key_index_of_another_hash_is_rebuilt(tmp_path):
+    # an index without the header (for example with the polars hash of the older versions) is built again
+    output = tmp_path / "mines.csv"
+    df = pl.DataFrame({"id": ["Q1", "Q2"], "smiles": ["C", "CC"]})
+    append_rows(df, output)
+    np.array([output.stat().st_size, 1, 2], dtype=np.uint64).tofile(keys_path(output))
+
+    assert append_rows(df, output) == (0, 2)
+    assert np.fromfile(keys_path(output), dtype=np.uint64)[0] == KEY_INDEX_HEADER
+
+
+def test_row_keys_are_stable(lotus_csv):
+    # blake2b (8 bytes, little endian) over the key values joined with "\x1f" (null as "\x00"), computed without polars
+    df = read_LOTUS_dataset(lotus_csv)
+    key_columns = ["structure_inchikey", "organism_taxonomy_gbifid"]
+    keys = ["\x1f".join("\x00" if value is None else str(value) for value in row) for row in df.select(key_columns).iter_rows()]
+    expected = [int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") for key in keys]
+    assert row_keys(df, key_columns).tolist() == expected
+    assert row_keys(pl.DataFrame({"id": ["Q1"], "smiles": ["C"]}), ["id", "smiles"]).tolist() == [16778970755645228631]
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+import requests
+
+from dataset_extractor_lotus import zenodo_downloader as zd
+from dataset_extractor_lotus.zenodo_cache import MetadataCache
+
+RECORD = {"files": [{"key": "lotus.csv.gz", "links": {"self": "/files/lotus.csv.gz"}, "checksum": "md5:1"}]}
+
+
+def test_records_are_requested_once(http_server, tmp_path):
+    http_server.routes["/api/records/1"] = {"body": json.dumps(RECORD).encode()}
+    api_url = http_server.url + "/api"
+
+    zd.get_filenames(["1"], api_url=api_url, cache=MetadataCache(tmp_path / "metadata.json"))
+    # a new run reads the cache file again
+    result = zd.get_filenames(["1"], api_url=api_url, cache=MetadataCache(tmp_path / "metadata.json"))
+
+    assert result[1] == ["lotus.csv.gz"]
+    assert len(http_server.requests) == 1
+
+
+def test_stale_listing_is_revalidated(http_server, tmp_path):
+    listing = {"hits": {"hits": [{"id": 1}], "total": 1}}
+    http_server.routes["/api/records"] = {"body": json.dumps(listing).encode(), "headers": {"ETag": '"v1"'}}
+    cache = MetadataCache(tmp_path / "metadata.json", listing_ttl=0)
+
+    assert zd.get_all_records(api_url=http_server.url + "/api", cache=cache) == {"1"}
+    assert zd.get_all_records(api_url=http_server.url + "/api", cache=cache) == {"1"}
+
+    assert http_server.requests[0][2].get("If-None-Match") is None
+    assert http_server.requests[1][2]["If-None-Match"] == '"v1"'
+
+
+def test_offline_uses_stale_entry(http_server, tmp_path):
+    http_server.routes["/api/records/1"] = {"body": json.dumps(RECORD).encode()}
+    url = http_server.url + "/api/records/1"
+    cache = MetadataCache(tmp_path / "metadata.json")
+    cache.get_json(requests.Session(), url)
+
+    http_server.shutdown()
+    http_server.server_close()
+
+    assert cache.get_json(requests.Session(), url, ttl=0, timeout=1) == RECORD
+    with pytest.raises(requests.RequestException):
+        cache.get_json(requests.Session(), http_server.url + "/api/records/2", timeout=1)
+
+
+def test_doi_info_uses_the_cache(http_server, tmp_path):
+    files = {"entries": [{"key": "lotus.csv.gz", "links": {"self": "/f"}, "version_id": "v", "updated": "2023"}]}
+    http_server.routes["/api/records/1/files"] = {"body": json.dumps(files).encode()}
+    api_url = http_server.url + "/api"
+
+    for _ in range(2):
+        links = zd.doi_info("1", print_info=False, api_url=api_url, cache=MetadataCache(tmp_path / "metadata.json"))
+
+    assert links == ["https://zenodo.org/records/1/files/lotus.csv.gz"]
+    assert len(http_server.requests) == 1
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from dataset_extractor_lotus import zenodo_downloader as zd
+
+CONTENT = bytes(range(256)) * 400  # 100 KiB
+CHECKSUM = "md5:" + hashlib.md5(CONTENT).hexdigest()
+
+
+def test_download_file_in_segments(http_server, tmp_path):
+    http_server.routes["/files/lotus.csv.gz"] = {"body": CONTENT}
+    filename = str(tmp_path / "lotus.csv.gz")
+
+    zd.download_file(filename, http_server.url + "/files/lotus.csv.gz", checksum=CHECKSUM, segments=4, chunk_size=4096)
+
+    with open(filename, "rb") as f:
+        assert f.read() == CONTENT
+    assert not os.path.exists(filename + ".part")
+    ranges = [headers.get("Range") for method, _, headers in http_server.requests if method == "GET"]
+    assert len(ranges) == 4
+
+
+def test_download_file_resumes(http_server, tmp_path):
+    # the first try stops after 1024 bytes, the retry continues from there
+    http_server.routes["/files/lotus.csv.gz"] = {"body": CONTENT, "fail_after": 1024}
+    filename = str(tmp_path / "lotus.csv.gz")
+
+    zd.download_file(
+        filename, http_server.url + "/files/lotus.csv.gz", checksum=CHECKSUM, segments=1, chunk_size=256, retries=1
+    )
+
+    with open(filename, "rb") as f:
+        assert f.read() == CONTENT
+    ranges = [headers.get("Range") for method, _, headers in http_server.requests if method == "GET"]
+    assert ranges == [f"bytes=0-{len(CONTENT) - 1}", f"bytes=1024-{len(CONTENT) - 1}"]
+
+
+def test_download_file_continues_part_file(http_server, tmp_path):
+    # an interrupted run left a .part file and its progress
+    http_server.routes["/files/lotus.csv.gz"] = {"body": CONTENT}
+    url = http_server.url + "/files/lotus.csv.gz"
+    filename = str(tmp_path / "lotus.csv.gz")
+    with open(filename + ".part", "wb") as f:
+        f.write(CONTENT[:5000] + bytes(len(CONTENT) - 5000))
+    with open(filename + ".part.json", "w") as f:
+        json.dump({"url": url, "size": len(CONTENT), "segments": [{"start": 0, "end": len(CONTENT) - 1, "done": 5000}]}, f)
+
+    zd.download_file(filename, url, checksum=CHECKSUM)
+
+    with open(filename, "rb") as f:
+        assert f.read() == CONTENT
+    ranges = [headers.get("Range") for method, _, headers in http_server.requests if method == "GET"]
+    assert ranges == [f"bytes=5000-{len(CONTENT) - 1}"]
+
+
+def test_download_file_without_ranges(http_server, tmp_path):
+    http_server.routes["/files/lotus.csv.gz"] = {"body": CONTENT, "ranges": False}
+    filename = str(tmp_path / "lotus.csv.gz")
+
+    zd.download_file(filename, http_server.url + "/files/lotus.csv.gz", checksum=CHECKSUM)
+
+    with open(filename, "rb") as f:
+        assert f.read() == CONTENT
+
+
+def test_download_file_wrong_checksum(http_server, tmp_path):
+    http_server.routes["/files/lotus.csv.gz"] = {"body": CONTENT}
+    filename = str(tmp_path / "lotus.csv.gz")
+
+    with pytest.raises(ValueError, match="checksum"):
+        zd.download_file(filename, http_server.url + "/files/lotus.csv.gz", checksum="md5:0000")
+    assert not os.path.exists(filename)
+    assert not os.path.exists(filename + ".part")
+
+
+def test_get_all_records_follows_pages(http_server):
+    record_ids = [str(5794107 + i) for i in range(7)]
+
+    def listing(query):
+        assert query["q"] == "parent.id:5794106" and query["all_versions"] == "true"
+        page, size = int(query["page"]), int(query["size"])
+        hits = [{"id": int(record_id)} for record_id in record_ids[(page - 1) * size:page * size]]
+        return json.dumps({"hits": {"hits": hits, "total": len(record_ids)}}).encode()
+
+    http_server.routes["/api/records"] = {"body": listing}
+
+    records = zd.get_all_records(api_url=http_server.url + "/api", page_size=3)
+
+    assert records == set(record_ids)
+    assert len([path for _, path, _ in http_server.requests]) == 3
+
+
+def test_get_filenames_keeps_order(http_server):
+    for record_id in ["3", "1", "2"]:
+        http_server.routes[f"/api/records/{record_id}"] = {"body": json.dumps({"files": [
+            {"key": f"lotus_{record_id}.csv.gz", "links": {"self": f"/files/{record_id}"}, "checksum": f"md5:{record_id}"}
+        ]}).encode()}
+
+    filenames_records, filenames, download_urls, checksums = zd.get_filenames(
+        ["3", "1", "2"], api_url=http_server.url + "/api", max_workers=3
+    )
+
+    assert filenames == ["lotus_3.csv.gz", "lotus_1.csv.gz", "lotus_2.csv.gz"]
+    assert filenames_records[0] == "lotus_3.csv.gz (record: 3)"
+    assert download_urls == ["/files/3", "/files/1", "/files/2"]
+    assert checksums == ["md5:3", "md5:1", "md5:2"]
+    assert zd.get_filenames({"3", "1", "2"}, api_url=http_server.url + "/api")[1][0] == "lotus_1.csv.gz"